@@ -1 +1,7 @@
- 
\ No newline at end of file
+import sys
+from pathlib import Path
+
+# Torch-free helpers shared with the model runtime (message framing, weights lookup) live in model/
+_MODEL_DIR = str(Path(__file__).parent.parent.parent / "model")
+if _MODEL_DIR not in sys.path:
+    sys.path.append(_MODEL_DIR)
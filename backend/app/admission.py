@@ -0,0 +1,92 @@
+"""
+Admission control for inference requests.
+
+Inference is blocking, so it runs on a dedicated thread pool instead of the event
+loop. At most ``max_concurrency`` requests run at once and at most ``max_queue``
+more may wait for a slot; anything beyond that is rejected immediately with a
+Retry-After estimate, so overload shows up as fast 503s rather than timeouts.
+"""
+
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Callable, Dict
+
+
+class QueueFullError(Exception):
+    """Raised when both the concurrency slots and the wait queue are exhausted."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency plus a bounded wait queue in front of the inference executor."""
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="inference")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._rejected = 0
+        # Moving average of how long a slot is held, used for Retry-After
+        self._avg_service_s = 2.0
+
+    @asynccontextmanager
+    async def slot(self, wait: bool = True):
+        """
+        Hold one inference slot, waiting in the queue if needed; raises QueueFullError.
+
+        With ``wait=False`` the request never queues: QueueFullError is raised unless
+        a slot is free right away.
+        """
+        full = self._semaphore.locked() or self._waiting > 0
+        if full and (not wait or self._waiting >= self.max_queue):
+            self._rejected += 1
+            raise QueueFullError(self.retry_after())
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._active += 1
+        self._admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_service_s = 0.8 * self._avg_service_s + 0.2 * elapsed
+            self._active -= 1
+            self._semaphore.release()
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run a blocking callable on the inference executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is expected to have drained."""
+        backlog = self._waiting + self._active
+        return max(1, math.ceil(self._avg_service_s * backlog / self.max_concurrency))
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": self._waiting,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "avg_service_s": round(self._avg_service_s, 3),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
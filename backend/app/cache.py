@@ -0,0 +1,178 @@
+"""
+Content-addressed cache of prediction results.
+
+Entries are keyed by the SHA-256 of the uploaded bytes, the model size, the
+per-request inference options, the weights file (name and mtime) that size
+resolves to and every worker setting that changes predictions
+(``config.RESULT_SETTINGS``), so replacing the weights or restarting with
+another engine, decoder or detection threshold invalidates old predictions
+automatically. Per-run measurements (timings, batch size) are not stored.
+A bounded in-memory LRU sits in front of an optional on-disk tier that evicts
+the least recently used files once it exceeds its byte budget.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from app import config
+from model_weights import weights_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    def __init__(self, max_entries: int = 256, disk_dir: Optional[str] = None, disk_max_bytes: int = 0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Capacity of the in-memory LRU (0 disables it)
+            disk_dir: Directory for the on-disk tier (None disables it)
+            disk_max_bytes: Size budget of the on-disk tier
+        """
+        self.max_entries = max(0, max_entries)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = max(0, disk_max_bytes)
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0,
+                          "memory_evictions": 0, "disk_evictions": 0}
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*.json"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    @staticmethod
+    def make_key(content_hash: str, model_size: str, options: Optional[Dict] = None) -> str:
+        """
+        Cache key for an upload under the weights ``model_size`` currently resolves to,
+        the per-request inference options and the result-affecting worker settings.
+        """
+        size, weights_name, weights_mtime = weights_fingerprint(model_size)
+        runtime = config.result_settings()
+        identity = json.dumps([content_hash, size, weights_name, weights_mtime, options or {}, runtime],
+                              sort_keys=True)
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a copy of the cached result, or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return copy.deepcopy(entry)
+        entry = self._disk_get(key)
+        with self._lock:
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._memory_put(key, entry)
+        return copy.deepcopy(entry)
+
+    def put(self, key: str, result: Dict):
+        """Store a successful result; results carrying an error are not cached."""
+        if not self.enabled or "error" in result:
+            return
+        entry = copy.deepcopy(result)
+        # Timings and batch size describe the run that produced the result, not a later hit
+        entry.pop("timings", None)
+        if isinstance(entry.get("model_info"), dict):
+            entry["model_info"].pop("batch_size", None)
+        with self._lock:
+            self._counters["stores"] += 1
+            self._memory_put(key, entry)
+        self._disk_put(key, entry)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_enabled": self.disk_dir is not None,
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes,
+            }
+
+    def _memory_put(self, key: str, entry: Dict):
+        if self.max_entries == 0:
+            return
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _disk_get(self, key: str) -> Optional[Dict]:
+        if self.disk_dir is None:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            # Touch the file so eviction sees it as recently used
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+            self._disk_remove(path)
+            return None
+
+    def _disk_put(self, key: str, entry: Dict):
+        if self.disk_dir is None or self.disk_max_bytes == 0:
+            return
+        path = self.disk_dir / f"{key}.json"
+        try:
+            data = json.dumps(entry).encode("utf-8")
+            # Write then rename so readers never see a partial entry
+            fd, temp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(temp_path, path)
+            with self._lock:
+                self._disk_bytes += len(data) - previous
+            self._disk_evict()
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {path}: {e}")
+
+    def _disk_evict(self):
+        with self._lock:
+            if self._disk_bytes <= self.disk_max_bytes:
+                return
+        files = sorted(self.disk_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            with self._lock:
+                if self._disk_bytes <= self.disk_max_bytes:
+                    return
+            self._disk_remove(path)
+            with self._lock:
+                self._counters["disk_evictions"] += 1
+
+    def _disk_remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            with self._lock:
+                self._disk_bytes -= size
+        except OSError:
+            pass
@@ -0,0 +1,114 @@
+"""
+Backend runtime configuration.
+
+Every setting can be overridden through an environment variable of the same name.
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_list(name: str, default: List[str]) -> List[str]:
+    raw = os.getenv(name)
+    if raw is None:
+        return list(default)
+    return [item.strip() for item in raw.split(",") if item.strip()]
+
+
+# Model runtime layout
+MODEL_DIR = Path(__file__).parent.parent.parent / "model"
+INFERENCE_SCRIPT = MODEL_DIR / "inference_module.py"
+
+# Persistent inference workers (0 disables the pool and runs one subprocess per request)
+INFERENCE_WORKERS = _env_int("INFERENCE_WORKERS", 2)
+WORKER_PRELOAD_SIZES = _env_list("WORKER_PRELOAD_SIZES", ["2000"])
+WORKER_STARTUP_TIMEOUT = _env_float("WORKER_STARTUP_TIMEOUT", 300.0)
+WORKER_REQUEST_TIMEOUT = _env_float("WORKER_REQUEST_TIMEOUT", 120.0)
+WORKER_HEALTH_INTERVAL = _env_float("WORKER_HEALTH_INTERVAL", 30.0)
+
+# Micro-batching inside each worker; also read by the workers, which inherit our environment
+BATCH_MAX_SIZE = _env_int("BATCH_MAX_SIZE", 4)
+
+# Default for the per-request active_segment option (motion-gated sampling); also read by the workers
+ACTIVE_SEGMENT = os.getenv("ACTIVE_SEGMENT", "0").lower() in ("1", "true", "yes")
+
+# Default quality/latency profile (fast, balanced or accurate; see model/profiles.py); also read by the workers
+INFERENCE_PROFILE = os.getenv("INFERENCE_PROFILE", "accurate")
+
+# Default for the per-request multi_clip option, and the most windows a long video is split
+# into (each window costs one clip's forward); also read by the workers
+MULTI_CLIP = os.getenv("MULTI_CLIP", "0").lower() in ("1", "true", "yes")
+MULTI_CLIP_MAX = _env_int("MULTI_CLIP_MAX", 4)
+
+# Worker settings that change predictions beyond the per-request options (engine and precision,
+# graph export, defaults of the options, decoding, multi-clip windows, motion detection); cached
+# predictions are keyed by their values, so a restart with other settings does not serve old results
+RESULT_SETTINGS = (
+    "INFERENCE_ENGINE", "INFERENCE_PRECISION", "TORCHSCRIPT", "STATIC_PADDING", "ORT_GRAPH_OPTIMIZATION",
+    "INFERENCE_PROFILE", "ACTIVE_SEGMENT", "MULTI_CLIP", "MULTI_CLIP_WINDOW", "MULTI_CLIP_STRIDE",
+    "MULTI_CLIP_MAX", "DECODE_BACKEND", "MOTION_SAMPLE_FPS", "MOTION_THRESHOLD", "MOTION_MARGIN_S",
+    "MOTION_KEYFRAME_FPS", "MOTION_MAX_SAMPLES",
+)
+
+
+def result_settings() -> Dict[str, Optional[str]]:
+    """Values of RESULT_SETTINGS in the environment the workers inherit (None: the default)."""
+    return {name: os.getenv(name) for name in RESULT_SETTINGS}
+
+# Admission control: concurrent inference calls and requests allowed to wait for one.
+# Each worker needs BATCH_MAX_SIZE requests in flight to fill a batch.
+INFERENCE_MAX_CONCURRENCY = _env_int("INFERENCE_MAX_CONCURRENCY", max(1, INFERENCE_WORKERS) * max(1, BATCH_MAX_SIZE))
+INFERENCE_MAX_QUEUE = _env_int("INFERENCE_MAX_QUEUE", 16)
+
+# Uploads up to this size are kept in memory; larger ones spill to UPLOAD_SPOOL_DIR
+UPLOAD_MEMORY_LIMIT = _env_int("UPLOAD_MEMORY_LIMIT", 32 * 1024 * 1024)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+# Streaming recognition: frames per clip, new frames between predictions, frames before the first one
+STREAM_WINDOW = _env_int("STREAM_WINDOW", 64)
+STREAM_DEFAULT_STRIDE = _env_int("STREAM_DEFAULT_STRIDE", 8)
+STREAM_MIN_FRAMES = _env_int("STREAM_MIN_FRAMES", 16)
+
+# Asynchronous jobs: SQLite database and queued videos, runner threads, queue limit, and the runs
+# after which a job interrupted by a crash fails instead of being re-queued. Job files are handed to
+# workers running in MODEL_DIR, so the directory is made absolute
+JOBS_DIR = Path(os.getenv("JOBS_DIR") or Path(__file__).parent.parent / "data" / "jobs").resolve()
+JOB_RUNNER_THREADS = _env_int("JOB_RUNNER_THREADS", max(1, INFERENCE_WORKERS))
+JOB_MAX_QUEUED = _env_int("JOB_MAX_QUEUED", 1000)
+JOB_MAX_ATTEMPTS = _env_int("JOB_MAX_ATTEMPTS", 3)
+
+# Prediction cache: in-memory LRU entries, optional on-disk tier and its byte budget
+PREDICTION_CACHE_ENTRIES = _env_int("PREDICTION_CACHE_ENTRIES", 256)
+PREDICTION_CACHE_DIR = os.getenv("PREDICTION_CACHE_DIR") or None
+PREDICTION_CACHE_DISK_BYTES = _env_int("PREDICTION_CACHE_DISK_BYTES", 256 * 1024 * 1024)
+
+
+def model_venv_python() -> Optional[Path]:
+    """Return the interpreter of the model venv if one exists (Windows or POSIX layout)."""
+    venv_dir = MODEL_DIR / ".venv"
+    for candidate in (venv_dir / "Scripts" / "python.exe", venv_dir / "bin" / "python"):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def worker_python() -> str:
+    """Interpreter used to launch inference workers: the model venv, else our own."""
+    venv_python = model_venv_python()
+    return str(venv_python) if venv_python else sys.executable
@@ -0,0 +1,316 @@
+"""
+Asynchronous inference jobs backed by a local SQLite queue.
+
+``POST /jobs`` persists the upload and a queued row and returns immediately;
+``JobRunner`` threads drain the queue through the normal inference path,
+taking inference slots from the same admission controller as ``/detect``. Jobs
+and their videos live on disk, so queued work survives a backend restart, and
+jobs that were running when the process died are re-queued on startup, unless
+they have already been attempted ``max_attempts`` times (e.g. a video that
+crashes the runtime), in which case they fail.
+"""
+
+import asyncio
+import json
+import logging
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from app.admission import AdmissionController, QueueFullError
+from app.cache import PredictionCache
+from app.utils import SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    model_size TEXT NOT NULL,
+    filename TEXT,
+    video_path TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    options TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueueFullError(Exception):
+    """Raised when the number of queued jobs has reached its limit."""
+
+
+class JobStore:
+    def __init__(self, data_dir: Path, max_queued: int = 1000, max_attempts: int = 3):
+        """
+        Open (or create) the job database and video directory.
+
+        Args:
+            data_dir: Directory holding jobs.db and the queued videos
+            max_queued: Maximum number of jobs waiting in the queue
+            max_attempts: Runs after which an interrupted job fails instead of being re-queued
+        """
+        self.data_dir = Path(data_dir)
+        self.video_dir = self.data_dir / "videos"
+        self.video_dir.mkdir(parents=True, exist_ok=True)
+        self.max_queued = max_queued
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.data_dir / "jobs.db"), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "options" not in columns:
+            # Databases created before jobs carried their request options
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN options TEXT")
+
+    def create(self, upload: SpooledUpload, filename: str, model_size: str, options: Optional[Dict] = None) -> str:
+        """
+        Persist an upload and its inference options as a queued job and return its id.
+
+        Raises:
+            JobQueueFullError: when max_queued jobs are already waiting
+        """
+        job_id = uuid.uuid4().hex
+        video_path = self.video_dir / f"{job_id}{upload.suffix}"
+        if upload.in_memory:
+            video_path.write_bytes(upload.data)
+        else:
+            shutil.move(upload.path, video_path)
+            upload.path = None
+        # Count and insert in one transaction, so concurrent requests cannot overshoot max_queued
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if queued < self.max_queued:
+                    self._conn.execute(
+                        "INSERT INTO jobs (id, status, model_size, filename, video_path, content_hash, file_size, "
+                        "options, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, QUEUED, model_size, filename, str(video_path), upload.sha256, upload.size,
+                         json.dumps(options or {}), time.time()),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                video_path.unlink(missing_ok=True)
+                raise
+        if queued >= self.max_queued:
+            video_path.unlink(missing_ok=True)
+            raise JobQueueFullError(f"{queued} jobs already queued")
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Atomically move the oldest queued job to running and return it."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (RUNNING, time.time(), row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(row) if row is not None else None
+
+    def finish(self, job_id: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        """Record the outcome of a job and drop its video."""
+        status = FAILED if error else DONE
+        with self._lock:
+            row = self._conn.execute("SELECT video_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+        if row is not None:
+            Path(row["video_path"]).unlink(missing_ok=True)
+
+    def release(self, job_id: str):
+        """Put a job that was claimed but not run back in the queue, without counting the attempt."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, attempts = attempts - 1 WHERE id = ?",
+                (QUEUED, job_id),
+            )
+
+    def requeue_interrupted(self) -> int:
+        """
+        Put jobs left running by a previous process back in the queue.
+
+        Jobs that already had max_attempts runs are failed instead, so a video that
+        brings the process down is not retried forever.
+        """
+        with self._lock:
+            exhausted = self._conn.execute(
+                "SELECT id, attempts FROM jobs WHERE status = ? AND attempts >= ?", (RUNNING, self.max_attempts)
+            ).fetchall()
+        for row in exhausted:
+            logger.error(f"Job {row['id']} was interrupted on each of its {row['attempts']} attempts; failing it")
+            self.finish(row["id"], error=f"Interrupted on each of {row['attempts']} attempts")
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING)
+            )
+        return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "model_size": row["model_size"],
+            "filename": row["filename"],
+            "file_size": row["file_size"],
+            "options": json.loads(row["options"]) if row["options"] else {},
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if row["status"] == QUEUED:
+            with self._lock:
+                job["queue_position"] = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, row["created_at"])
+                ).fetchone()[0]
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _Stopped(Exception):
+    """Raised in a runner thread that was stopped while waiting for an inference slot."""
+
+
+class JobRunner:
+    """Background threads that drain the job queue through the inference path."""
+
+    def __init__(self, store: JobStore, infer: Callable[..., Dict],
+                 cache: Optional[PredictionCache] = None, admission: Optional[AdmissionController] = None,
+                 threads: int = 1, poll_interval: float = 1.0):
+        """
+        Args:
+            store: Job queue
+            infer: ``infer(video, model_size, **options)`` returning a result dictionary, where
+                ``video`` is the job's stored file as a SpooledUpload carrying its content hash
+            cache: Prediction cache shared with the HTTP endpoints
+            admission: Admission controller shared with the HTTP endpoints; each job
+                holds one of its slots while it runs (requires the event loop passed to start())
+            threads: Runner threads
+            poll_interval: Seconds between queue polls when idle
+        """
+        self.store = store
+        self.infer = infer
+        self.cache = cache
+        self.admission = admission
+        self.poll_interval = poll_interval
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = [
+            threading.Thread(target=self._loop, name=f"job-runner-{i}", daemon=True) for i in range(max(1, threads))
+        ]
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Start the runner threads; ``loop`` is the event loop the admission controller lives on."""
+        self._event_loop = loop
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            logger.info(f"Re-queued {requeued} interrupted jobs")
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self):
+        """Wake idle runners after a job was queued."""
+        self._wakeup.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            job = self.store.claim()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict):
+        job_id = job["id"]
+        logger.info(f"Running job {job_id} ({job['filename']}, model size {job['model_size']})")
+        options = json.loads(job["options"]) if job.get("options") else {}
+        try:
+            # Same key as /detect with the same options, so either can answer the other
+            cache_key = self.cache.make_key(job["content_hash"], job["model_size"], options) if self.cache else None
+            result = self.cache.get(cache_key) if self.cache else None
+            if result is None:
+                video = SpooledUpload.from_file(job["video_path"], job["content_hash"], job["file_size"])
+                result = self._infer(video, job["model_size"], options)
+                if self.cache:
+                    self.cache.put(cache_key, result)
+                result["cached"] = False
+            else:
+                result["cached"] = True
+            self.store.finish(job_id, result=result, error=result.get("error"))
+        except _Stopped:
+            self.store.release(job_id)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            self.store.finish(job_id, error=str(e))
+
+    def _infer(self, video: SpooledUpload, model_size: str, options: Dict) -> Dict:
+        if self.admission is None or self._event_loop is None:
+            return self.infer(video, model_size, **options)
+        while True:
+            admitted = self._admitted(video, model_size, options)
+            future = asyncio.run_coroutine_threadsafe(admitted, self._event_loop)
+            try:
+                return future.result()
+            except QueueFullError as e:
+                # Interactive requests fill the slots and the queue: try again once it should have drained
+                if self._stop.wait(e.retry_after):
+                    raise _Stopped()
+
+    async def _admitted(self, video: SpooledUpload, model_size: str, options: Dict) -> Dict:
+        async with self.admission.slot():
+            return await self.admission.run(self.infer, video, model_size, **options)
@@ -1,19 +1,61 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
-from app.model import run_inference
-import shutil
-import os
-import tempfile
+from fastapi.concurrency import run_in_threadpool
+from app.model import (
+    run_inference, run_batch_inference, run_clip_inference, get_worker_pool, shutdown_worker_pool, runtime_stats,
+    resident_models
+)
+from app.admission import AdmissionController, QueueFullError
+from app.cache import PredictionCache
+from app.jobs import JobQueueFullError, JobRunner, JobStore
+from app.streaming import FrameRingBuffer, decode_frame
+from app.utils import SpooledUpload, read_upload
+from app import config
+from profiles import PROFILES
 from datetime import timedelta
+from starlette.formparsers import MultiPartParser
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import logging
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Sign Language Recognition API", version="1.0.0")
+# Bounds how many inference calls run at once and how many may wait for a slot
+admission = AdmissionController(config.INFERENCE_MAX_CONCURRENCY, config.INFERENCE_MAX_QUEUE)
+
+# Re-submitted recordings are answered from here instead of re-running the model
+prediction_cache = PredictionCache(
+    max_entries=config.PREDICTION_CACHE_ENTRIES,
+    disk_dir=config.PREDICTION_CACHE_DIR,
+    disk_max_bytes=config.PREDICTION_CACHE_DISK_BYTES
+)
+
+# Persistent queue for POST /jobs, drained in the background
+job_store = JobStore(config.JOBS_DIR, max_queued=config.JOB_MAX_QUEUED, max_attempts=config.JOB_MAX_ATTEMPTS)
+# Jobs hold inference slots like /detect, so the queue cannot oversubscribe the workers
+job_runner = JobRunner(job_store, run_inference, cache=prediction_cache, admission=admission,
+                       threads=config.JOB_RUNNER_THREADS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the persistent inference workers before serving traffic so that
+    # requests never pay for interpreter start-up and model loading; each worker
+    # loads WORKER_PRELOAD_SIZES and runs warmup forwards before reporting ready
+    await run_in_threadpool(get_worker_pool)
+    job_runner.start(asyncio.get_running_loop())
+    yield
+    job_runner.stop()
+    job_store.close()
+    admission.shutdown()
+    shutdown_worker_pool()
+
+app = FastAPI(title="Sign Language Recognition API", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -27,6 +69,23 @@ app.add_middleware(
 # Supported video formats
 SUPPORTED_FORMATS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv', '.wmv'}
 
+# Let Starlette keep multipart file parts below the threshold in memory as well
+# (the class attribute was renamed from max_file_size to spool_max_size)
+for _spool_attr in ("spool_max_size", "max_file_size"):
+    if hasattr(MultiPartParser, _spool_attr):
+        setattr(MultiPartParser, _spool_attr, config.UPLOAD_MEMORY_LIMIT)
+
+def _read_upload(file: UploadFile, suffix: str) -> SpooledUpload:
+    """Read an upload once, hashing it and keeping it in memory when small (blocking)."""
+    return read_upload(file.file, suffix, config.UPLOAD_MEMORY_LIMIT, config.UPLOAD_SPOOL_DIR)
+
+def _busy_response(error: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry later",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 @app.get("/health")
 def health_check():
     """Health check endpoint."""
@@ -36,21 +95,38 @@ def health_check():
 def get_model_info():
     """Get information about the model setup."""
     try:
-        # Check if model environment is available
-        model_dir = Path(__file__).parent.parent.parent / "model"
-        model_venv_python = model_dir / ".venv" / "Scripts" / "python.exe"
-        inference_script = model_dir / "inference_module.py"
+        # Check if model environment is available (Windows or POSIX venv layout)
+        model_dir = config.MODEL_DIR
+        model_venv_python = config.model_venv_python()
+        inference_script = config.INFERENCE_SCRIPT
 
-        # Readiness: OK if inference script exists and either venv exists or we can import directly
+        pool = get_worker_pool()
+        runtime = runtime_stats()
+        resident = resident_models(runtime)
+
+        # Readiness: OK once the preloaded models are resident in the workers (or, without a
+        # pool, the venv exists); degraded if we can only import directly
         status = "not_ready"
         if inference_script.exists():
-            status = "ready" if model_venv_python.exists() else "degraded"
+            if pool is not None:
+                preloaded = all(size in resident for size in config.WORKER_PRELOAD_SIZES)
+                status = "ready" if preloaded else "degraded"
+            else:
+                status = "ready" if model_venv_python is not None else "degraded"
         
         return {
-            "model_venv_available": model_venv_python.exists(),
+            "model_venv_available": model_venv_python is not None,
             "inference_script_available": inference_script.exists(),
             "model_directory": str(model_dir),
-            "status": status
+            "status": status,
+            "resident_models": resident,
+            "profiles": {name: {"frames": p.num_frames, "crop_size": p.crop_size} for name, p in PROFILES.items()},
+            "default_profile": config.INFERENCE_PROFILE,
+            "worker_pool": pool.stats() if pool else None,
+            "runtime": runtime,
+            "prediction_cache": prediction_cache.stats(),
+            "jobs": job_store.stats(),
+            "admission": admission.stats()
         }
     except Exception as e:
         logger.error(f"Error getting model info: {e}")
@@ -59,7 +135,11 @@ def get_model_info():
 @app.post("/detect")
 async def detect_sign_language(
     file: UploadFile = File(...),
-    model_size: str = Query("2000", description="Model size: 100, 300, 1000, or 2000")
+    model_size: str = Query("2000", description="Model size: 100, 300, 1000, or 2000"),
+    active_segment: bool = Query(config.ACTIVE_SEGMENT, description="Sample only the part of the video with motion"),
+    multi_clip: bool = Query(config.MULTI_CLIP, description="Average consecutive windows over long videos"),
+    clip_results: bool = Query(False, description="Also return the prediction of every window (with multi_clip)"),
+    profile: str = Query(config.INFERENCE_PROFILE, description="Quality/latency profile: fast, balanced or accurate")
 ):
     """
     Detect sign language in uploaded video.
@@ -67,6 +147,10 @@ async def detect_sign_language(
     Args:
         file: Video file to process
         model_size: Size of the model to use (100, 300, 1000, or 2000)
+        active_segment: Detect the active signing interval and sample frames only from it
+        multi_clip: Cover videos longer than one window with several windows and average them
+        clip_results: Include each window's frame range and top prediction under "clips"
+        profile: Quality/latency profile setting the sampled frame count and crop size
     
     Returns:
         JSON response with detection results
@@ -87,35 +171,51 @@ async def detect_sign_language(
                 status_code=400,
                 detail=f"Invalid model size. Valid sizes: {', '.join(valid_sizes)}"
             )
+        if profile not in PROFILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid profile. Valid profiles: {', '.join(PROFILES)}"
+            )
         
-        # Create temporary file with proper extension
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            # Copy uploaded file to temporary location
-            shutil.copyfileobj(file.file, temp_file)
-            temp_path = temp_file.name
+        # The multipart body has already been received and spooled by the time the handler
+        # runs; read it once: hash, size and (for small files) the bytes themselves
+        upload = await run_in_threadpool(_read_upload, file, file_extension)
         
         logger.info(f"Processing video: {file.filename} with model size {model_size}")
         
         try:
-            # Run inference
-            result = run_inference(temp_path, model_size)
+            options = {"active_segment": active_segment, "multi_clip": multi_clip,
+                       "clip_results": clip_results, "profile": profile}
+            cache_key = prediction_cache.make_key(upload.sha256, model_size, options)
+            result = prediction_cache.get(cache_key)
+            if result is None:
+                # Only cache misses take an inference slot; inference runs off the event loop
+                async with admission.slot():
+                    result = await admission.run(run_inference, upload, model_size, **options)
+                prediction_cache.put(cache_key, result)
+                result["cached"] = False
+            else:
+                logger.info(f"Prediction cache hit for {file.filename}")
+                result["cached"] = True
             
             # Add file info to result
             result["file_info"] = {
                 "filename": file.filename,
-                "file_size": os.path.getsize(temp_path),
-                "content_type": file.content_type
+                "file_size": upload.size,
+                "content_type": file.content_type,
+                "sha256": upload.sha256
             }
             
             logger.info(f"Detection completed for {file.filename}")
             return JSONResponse(content=result)
             
         finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                logger.info(f"Cleaned up temporary file: {temp_path}")
+            # Release the buffer or remove the spool file
+            upload.cleanup()
     
+    except QueueFullError as e:
+        logger.warning(f"Rejected {file.filename}: {e}")
+        raise _busy_response(e)
     except HTTPException:
         raise
     except Exception as e:
@@ -128,7 +228,11 @@ async def detect_sign_language(
 @app.post("/detect-batch")
 async def detect_sign_language_batch(
     files: list[UploadFile] = File(...),
-    model_size: str = Query("2000", description="Model size: 100, 300, 1000, or 2000")
+    model_size: str = Query("2000", description="Model size: 100, 300, 1000, or 2000"),
+    active_segment: bool = Query(config.ACTIVE_SEGMENT, description="Sample only the part of each video with motion"),
+    multi_clip: bool = Query(config.MULTI_CLIP, description="Average consecutive windows over long videos"),
+    clip_results: bool = Query(False, description="Also return the prediction of every window (with multi_clip)"),
+    profile: str = Query(config.INFERENCE_PROFILE, description="Quality/latency profile: fast, balanced or accurate")
 ):
     """
     Detect sign language in multiple uploaded videos.
@@ -136,6 +240,10 @@ async def detect_sign_language_batch(
     Args:
         files: List of video files to process
         model_size: Size of the model to use
+        active_segment: Detect the active signing interval of each video and sample only from it
+        multi_clip: Cover videos longer than one window with several windows and average them
+        clip_results: Include each window's frame range and top prediction under "clips"
+        profile: Quality/latency profile setting the sampled frame count and crop size
     
     Returns:
         JSON response with detection results for all videos
@@ -148,43 +256,66 @@ async def detect_sign_language_batch(
                 status_code=400,
                 detail=f"Invalid model size. Valid sizes: {', '.join(valid_sizes)}"
             )
+        if profile not in PROFILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid profile. Valid profiles: {', '.join(PROFILES)}"
+            )
         
-        results = []
-        temp_files = []
+        options = {"active_segment": active_segment, "multi_clip": multi_clip, "clip_results": clip_results,
+                   "profile": profile}
+        results = [None] * len(files)
+        uploads = []
+        pending = []  # (position in files, upload, cache key)
         
-        for file in files:
-            try:
-                # Validate file format
-                file_extension = Path(file.filename).suffix.lower()
-                if file_extension not in SUPPORTED_FORMATS:
-                    results.append({
+        try:
+            for position, file in enumerate(files):
+                try:
+                    # Validate file format
+                    file_extension = Path(file.filename).suffix.lower()
+                    if file_extension not in SUPPORTED_FORMATS:
+                        results[position] = {
+                            "filename": file.filename,
+                            "error": f"Unsupported file format: {file_extension}"
+                        }
+                        continue
+                    
+                    # Read the upload once: hash, size and (for small files) the bytes
+                    upload = await run_in_threadpool(_read_upload, file, file_extension)
+                    uploads.append(upload)
+                    
+                    cache_key = prediction_cache.make_key(upload.sha256, model_size, options)
+                    cached = prediction_cache.get(cache_key)
+                    if cached is not None:
+                        cached["filename"] = file.filename
+                        cached["cached"] = True
+                        results[position] = cached
+                        continue
+                    pending.append((position, upload, cache_key))
+                    
+                except Exception as e:
+                    logger.error(f"Error processing {file.filename}: {e}")
+                    results[position] = {
                         "filename": file.filename,
-                        "error": f"Unsupported file format: {file_extension}"
-                    })
-                    continue
-                
-                # Create temporary file
-                with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-                    shutil.copyfileobj(file.file, temp_file)
-                    temp_path = temp_file.name
-                    temp_files.append(temp_path)
-                
-                # Run inference
-                result = run_inference(temp_path, model_size)
-                result["filename"] = file.filename
-                results.append(result)
-                
-            except Exception as e:
-                logger.error(f"Error processing {file.filename}: {e}")
-                results.append({
-                    "filename": file.filename,
-                    "error": str(e)
-                })
-        
-        # Clean up temporary files
-        for temp_path in temp_files:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+                        "error": str(e)
+                    }
+            
+            # Decode and infer all uncached files in one pipelined, batched call, holding a
+            # single inference slot; a fully cached batch takes none
+            if pending:
+                async with admission.slot():
+                    batch_results = await admission.run(
+                        run_batch_inference, [upload for _, upload, _ in pending], model_size, **options
+                    )
+                for (position, _, cache_key), result in zip(pending, batch_results):
+                    prediction_cache.put(cache_key, result)
+                    result["filename"] = files[position].filename
+                    result["cached"] = False
+                    results[position] = result
+        finally:
+            # Release buffers and remove spool files
+            for upload in uploads:
+                upload.cleanup()
         
         return JSONResponse(content={
             "results": results,
@@ -192,6 +323,11 @@ async def detect_sign_language_batch(
             "successful_detections": len([r for r in results if "error" not in r])
         })
     
+    except QueueFullError as e:
+        logger.warning(f"Rejected batch of {len(files)} files: {e}")
+        raise _busy_response(e)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in batch processing: {e}")
         raise HTTPException(
@@ -199,6 +335,181 @@ async def detect_sign_language_batch(
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/jobs", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    model_size: str = Query("2000", description="Model size: 100, 300, 1000, or 2000"),
+    active_segment: bool = Query(config.ACTIVE_SEGMENT, description="Sample only the part of the video with motion"),
+    multi_clip: bool = Query(config.MULTI_CLIP, description="Average consecutive windows over long videos"),
+    clip_results: bool = Query(False, description="Also return the prediction of every window (with multi_clip)"),
+    profile: str = Query(config.INFERENCE_PROFILE, description="Quality/latency profile: fast, balanced or accurate")
+):
+    """
+    Queue a video for asynchronous detection.
+    
+    Args:
+        file: Video file to process
+        model_size: Size of the model to use (100, 300, 1000, or 2000)
+        active_segment: Detect the active signing interval and sample frames only from it
+        multi_clip: Cover videos longer than one window with several windows and average them
+        clip_results: Include each window's frame range and top prediction under "clips"
+        profile: Quality/latency profile setting the sampled frame count and crop size
+    
+    Returns:
+        The job id and where to poll for its status
+    """
+    try:
+        # Validate file format
+        file_extension = Path(file.filename).suffix.lower()
+        if file_extension not in SUPPORTED_FORMATS:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Unsupported file format. Supported formats: {', '.join(SUPPORTED_FORMATS)}"
+            )
+        
+        # Validate model size
+        valid_sizes = ["100", "300", "1000", "2000"]
+        if model_size not in valid_sizes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid model size. Valid sizes: {', '.join(valid_sizes)}"
+            )
+        if profile not in PROFILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid profile. Valid profiles: {', '.join(PROFILES)}"
+            )
+        
+        # Same options as /detect, so a job and a /detect request share cached predictions
+        options = {"active_segment": active_segment, "multi_clip": multi_clip,
+                   "clip_results": clip_results, "profile": profile}
+        upload = await run_in_threadpool(_read_upload, file, file_extension)
+        try:
+            job_id = await run_in_threadpool(job_store.create, upload, file.filename, model_size, options)
+        finally:
+            upload.cleanup()
+        job_runner.notify()
+        
+        logger.info(f"Queued job {job_id} for {file.filename} with model size {model_size}")
+        return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+    
+    except JobQueueFullError as e:
+        logger.warning(f"Rejected job for {file.filename}: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is full, please retry later",
+            headers={"Retry-After": "30"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error queueing job: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Get the status of a job, and its result once finished."""
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.websocket("/ws/detect")
+async def detect_sign_language_stream(
+    websocket: WebSocket,
+    model_size: str = Query("2000", description="Model size: 100, 300, 1000, or 2000"),
+    stride: int = Query(config.STREAM_DEFAULT_STRIDE, description="New frames between predictions")
+):
+    """
+    Continuous sign recognition over a WebSocket.
+    
+    The client sends one frame per binary message (JPEG, or raw 224x224 RGB) and
+    may send {"type": "reset"} as text to start a new sign. Every `stride` frames
+    the last STREAM_WINDOW frames are classified and a prediction message is sent
+    back. Predictions are skipped, never queued, while the previous one is still
+    running, so a slow model lowers the update rate instead of adding latency.
+    """
+    valid_sizes = ["100", "300", "1000", "2000"]
+    if model_size not in valid_sizes or stride < 1:
+        await websocket.close(code=1008, reason="Invalid model size or stride")
+        return
+    await websocket.accept()
+    
+    ring = FrameRingBuffer(config.STREAM_WINDOW)
+    inflight: set = set()
+    since_last = 0
+    
+    async def predict(clip, frame_index: int):
+        started = time.perf_counter()
+        try:
+            # Streaming predictions share the inference slots with /detect but never queue for one:
+            # when all are taken this update is skipped and the client told to back off
+            async with admission.slot(wait=False):
+                result = await admission.run(run_clip_inference, clip, model_size)
+            message = {
+                "type": "prediction",
+                "frame_index": frame_index,
+                "text": result.get("text"),
+                "confidence": result.get("confidence", 0.0),
+                "alternatives": result.get("alternatives", []),
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2)
+            }
+            if "error" in result:
+                message["error"] = result["error"]
+        except QueueFullError as e:
+            message = {"type": "busy", "frame_index": frame_index, "retry_after": e.retry_after}
+        except Exception as e:
+            logger.error(f"Streaming inference failed: {e}")
+            message = {"type": "error", "frame_index": frame_index, "error": str(e)}
+        try:
+            await websocket.send_json(message)
+        except (WebSocketDisconnect, RuntimeError):
+            # Client went away while the prediction was running
+            pass
+    
+    logger.info(f"Streaming session opened with model size {model_size}, stride {stride}")
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = None
+                if not isinstance(control, dict):
+                    await websocket.send_json({"type": "error", "error": "Control messages must be JSON objects"})
+                    continue
+                if control.get("type") == "reset":
+                    ring.clear()
+                    since_last = 0
+                continue
+            
+            data = message.get("bytes") or b""
+            try:
+                frame = await run_in_threadpool(decode_frame, data)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "error": str(e)})
+                continue
+            ring.push(frame)
+            since_last += 1
+            
+            if since_last >= stride and ring.count >= config.STREAM_MIN_FRAMES and not inflight:
+                since_last = 0
+                task = asyncio.create_task(predict(ring.snapshot(), ring.total - 1))
+                inflight.add(task)
+                task.add_done_callback(inflight.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in inflight:
+            task.cancel()
+        logger.info(f"Streaming session closed after {ring.total} frames")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,33 +1,274 @@
 import subprocess
 import sys
-import os
-import json
-import tempfile
-from pathlib import Path
-from typing import Dict
+import io
+import math
+import time
+from typing import Dict, List, Optional, Tuple, Union
 import logging
 import importlib.util
+import threading
+
+from app import config
+from app.utils import SpooledUpload
+from app.worker_pool import InferenceWorkerPool, WorkerError
+from inference_protocol import MAX_PAYLOAD_BYTES, ProtocolError, read_message
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def run_inference(video_path: str, model_size: str = "2000") -> Dict:
+# Shared pool of persistent inference workers, started on first use
+_worker_pool: Optional[InferenceWorkerPool] = None
+_worker_pool_failed = False
+_worker_pool_lock = threading.Lock()
+
+def get_worker_pool() -> Optional[InferenceWorkerPool]:
     """
-    Run sign language inference using the model venv.
+    Get the shared worker pool, starting it if needed.
+
+    Returns None when the pool is disabled (INFERENCE_WORKERS=0) or could not be started,
+    in which case callers fall back to one subprocess per request.
+    """
+    global _worker_pool, _worker_pool_failed
+    if config.INFERENCE_WORKERS <= 0 or _worker_pool_failed:
+        return None
+    with _worker_pool_lock:
+        if _worker_pool is None and not _worker_pool_failed:
+            pool = InferenceWorkerPool(
+                size=config.INFERENCE_WORKERS,
+                python=config.worker_python(),
+                script=config.INFERENCE_SCRIPT,
+                preload_sizes=config.WORKER_PRELOAD_SIZES,
+                startup_timeout=config.WORKER_STARTUP_TIMEOUT,
+                request_timeout=config.WORKER_REQUEST_TIMEOUT,
+                health_interval=config.WORKER_HEALTH_INTERVAL,
+            )
+            try:
+                pool.start()
+                _worker_pool = pool
+            except WorkerError as e:
+                logger.error(f"Inference worker pool unavailable: {e}. Using per-request subprocesses.")
+                pool.shutdown()
+                _worker_pool_failed = True
+        return _worker_pool
+
+def shutdown_worker_pool():
+    """Stop all persistent inference workers."""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is not None:
+            _worker_pool.shutdown()
+            _worker_pool = None
+
+def runtime_stats() -> List[Dict]:
+    """Per-worker runtime statistics (loaded models, batch-size distribution)."""
+    pool = get_worker_pool()
+    if pool is None:
+        return []
+    return [{k: v for k, v in reply.items() if k not in ("id", "ok")} for reply in pool.broadcast("stats")]
+
+def resident_models(runtime: List[Dict]) -> Dict[str, Dict]:
+    """
+    Summarize which model sizes are loaded, across workers.
+
+    Args:
+        runtime: Per-worker statistics as returned by runtime_stats()
+
+    Returns:
+        Per model size: number of workers holding it, slowest load time and
+        warm latency among them, and parameter memory per copy
+    """
+    resident: Dict[str, Dict] = {}
+    for worker in runtime:
+        for size, info in worker.get("models", {}).items():
+            entry = resident.setdefault(size, {
+                "workers": 0,
+                "device": info.get("device"),
+                "weights": info.get("weights"),
+                "engine": info.get("engine"),
+                "parameter_bytes": info.get("parameter_bytes"),
+                "load_time_ms": None,
+                "warm_latency_ms": None
+            })
+            entry["workers"] += 1
+            for key in ("load_time_ms", "warm_latency_ms"):
+                if info.get(key) is not None:
+                    entry[key] = max(entry[key] or 0.0, info[key])
+    return resident
+
+# A video to run inference on: a file path, or an upload that may only exist in memory
+Video = Union[str, SpooledUpload]
+
+def _video_spec(video: Video) -> Tuple[Dict, bytes]:
+    """Describe a video for a worker request; in-memory uploads travel in the payload."""
+    if isinstance(video, SpooledUpload):
+        if video.in_memory:
+            return {"length": video.size, "suffix": video.suffix, "sha256": video.sha256}, video.data
+        # The hash lets the worker cache the decoded clip of spooled uploads too
+        return {"path": video.path, "sha256": video.sha256}, b""
+    return {"path": video}, b""
+
+def _run_inference_oneshot_video(video: Video, model_size: str, options: Dict) -> Dict:
+    if isinstance(video, SpooledUpload):
+        with video.as_path() as path:
+            return _run_inference_oneshot(path, model_size, options)
+    return _run_inference_oneshot(video, model_size, options)
+
+def _forward_timeout(clips: int, options: Dict) -> float:
+    """Worker request timeout for ``clips`` videos, allowing for multi-clip windows."""
+    forwards = max(1, math.ceil(clips / max(1, config.BATCH_MAX_SIZE)))
+    if options.get("multi_clip", config.MULTI_CLIP):
+        forwards *= max(1, config.MULTI_CLIP_MAX)
+    return config.WORKER_REQUEST_TIMEOUT * forwards
+
+def run_inference(video: Video, model_size: str = "2000", **options) -> Dict:
+    """
+    Run sign language inference, preferring the persistent worker pool.
+    
+    Args:
+        video: Path to the video file, or a spooled upload
+        model_size: Size of the model to use
+        **options: Per-request inference options (e.g. active_segment, multi_clip)
+        
+    Returns:
+        Dictionary containing prediction results
+    """
+    pool = get_worker_pool()
+    if pool is not None:
+        try:
+            started = time.perf_counter()
+            spec, payload = _video_spec(video)
+            # Same upload -> same worker, so its decoded-clip cache is reused across model sizes
+            affinity = video.sha256 if isinstance(video, SpooledUpload) else None
+            reply = pool.submit("predict", payload=payload, video=spec, model_size=model_size, options=options,
+                                affinity=affinity, timeout=_forward_timeout(1, options))
+            result = reply["result"]
+            # Time spent outside the model runtime: queueing, IPC and (de)serialization
+            timings = result.setdefault("timings", {})
+            roundtrip_ms = (time.perf_counter() - started) * 1000
+            timings["roundtrip_ms"] = round(roundtrip_ms, 2)
+            timings["ipc_overhead_ms"] = round(roundtrip_ms - timings.get("total_ms", 0.0), 2)
+            return result
+        except WorkerError as e:
+            logger.error(f"Worker pool inference failed: {e}. Falling back to a one-shot subprocess.")
+    return _run_inference_oneshot_video(video, model_size, options)
+
+def run_batch_inference(videos: List[Video], model_size: str = "2000", **options) -> List[Dict]:
+    """
+    Run sign language inference on several videos in one pipelined, batched call.
+    
+    Args:
+        videos: Paths to the video files, or spooled uploads
+        model_size: Size of the model to use
+        **options: Per-request inference options applied to every video
+        
+    Returns:
+        One result dictionary per video, in input order
+    """
+    if not videos:
+        return []
+    pool = get_worker_pool()
+    if pool is None:
+        return [_run_inference_oneshot_video(video, model_size, options) for video in videos]
+    results = []
+    for chunk in _payload_chunks([_video_spec(video) for video in videos]):
+        specs = [spec for spec, _ in chunk]
+        try:
+            # The payloads are written back to back, not joined; the timeout scales with the forwards needed
+            reply = pool.submit("predict_batch", payload=[payload for _, payload in chunk], videos=specs,
+                                model_size=model_size, options=options,
+                                timeout=_forward_timeout(len(chunk), options))
+            results += reply["results"]
+        except WorkerError as e:
+            logger.error(f"Worker pool batch inference failed: {e}. Falling back to one-shot subprocesses.")
+            start = len(results)
+            results += [_run_inference_oneshot_video(video, model_size, options)
+                        for video in videos[start:start + len(chunk)]]
+    return results
+
+def _payload_chunks(items: List[Tuple[Dict, bytes]]) -> List[List[Tuple[Dict, bytes]]]:
+    """
+    Split (spec, payload) pairs into consecutive requests whose payloads fit one protocol frame.
+    
+    Uploads are kept in memory only up to UPLOAD_MEMORY_LIMIT, so a single payload
+    normally fits; one that does not still gets a request of its own, which the
+    pool refuses and the caller runs as a one-shot subprocess.
+    """
+    chunks, chunk, chunk_bytes = [], [], 0
+    for spec, payload in items:
+        if chunk and chunk_bytes + len(payload) > MAX_PAYLOAD_BYTES:
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append((spec, payload))
+        chunk_bytes += len(payload)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def run_clip_inference(frames, model_size: str = "2000", top_k: int = 5) -> Dict:
+    """
+    Run sign language inference on decoded frames (streaming recognition).
+    
+    Args:
+        frames: RGB uint8 numpy array of shape (T, 224, 224, 3)
+        model_size: Size of the model to use
+        top_k: Number of top predictions to return
+        
+    Returns:
+        Dictionary containing prediction results
+    """
+    pool = get_worker_pool()
+    if pool is None:
+        return {
+            "text": "Streaming recognition unavailable",
+            "confidence": 0.0,
+            "alternatives": [],
+            "error": "Streaming recognition requires the inference worker pool"
+        }
+    try:
+        reply = pool.submit("predict_clip", payload=frames.tobytes(), shape=list(frames.shape),
+                            model_size=model_size, top_k=top_k)
+        return reply["result"]
+    except WorkerError as e:
+        logger.error(f"Clip inference failed: {e}")
+        return {
+            "text": "Unable to process frames",
+            "confidence": 0.0,
+            "alternatives": [],
+            "error": str(e),
+            "error_type": type(e).__name__
+        }
+
+def _option_flags(options: Dict) -> List[str]:
+    """Command-line flags of inference_module.py for per-request options."""
+    flags = []
+    for name in ("active_segment", "multi_clip"):
+        if name in options:
+            flags.append(f"--{name}" if options[name] else f"--no-{name}")
+    if options.get("clip_results"):
+        flags.append("--clip_results")
+    if options.get("profile"):
+        flags += ["--profile", options["profile"]]
+    return flags
+
+def _run_inference_oneshot(video_path: str, model_size: str = "2000", options: Optional[Dict] = None) -> Dict:
+    """
+    Run sign language inference in a fresh model venv subprocess.
     
     Args:
         video_path: Path to the video file
         model_size: Size of the model to use
+        options: Per-request inference options
         
     Returns:
         Dictionary containing prediction results
     """
     try:
+        options = options or {}
         # Get the model directory path
-        model_dir = Path(__file__).parent.parent.parent / "model"
-        model_venv_python = model_dir / ".venv" / "Scripts" / "python.exe"
-        inference_script = model_dir / "inference_module.py"
+        model_dir = config.MODEL_DIR
+        model_venv_python = config.model_venv_python()
+        inference_script = config.INFERENCE_SCRIPT
         
         # Ensure inference script exists
         if not inference_script.exists():
@@ -48,7 +289,7 @@ def run_inference(video_path: str, model_size: str = "2000") -> Dict:
                     module = importlib.util.module_from_spec(spec)
                     spec.loader.exec_module(module)  # type: ignore[attr-defined]
                     logger.info("Running inference via direct import fallback")
-                    return module.run_inference(video_path, model_size)  # type: ignore[attr-defined]
+                    return module.run_inference(video_path, model_size, **options)  # type: ignore[attr-defined]
                 else:
                     raise ImportError("Unable to load inference_module spec")
             except Exception as e:
@@ -61,57 +302,37 @@ def run_inference(video_path: str, model_size: str = "2000") -> Dict:
                 }
         
         # Prefer venv if available; otherwise fall back to direct import
-        if model_venv_python.exists():
+        if model_venv_python is not None:
             # Run inference using subprocess in model venv
             cmd = [
                 str(model_venv_python),
                 str(inference_script),
                 video_path,
-                "--model_size", model_size
-            ]
+                "--model_size", model_size,
+                "--protocol"
+            ] + _option_flags(options)
             logger.info(f"Running inference command: {' '.join(cmd)}")
             result = subprocess.run(
                 cmd,
                 capture_output=True,
-                text=True,
                 cwd=str(model_dir)
             )
             if result.returncode != 0:
-                logger.error(f"Inference via venv failed (rc={result.returncode}). Falling back. stderr: {result.stderr}")
+                stderr = result.stderr.decode("utf-8", errors="replace")
+                logger.error(f"Inference via venv failed (rc={result.returncode}). Falling back. stderr: {stderr}")
                 return _run_via_direct_import()
         else:
-            logger.warning(f"Model venv not found at {model_venv_python}. Using direct import fallback.")
+            logger.warning(f"Model venv not found in {model_dir / '.venv'}. Using direct import fallback.")
             return _run_via_direct_import()
         
-        # Parse the output from venv subprocess to extract prediction
-        output_lines = result.stdout.strip().split('\n')
-        
-        # Extract prediction from output
-        prediction = "Unknown"
-        confidence = 0.0
-        model_info = {}
-        
-        for line in output_lines:
-            if line.startswith("Prediction:"):
-                prediction = line.split(":", 1)[1].strip()
-            elif line.startswith("Confidence:"):
-                confidence = float(line.split(":", 1)[1].strip())
-            elif line.startswith("Model Info:"):
-                try:
-                    model_info_str = line.split(":", 1)[1].strip()
-                    model_info = eval(model_info_str)  # Safe for our controlled output
-                except:
-                    pass
-        
-        # Create result dictionary
-        result_dict = {
-            "text": prediction,
-            "confidence": confidence,
-            "alternatives": [],  # We could parse alternatives if needed
-            "model_info": model_info
-        }
+        # The subprocess writes its full result as a single protocol frame
+        frame = read_message(io.BytesIO(result.stdout))
+        if frame is None:
+            raise ProtocolError("Inference subprocess produced no result")
+        message, _ = frame
+        result_dict = message["result"]
         
-        logger.info(f"Inference completed: {prediction} (confidence: {confidence:.3f})")
+        logger.info(f"Inference completed: {result_dict.get('text')} (confidence: {result_dict.get('confidence', 0.0):.3f})")
         return result_dict
         
     except Exception as e:
@@ -120,5 +341,6 @@ def run_inference(video_path: str, model_size: str = "2000") -> Dict:
             "text": "Unable to process video",
             "confidence": 0.0,
             "alternatives": [],
-            "error": str(e)
+            "error": str(e),
+            "error_type": type(e).__name__
         } 
\ No newline at end of file
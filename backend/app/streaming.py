@@ -0,0 +1,75 @@
+"""
+Frame handling for the streaming recognition WebSocket.
+
+Clients send individual frames, either JPEG-encoded or raw 224x224 RGB. Each
+session keeps the last ``window`` preprocessed frames in a ring buffer that is
+handed to the model as one uint8 clip.
+"""
+
+import cv2
+import numpy as np
+
+FRAME_SIZE = 224
+RAW_FRAME_BYTES = FRAME_SIZE * FRAME_SIZE * 3
+
+
+def decode_frame(data: bytes) -> np.ndarray:
+    """
+    Turn one client frame into a (224, 224, 3) RGB uint8 array.
+
+    Raw frames must already be 224x224 RGB; encoded frames (JPEG, or anything
+    cv2.imdecode understands) are resized on the short side and center-cropped
+    exactly like uploaded videos.
+
+    Raises:
+        ValueError: if the frame cannot be decoded
+    """
+    if len(data) == RAW_FRAME_BYTES:
+        return np.frombuffer(data, dtype=np.uint8).reshape(FRAME_SIZE, FRAME_SIZE, 3)
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Unable to decode frame ({len(data)} bytes)")
+    h, w = img.shape[:2]
+    scale = FRAME_SIZE / min(h, w)
+    new_h, new_w = int(h * scale), int(w * scale)
+    img = cv2.resize(img, (new_w, new_h))
+    start_h = (new_h - FRAME_SIZE) // 2
+    start_w = (new_w - FRAME_SIZE) // 2
+    img = img[start_h:start_h + FRAME_SIZE, start_w:start_w + FRAME_SIZE]
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+class FrameRingBuffer:
+    """Fixed-capacity buffer of the most recent preprocessed frames."""
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self._frames = np.zeros((capacity, FRAME_SIZE, FRAME_SIZE, 3), dtype=np.uint8)
+        self._next = 0
+        self.count = 0
+        self.total = 0
+
+    def push(self, frame: np.ndarray):
+        self._frames[self._next] = frame
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.total += 1
+
+    def clear(self):
+        self._next = 0
+        self.count = 0
+
+    def snapshot(self) -> np.ndarray:
+        """
+        Copy the buffered frames out in chronological order as a (capacity, H, W, 3) clip.
+
+        Until the buffer is full the last frame is repeated, matching how short
+        videos are padded.
+        """
+        if self.count == self.capacity:
+            return np.concatenate([self._frames[self._next:], self._frames[:self._next]])
+        clip = np.empty_like(self._frames)
+        clip[:self.count] = self._frames[:self.count]
+        clip[self.count:] = self._frames[self.count - 1]
+        return clip
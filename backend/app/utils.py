@@ -1,4 +1,94 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional
+
 def preprocess_video(video_path: str):
     # TODO: Implement video loading, frame extraction, resizing, normalization, etc.
     # Return processed frames suitable for I3D model
-    pass 
\ No newline at end of file
+    pass
+
+
+class SpooledUpload:
+    """
+    An uploaded video read in a single pass.
+
+    The bytes stay in memory up to ``memory_limit``; larger uploads spill to a file
+    in ``spool_dir`` (ideally tmpfs). The SHA-256 and size are computed in the same
+    pass as the read.
+    """
+
+    def __init__(self, suffix: str, memory_limit: int, spool_dir: Optional[str] = None):
+        self.suffix = suffix
+        self.memory_limit = memory_limit
+        self.spool_dir = spool_dir
+        self.data: Optional[bytes] = None
+        self.path: Optional[str] = None
+        self.sha256 = ""
+        self.size = 0
+
+    @classmethod
+    def from_file(cls, path: str, sha256: str, size: int) -> "SpooledUpload":
+        """Describe a video already stored on disk, such as a queued job's, hashed when it was uploaded."""
+        upload = cls(os.path.splitext(path)[1], memory_limit=0)
+        upload.path, upload.sha256, upload.size = path, sha256, size
+        return upload
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    def read_from(self, fileobj: BinaryIO, chunk_size: int = 1024 * 1024) -> "SpooledUpload":
+        digest = hashlib.sha256()
+        chunks = []
+        spill = None
+        try:
+            while True:
+                chunk = fileobj.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                self.size += len(chunk)
+                if spill is None and self.size > self.memory_limit:
+                    # Too big to keep in memory: move what we have to the spool file
+                    spill = tempfile.NamedTemporaryFile(delete=False, suffix=self.suffix, dir=self.spool_dir)
+                    self.path = spill.name
+                    spill.writelines(chunks)
+                    chunks = []
+                if spill is not None:
+                    spill.write(chunk)
+                else:
+                    chunks.append(chunk)
+        finally:
+            if spill is not None:
+                spill.close()
+        self.sha256 = digest.hexdigest()
+        if spill is None:
+            self.data = b"".join(chunks)
+        return self
+
+    @contextmanager
+    def as_path(self) -> Iterator[str]:
+        """Yield a filesystem path for path-only consumers, spilling in-memory data if needed."""
+        if self.path is not None:
+            yield self.path
+            return
+        with tempfile.NamedTemporaryFile(delete=False, suffix=self.suffix, dir=self.spool_dir) as f:
+            f.write(self.data)
+            path = f.name
+        try:
+            yield path
+        finally:
+            os.remove(path)
+
+    def cleanup(self):
+        self.data = None
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+def read_upload(fileobj: BinaryIO, suffix: str, memory_limit: int, spool_dir: Optional[str] = None) -> SpooledUpload:
+    """Read an upload once, hashing it and keeping it in memory when it is small enough."""
+    return SpooledUpload(suffix, memory_limit, spool_dir).read_from(fileobj)
@@ -0,0 +1,316 @@
+"""
+Pool of long-lived inference worker processes.
+
+Each worker runs ``inference_module.py --serve``, loads its models once and then
+answers requests over its stdin/stdout pipes using the length-prefixed frames of
+``inference_protocol``. The pool spreads requests over the
+workers, pings idle workers periodically and restarts any worker that died or
+stopped answering.
+"""
+
+import itertools
+import logging
+import subprocess
+import threading
+import time
+import zlib
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+from inference_protocol import FrameTooLarge, ProtocolError, read_message, write_message
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerError(RuntimeError):
+    """Raised when a worker cannot serve a request (crash, timeout, bad reply)."""
+
+
+class WorkerTimeout(WorkerError):
+    """Raised when a request gets no reply in time; the worker itself may still be healthy."""
+
+
+class InferenceWorker:
+    """A single ``inference_module.py --serve`` process and its request bookkeeping."""
+
+    def __init__(self, worker_id: int, python: str, script: Path, preload_sizes: List[str]):
+        self.worker_id = worker_id
+        self.python = python
+        self.script = script
+        self.preload_sizes = preload_sizes
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.restarting = False
+        self.generation = 0
+        self.served = 0
+        self.started_at = 0.0
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._ready: Optional[Future] = None
+
+    @property
+    def inflight(self) -> int:
+        with self._pending_lock:
+            return len(self._pending)
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, timeout: float):
+        """Spawn the process and wait until it reports that its models are loaded."""
+        cmd = [self.python, str(self.script), "--serve"]
+        if self.preload_sizes:
+            cmd += ["--preload", *self.preload_sizes]
+        logger.info(f"Starting inference worker {self.worker_id}: {' '.join(cmd)}")
+        self._ready = Future()
+        self.generation += 1
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=str(self.script.parent),
+        )
+        self.started_at = time.time()
+        threading.Thread(
+            target=self._read_loop,
+            args=(self.process,),
+            name=f"inference-worker-{self.worker_id}-reader",
+            daemon=True,
+        ).start()
+        try:
+            self._ready.result(timeout=timeout)
+        except FutureTimeoutError:
+            self.stop()
+            raise WorkerError(f"Worker {self.worker_id} did not become ready within {timeout:.0f}s")
+        logger.info(f"Inference worker {self.worker_id} ready (pid={self.process.pid})")
+
+    def stop(self):
+        process = self.process
+        if process is None:
+            return
+        try:
+            if process.stdin:
+                process.stdin.close()
+            process.wait(timeout=5)
+        except Exception:
+            process.kill()
+        self._fail_pending(WorkerError(f"Worker {self.worker_id} stopped"))
+
+    def request(self, message: Dict, timeout: float, payload: Union[bytes, Sequence[bytes]] = b"") -> Dict:
+        """
+        Send one request and block until its reply arrives.
+
+        ``payload`` may be several parts, written back to back. Raises WorkerError only
+        for transport failures; error replies are returned as-is.
+        """
+        if not self.is_alive():
+            raise WorkerError(f"Worker {self.worker_id} is not running")
+        request_id = next(self._ids)
+        future: Future = Future()
+        with self._pending_lock:
+            self._pending[request_id] = future
+        try:
+            with self._write_lock:
+                write_message(self.process.stdin, {**message, "id": request_id}, payload)
+            reply = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise WorkerTimeout(f"Worker {self.worker_id} timed out after {timeout:.0f}s")
+        except FrameTooLarge as e:
+            # Nothing was written; the worker is unaffected
+            raise WorkerError(f"Request to worker {self.worker_id} not sent: {e}")
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerError(f"Worker {self.worker_id} pipe error: {e}")
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+        self.served += 1
+        return reply
+
+    def _read_loop(self, process: subprocess.Popen):
+        while True:
+            try:
+                frame = read_message(process.stdout)
+            except FrameTooLarge as e:
+                # Skipped without losing sync: only the request it answered fails
+                logger.error(f"Worker {self.worker_id} sent an oversized reply: {e}")
+                with self._pending_lock:
+                    future = self._pending.get((e.message or {}).get("id"))
+                if future and not future.done():
+                    future.set_exception(WorkerError(f"Worker {self.worker_id} reply dropped: {e}"))
+                continue
+            except ProtocolError as e:
+                # The stream is out of sync; nothing after this point can be trusted
+                logger.error(f"Worker {self.worker_id} sent a malformed frame: {e}")
+                process.kill()
+                break
+            if frame is None:
+                break
+            message, _ = frame
+            if message.get("type") == "ready":
+                if self._ready and not self._ready.done():
+                    self._ready.set_result(message)
+                continue
+            with self._pending_lock:
+                future = self._pending.get(message.get("id"))
+            if future and not future.done():
+                future.set_result(message)
+        if process is self.process:
+            self._fail_pending(WorkerError(f"Worker {self.worker_id} exited (rc={process.wait()})"))
+
+    def _fail_pending(self, error: Exception):
+        if self._ready and not self._ready.done():
+            self._ready.set_exception(error)
+        with self._pending_lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    def info(self) -> Dict:
+        return {
+            "worker_id": self.worker_id,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.is_alive(),
+            "inflight": self.inflight,
+            "served": self.served,
+            "restarts": self.restarts,
+            "uptime_s": round(time.time() - self.started_at, 1) if self.is_alive() else 0.0,
+        }
+
+
+class InferenceWorkerPool:
+    """Fixed-size set of inference workers with health checks and automatic restart."""
+
+    def __init__(
+        self,
+        size: int,
+        python: str,
+        script: Path,
+        preload_sizes: List[str],
+        startup_timeout: float = 300.0,
+        request_timeout: float = 120.0,
+        health_interval: float = 30.0,
+        affinity_slack: int = 2,
+    ):
+        self.size = size
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.health_interval = health_interval
+        self.affinity_slack = affinity_slack
+        self.workers = [InferenceWorker(i, python, script, preload_sizes) for i in range(size)]
+        self._restart_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    def start(self):
+        # Start workers concurrently; model loading dominates their startup time
+        threads = [threading.Thread(target=self._start_worker, args=(w,)) for w in self.workers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if not any(w.is_alive() for w in self.workers):
+            raise WorkerError("No inference worker could be started")
+        self._health_thread = threading.Thread(target=self._health_loop, name="inference-pool-health", daemon=True)
+        self._health_thread.start()
+
+    def shutdown(self):
+        self._stop_event.set()
+        for worker in self.workers:
+            worker.stop()
+
+    def submit(self, op: str, payload: Union[bytes, Sequence[bytes]] = b"", timeout: Optional[float] = None,
+               affinity: Optional[str] = None, **fields) -> Dict:
+        """
+        Run ``op`` on the least loaded live worker and return its reply.
+
+        Requests with the same ``affinity`` key (e.g. a content hash) go to the same
+        worker, so its per-process caches are reused, unless that worker is more
+        than ``affinity_slack`` requests busier than the least loaded one.
+        """
+        live = [w for w in self.workers if w.is_alive()]
+        if not live:
+            raise WorkerError("No live inference workers")
+        worker = min(live, key=lambda w: w.inflight)
+        if affinity is not None:
+            preferred = live[zlib.crc32(affinity.encode("utf-8")) % len(live)]
+            if preferred.inflight <= worker.inflight + self.affinity_slack:
+                worker = preferred
+        generation = worker.generation
+        try:
+            reply = worker.request({"op": op, **fields}, timeout=timeout or self.request_timeout, payload=payload)
+        except WorkerError:
+            # Only a dead process is replaced here (a malformed frame also kills it): a slow
+            # forward leaves the other requests on the worker running, and a hung worker
+            # fails its next health check once idle
+            if not worker.is_alive():
+                self._restart(worker, generation)
+            raise
+        if not reply.get("ok", False):
+            raise WorkerError(reply.get("error", "Unknown worker error"))
+        return reply
+
+    def broadcast(self, op: str, timeout: float = 10.0) -> List[Dict]:
+        """Send ``op`` to every live worker and collect the replies that arrive in time."""
+        replies = []
+        for worker in self.workers:
+            if not worker.is_alive():
+                continue
+            try:
+                replies.append(worker.request({"op": op}, timeout=timeout))
+            except WorkerError as e:
+                logger.warning(f"Worker {worker.worker_id} did not answer {op}: {e}")
+        return replies
+
+    def stats(self) -> Dict:
+        return {
+            "size": self.size,
+            "live_workers": sum(1 for w in self.workers if w.is_alive()),
+            "workers": [w.info() for w in self.workers],
+        }
+
+    def _start_worker(self, worker: InferenceWorker):
+        try:
+            worker.start(self.startup_timeout)
+        except Exception as e:
+            logger.error(f"Failed to start inference worker {worker.worker_id}: {e}")
+
+    def _restart(self, worker: InferenceWorker, generation: Optional[int] = None):
+        """Replace ``worker``'s process in the background, unless it is already being replaced."""
+        with self._restart_lock:
+            if self._stop_event.is_set() or worker.restarting:
+                return
+            if generation is not None and generation != worker.generation:
+                # Another caller already replaced this process
+                return
+            worker.restarting = True
+        # Loading models takes up to startup_timeout; other restarts and health checks go on meanwhile
+        threading.Thread(target=self._replace, args=(worker,), name=f"inference-worker-{worker.worker_id}-restart",
+                         daemon=True).start()
+
+    def _replace(self, worker: InferenceWorker):
+        try:
+            logger.warning(f"Restarting inference worker {worker.worker_id}")
+            worker.stop()
+            worker.restarts += 1
+            self._start_worker(worker)
+        finally:
+            worker.restarting = False
+
+    def _health_loop(self):
+        while not self._stop_event.wait(self.health_interval):
+            for worker in self.workers:
+                if worker.restarting:
+                    continue
+                if not worker.is_alive():
+                    self._restart(worker)
+                elif worker.inflight == 0:
+                    generation = worker.generation
+                    try:
+                        worker.request({"op": "ping"}, timeout=10.0)
+                    except WorkerError as e:
+                        logger.warning(f"Health check failed for worker {worker.worker_id}: {e}")
+                        self._restart(worker, generation)
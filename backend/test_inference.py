@@ -8,30 +8,29 @@ import sys
 import os
 from pathlib import Path
 
-# Add the app directory to the path
-sys.path.append(str(Path(__file__).parent / "app"))
+# Add the backend directory to the path
+sys.path.append(str(Path(__file__).parent))
 
-from model import run_inference
+from app import config
+from app.model import run_inference, shutdown_worker_pool
 
 def test_model_setup():
     """Test if the model environment is properly set up."""
     print("Testing model setup...")
     try:
         # Check if model environment is available
-        model_dir = Path(__file__).parent.parent / "model"
-        model_venv_python = model_dir / ".venv" / "Scripts" / "python.exe"
-        inference_script = model_dir / "inference_module.py"
+        model_venv_python = config.model_venv_python()
+        inference_script = config.INFERENCE_SCRIPT
         
-        if not model_venv_python.exists():
-            print(f"✗ Model venv not found at {model_venv_python}")
-            return False
+        if model_venv_python is None:
+            print(f"! Model venv not found, workers will use {config.worker_python()}")
         
         if not inference_script.exists():
             print(f"✗ Inference script not found at {inference_script}")
             return False
         
         print("✓ Model environment is properly set up")
-        print(f"  - Model venv: {model_venv_python}")
+        print(f"  - Worker interpreter: {config.worker_python()}")
         print(f"  - Inference script: {inference_script}")
         return True
         
@@ -110,6 +109,8 @@ def main():
     # Test different model sizes
     test_different_model_sizes()
     
+    shutdown_worker_pool()
+    
     print("\n" + "=" * 50)
     print("Test completed!")
 
@@ -11,12 +11,46 @@ export interface DetectionResult {
     model_size: string;
     num_classes: number;
     device: string;
+    batch_size?: number;
+    profile?: string;
   };
   file_info?: {
     filename: string;
     file_size: number;
     content_type: string;
+    sha256?: string;
   };
+  cached?: boolean;
+  timings?: Record<string, number>;
+  active_segment?: {
+    start_frame: number;
+    end_frame: number;
+    total_frames: number;
+    start_s: number;
+    end_s: number;
+    detected: boolean;
+  };
+  clips?: Array<{
+    start_frame: number;
+    end_frame: number;
+    text?: string;
+    confidence?: number;
+  }>;
+  error?: string;
+  error_type?: string;
+}
+
+export interface StreamPrediction {
+  type: 'prediction' | 'busy' | 'error';
+  frame_index?: number;
+  text?: string;
+  confidence?: number;
+  alternatives?: Array<{
+    text: string;
+    confidence: number;
+  }>;
+  latency_ms?: number;
+  retry_after?: number;
   error?: string;
 }
 
@@ -30,6 +64,14 @@ export interface ModelInfo {
   inference_script_available: boolean;
   model_directory: string;
   status: string;
+  resident_models?: Record<string, {
+    workers: number;
+    device: string;
+    weights: string | null;
+    parameter_bytes: number;
+    load_time_ms: number | null;
+    warm_latency_ms: number | null;
+  }>;
 }
 
 class ApiService {
@@ -78,12 +120,18 @@ class ApiService {
 
   async detectSignLanguage(
     videoBlob: Blob,
-    modelSize: string = '2000'
+    modelSize: string = '2000',
+    activeSegment?: boolean,
+    multiClip?: boolean,
+    profile?: 'fast' | 'balanced' | 'accurate'
   ): Promise<DetectionResult> {
     const formData = new FormData();
     formData.append('file', videoBlob, 'video.webm');
 
-    const url = `${this.baseUrl}/detect?model_size=${modelSize}`;
+    const segmentParam = activeSegment === undefined ? '' : `&active_segment=${activeSegment}`;
+    const clipParam = multiClip === undefined ? '' : `&multi_clip=${multiClip}`;
+    const profileParam = profile === undefined ? '' : `&profile=${profile}`;
+    const url = `${this.baseUrl}/detect?model_size=${modelSize}${segmentParam}${clipParam}${profileParam}`;
     
     try {
       const response = await fetch(url, {
@@ -140,6 +188,36 @@ class ApiService {
       throw new Error('Network error occurred');
     }
   }
+
+  /**
+   * Open a streaming detection session. Send frames as JPEG blobs (or raw
+   * 224x224 RGB buffers); predictions arrive through onMessage.
+   */
+  openDetectionStream(
+    onMessage: (message: StreamPrediction) => void,
+    modelSize: string = '2000',
+    stride?: number
+  ): { sendFrame: (frame: Blob | ArrayBuffer) => void; reset: () => void; close: () => void } {
+    const wsBase = this.baseUrl.replace(/^http/, 'ws');
+    const strideParam = stride ? `&stride=${stride}` : '';
+    const socket = new WebSocket(`${wsBase}/ws/detect?model_size=${modelSize}${strideParam}`);
+    socket.binaryType = 'arraybuffer';
+    socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+
+    return {
+      sendFrame: (frame) => {
+        if (socket.readyState === WebSocket.OPEN) {
+          socket.send(frame);
+        }
+      },
+      reset: () => {
+        if (socket.readyState === WebSocket.OPEN) {
+          socket.send(JSON.stringify({ type: 'reset' }));
+        }
+      },
+      close: () => socket.close(),
+    };
+  }
 }
 
 export const apiService = new ApiService();
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the inference runtime.
+
+Usage:
+    python benchmark.py decode [VIDEO ...] [--repeats N] [--frames 64] [--json]
+    python benchmark.py parity [VIDEO ...] [--model_size 100] [--profile accurate] [--atol 1e-3] [--json]
+    python benchmark.py engines [VIDEO ...] [--model_size 100] [--profile accurate] [--repeats 3]
+                                [--intra_op_threads N] [--inter_op_threads N] [--graph_optimization all]
+                                [--atol 1e-3] [--json]
+    python benchmark.py precisions [VIDEO ...] [--model_size 100] [--profile accurate] [--precisions bf16 int8]
+                                   [--repeats 3] [--json]
+
+``decode`` compares the seek and sequential frame samplers of ``video_io`` on
+each clip (the backend sample videos by default), shows which mode the
+``auto`` sampler settles on and, when PyAV is installed, times the PyAV decoder.
+
+``parity`` runs each clip through an unmodified ``InceptionI3d`` on normalized
+float input and through the serving model (``optimize_model``: folded input
+scaling, fused BatchNorms, static padding) on uint8 input, with the same
+weights, and reports the largest logit difference, whether the
+top-5 predictions agree and both forward latencies. It exits with status 1 if
+any difference exceeds ``--atol``. The same checks, and those of the exported
+graphs, run on random clips in ``test_parity.py`` (``python -m pytest test_parity.py``);
+this command repeats them on real videos.
+
+``engines`` runs each clip through the ``torch`` and ``onnxruntime`` engines
+(the ONNX graphs written by ``python export.py onnx``, with the given session
+settings) and reports the largest logit difference, top-5 agreement and the
+median forward latency of both. It exits with status 1 if any difference
+exceeds ``--atol``.
+
+``precisions`` runs each clip through the torch engine in fp32 and in every
+given precision (``bf16``: channels_last_3d under CPU autocast; ``int8``: the
+graphs of ``python quantize.py``) and reports the precision actually running
+(``bf16`` falls back to fp32 on CPUs without native bf16), the largest logit
+difference to fp32, top-5 agreement and the median forward latency.
+"""
+
+import argparse
+import copy
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+import torch
+
+from inference_module import (
+    PRECISIONS, InceptionI3d, SignLanguageInference, SpatialGlobalAvgPool, load_onnx, optimize_model
+)
+from model_weights import resolve_weights_path
+from onnx_engine import GRAPH_OPTIMIZATION_LEVELS, onnxruntime_available, session_options
+from profiles import PROFILES, get_profile
+from report import print_table
+from video_io import (
+    SAMPLER_MODES, SamplerCostModel, capture_codec, decode_pyav, open_capture, pyav_available, sample_frames,
+    uniform_indices
+)
+import video_io
+
+SAMPLE_VIDEO_DIR = Path(__file__).parent.parent / "backend" / "sample_video"
+
+
+def _default_videos() -> List[str]:
+    return [str(p) for p in sorted(SAMPLE_VIDEO_DIR.glob("*.mp4"))]
+
+
+def _time_sampler(video: str, mode: str, num_frames: int) -> Dict:
+    started = time.perf_counter()
+    with open_capture(video) as vidcap:
+        indices = uniform_indices(int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT)), num_frames)
+        frames = sum(1 for _ in sample_frames(vidcap, [int(i) for i in indices], mode=mode))
+    return {"ms": (time.perf_counter() - started) * 1000, "frames": frames}
+
+
+def _time_pyav(video: str, num_frames: int) -> Dict:
+    # Includes the resize/crop/RGB work the OpenCV timings leave out
+    buffer = np.empty((num_frames, 224, 224, 3), dtype=np.uint8)
+    started = time.perf_counter()
+    frames = decode_pyav(video, buffer)
+    return {"ms": (time.perf_counter() - started) * 1000, "frames": frames}
+
+
+def bench_decode(videos: List[str], repeats: int, num_frames: int) -> List[Dict]:
+    """Time both sampling modes on every clip; the fastest run of each mode is reported."""
+    # Fresh cost model so "auto" starts from scratch, as in a new worker
+    video_io.sampler_costs = SamplerCostModel()
+    rows = []
+    for video in videos:
+        with open_capture(video) as vidcap:
+            total_frames = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+            codec = capture_codec(vidcap)
+        row = {"video": Path(video).name, "codec": codec, "total_frames": total_frames}
+        for mode in SAMPLER_MODES:
+            runs = [_time_sampler(video, mode, num_frames) for _ in range(repeats)]
+            row[f"{mode}_ms"] = round(min(r["ms"] for r in runs), 2)
+            row[f"{mode}_median_ms"] = round(statistics.median(r["ms"] for r in runs), 2)
+            row[f"{mode}_frames"] = runs[-1]["frames"]
+        # Let auto explore both modes, then record what it picks
+        for _ in range(3):
+            _time_sampler(video, "auto", num_frames)
+        indices = uniform_indices(total_frames, num_frames)
+        row["auto_choice"] = video_io.sampler_costs.choose(codec, [int(i) for i in indices])
+        row["speedup"] = round(row["seek_ms"] / row["sequential_ms"], 2) if row["sequential_ms"] else None
+        row["pyav_ms"] = None
+        if pyav_available():
+            runs = [_time_pyav(video, num_frames) for _ in range(repeats)]
+            row["pyav_ms"] = round(min(r["ms"] for r in runs), 2)
+        rows.append(row)
+    return rows
+
+
+def _randomize_batch_norm(model: InceptionI3d):
+    # Freshly initialized BatchNorms are identities, which would let a broken fusion pass
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm3d):
+            module.running_mean.normal_(0.0, 0.1)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.normal_(0.0, 0.1)
+
+
+def _reference_model(model_size: str, seed: int = 0) -> InceptionI3d:
+    """Unmodified InceptionI3d with the serving weights (seeded random weights if they cannot be loaded)."""
+    torch.manual_seed(seed)
+    model = InceptionI3d(400, in_channels=3)
+    model.replace_logits(int(model_size))
+    weights = resolve_weights_path(model_size)
+    loaded = False
+    if weights is not None and weights.exists():
+        try:
+            model.load_state_dict(torch.load(weights, map_location="cpu"))
+            loaded = True
+        except Exception as e:
+            print(f"Using random weights, {weights.name} could not be loaded: {e}", file=sys.stderr)
+    if not loaded:
+        _randomize_batch_norm(model)
+    model.random_weights = not loaded
+    # Exact at 224; lets the reference run the other profiles' crop sizes
+    model.avg_pool = SpatialGlobalAvgPool(model.avg_pool)
+    return model.eval()
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    output = fn(*args)
+    return output, (time.perf_counter() - started) * 1000
+
+
+def bench_parity(videos: List[str], model_size: str, profile: str) -> List[Dict]:
+    """Compare the serving model with the reference model on every clip."""
+    reference = _reference_model(model_size)
+    runtime = SignLanguageInference(model_size)
+    if getattr(reference, "random_weights", False):
+        # Same weights as the reference, through the same load-time transformations
+        runtime.model = optimize_model(copy.deepcopy(reference)).to(runtime.device).eval()
+        runtime.scripted = {}
+    _, shape = get_profile(profile)
+    rows = []
+    for video in videos:
+        clip, _ = runtime.preprocess(video, shape.num_frames, crop_size=shape.crop_size)
+        with torch.no_grad():
+            expected, reference_ms = _timed(lambda x: torch.mean(reference(x), dim=2),
+                                            (clip.float() / 255.0) * 2 - 1)
+        actual, runtime_ms = _timed(runtime.forward, clip)
+        actual = actual.cpu().float()
+        rows.append({
+            "video": Path(video).name,
+            "max_abs_diff": float((actual - expected).abs().max()),
+            "top1_match": bool(torch.equal(actual.argmax(dim=1), expected.argmax(dim=1))),
+            "top5_match": bool(torch.equal(torch.topk(actual, 5).indices, torch.topk(expected, 5).indices)),
+            "reference_ms": round(reference_ms, 2),
+            "runtime_ms": round(runtime_ms, 2),
+        })
+    return rows
+
+
+def bench_engines(videos: List[str], model_size: str, profile: str, repeats: int,
+                  intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None,
+                  graph_optimization: Optional[str] = None) -> List[Dict]:
+    """
+    Compare the onnxruntime engine with the torch engine on every clip.
+
+    Raises:
+        RuntimeError: when onnxruntime is missing or no ONNX graph matches the weights
+    """
+    if not onnxruntime_available():
+        raise RuntimeError("onnxruntime is not installed")
+    torch_runtime = SignLanguageInference(model_size, engine="torch")
+    ort_runtime = SignLanguageInference(model_size, engine="onnxruntime")
+    ort_runtime.sessions = load_onnx(model_size, ort_runtime.weights_path,
+                                     session_options(intra_op_threads, inter_op_threads, graph_optimization))
+    _, shape = get_profile(profile)
+    clip_shape = (shape.num_frames, shape.crop_size, shape.crop_size)
+    if clip_shape not in ort_runtime.sessions:
+        raise RuntimeError(f"No ONNX graph for asl{model_size} at {clip_shape}; run export.py onnx")
+    rows = []
+    for video in videos:
+        clip, _ = torch_runtime.preprocess(video, shape.num_frames, crop_size=shape.crop_size)
+        row = {"video": Path(video).name}
+        outputs = {}
+        for engine, runtime in (("torch", torch_runtime), ("onnxruntime", ort_runtime)):
+            outputs[engine] = runtime.forward(clip).cpu().float()
+            runs = [_timed(runtime.forward, clip)[1] for _ in range(repeats)]
+            row[f"{engine}_ms"] = round(statistics.median(runs), 2)
+        expected, actual = outputs["torch"], outputs["onnxruntime"]
+        row.update({
+            "max_abs_diff": float((actual - expected).abs().max()),
+            "top5_match": bool(torch.equal(torch.topk(actual, 5).indices, torch.topk(expected, 5).indices)),
+            "speedup": round(row["torch_ms"] / row["onnxruntime_ms"], 2) if row["onnxruntime_ms"] else None,
+        })
+        rows.append(row)
+    return rows
+
+
+def bench_precisions(videos: List[str], model_size: str, profile: str, precisions: List[str],
+                     repeats: int) -> List[Dict]:
+    """Compare every precision with fp32 on every clip."""
+    reference = _reference_model(model_size)
+    runtimes = {precision: SignLanguageInference(model_size, engine="torch", precision=precision)
+                for precision in ["fp32"] + [p for p in precisions if p != "fp32"]}
+    if getattr(reference, "random_weights", False):
+        # Same weights for every precision (nothing is exported from random weights)
+        for runtime in runtimes.values():
+            runtime.model = optimize_model(copy.deepcopy(reference)).to(runtime.device,
+                                                                       memory_format=runtime.memory_format)
+            runtime.scripted = {}
+    _, shape = get_profile(profile)
+    rows = []
+    for video in videos:
+        clip, _ = runtimes["fp32"].preprocess(video, shape.num_frames, crop_size=shape.crop_size)
+        expected = None
+        for precision, runtime in runtimes.items():
+            actual = runtime.forward(clip).cpu().float()
+            runs = [_timed(runtime.forward, clip)[1] for _ in range(repeats)]
+            forward_ms = statistics.median(runs)
+            if expected is None:
+                expected, fp32_ms = actual, forward_ms
+            rows.append({
+                "video": Path(video).name,
+                "precision": precision,
+                "running": runtime.stats()["precision"],
+                "max_abs_diff": float((actual - expected).abs().max()),
+                "top5_match": bool(torch.equal(torch.topk(actual, 5).indices, torch.topk(expected, 5).indices)),
+                "forward_ms": round(forward_ms, 2),
+                "speedup": round(fp32_ms / forward_ms, 2) if forward_ms else None,
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inference runtime benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    decode = subparsers.add_parser("decode", help="Compare seek and sequential frame sampling")
+    decode.add_argument("videos", nargs="*", help="Videos to decode (default: backend/sample_video)")
+    decode.add_argument("--repeats", type=int, default=5, help="Timed runs per mode and clip")
+    decode.add_argument("--frames", type=int, default=64, help="Frames sampled per clip")
+    decode.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    parity = subparsers.add_parser("parity", help="Check the serving model against the reference model")
+    parity.add_argument("videos", nargs="*", help="Videos to run (default: backend/sample_video)")
+    parity.add_argument("--model_size", default="100", choices=["100", "300", "1000", "2000"], help="Model size")
+    parity.add_argument("--profile", default="accurate", choices=sorted(PROFILES), help="Clip shape")
+    parity.add_argument("--atol", type=float, default=1e-3, help="Largest tolerated logit difference")
+    parity.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    engines = subparsers.add_parser("engines", help="Compare the onnxruntime engine with the torch engine")
+    engines.add_argument("videos", nargs="*", help="Videos to run (default: backend/sample_video)")
+    engines.add_argument("--model_size", default="100", choices=["100", "300", "1000", "2000"], help="Model size")
+    engines.add_argument("--profile", default="accurate", choices=sorted(PROFILES), help="Clip shape")
+    engines.add_argument("--repeats", type=int, default=3, help="Timed forwards per engine and clip")
+    engines.add_argument("--intra_op_threads", type=int, default=None,
+                         help="ONNX Runtime intra-op threads (default: ORT_INTRA_OP_THREADS)")
+    engines.add_argument("--inter_op_threads", type=int, default=None,
+                         help="ONNX Runtime inter-op threads (default: ORT_INTER_OP_THREADS)")
+    engines.add_argument("--graph_optimization", default=None, choices=GRAPH_OPTIMIZATION_LEVELS,
+                         help="ONNX Runtime graph optimization level (default: ORT_GRAPH_OPTIMIZATION)")
+    engines.add_argument("--atol", type=float, default=1e-3, help="Largest tolerated logit difference")
+    engines.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    precisions = subparsers.add_parser("precisions", help="Compare bf16/int8 execution with fp32")
+    precisions.add_argument("videos", nargs="*", help="Videos to run (default: backend/sample_video)")
+    precisions.add_argument("--model_size", default="100", choices=["100", "300", "1000", "2000"],
+                            help="Model size")
+    precisions.add_argument("--profile", default="accurate", choices=sorted(PROFILES), help="Clip shape")
+    precisions.add_argument("--precisions", nargs="+", default=["bf16"], choices=PRECISIONS,
+                            help="Precisions compared with fp32")
+    precisions.add_argument("--repeats", type=int, default=3, help="Timed forwards per precision and clip")
+    precisions.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "decode":
+        videos = args.videos or _default_videos()
+        if not videos:
+            parser.error(f"No videos given and none found in {SAMPLE_VIDEO_DIR}")
+        rows = bench_decode(videos, args.repeats, args.frames)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print_table(rows, ["video", "codec", "total_frames", "seek_ms", "sequential_ms",
+                                "speedup", "seek_frames", "sequential_frames", "auto_choice", "pyav_ms"])
+    elif args.command == "parity":
+        videos = args.videos or _default_videos()
+        if not videos:
+            parser.error(f"No videos given and none found in {SAMPLE_VIDEO_DIR}")
+        rows = bench_parity(videos, args.model_size, args.profile)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print_table(rows, ["video", "max_abs_diff", "top1_match", "top5_match", "reference_ms", "runtime_ms"])
+        if any(row["max_abs_diff"] > args.atol for row in rows):
+            return 1
+    elif args.command == "engines":
+        videos = args.videos or _default_videos()
+        if not videos:
+            parser.error(f"No videos given and none found in {SAMPLE_VIDEO_DIR}")
+        try:
+            rows = bench_engines(videos, args.model_size, args.profile, args.repeats, args.intra_op_threads,
+                                 args.inter_op_threads, args.graph_optimization)
+        except RuntimeError as e:
+            parser.error(str(e))
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print_table(rows, ["video", "max_abs_diff", "top5_match", "torch_ms", "onnxruntime_ms", "speedup"])
+        if any(row["max_abs_diff"] > args.atol for row in rows):
+            return 1
+    elif args.command == "precisions":
+        videos = args.videos or _default_videos()
+        if not videos:
+            parser.error(f"No videos given and none found in {SAMPLE_VIDEO_DIR}")
+        rows = bench_precisions(videos, args.model_size, args.profile, args.precisions, args.repeats)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print_table(rows, ["video", "precision", "running", "max_abs_diff", "top5_match", "forward_ms",
+                                "speedup"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+LRU cache of decoded, preprocessed clips.
+
+Re-running the same upload with another model size, or as part of a batch,
+repeats the exact same decode, sampling, resize and crop. The cache keeps the
+resulting uint8 frames (about 9.6 MB per 64-frame clip) keyed by the content
+hash of the encoded video and every parameter that influences them, so any
+model instance in the process can skip straight to the forward.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+
+class ClipCache:
+    def __init__(self, max_bytes: int):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Budget for the cached frames (0 disables the cache)
+        """
+        self.max_bytes = max(0, max_bytes)
+        self._entries: "OrderedDict[Hashable, Tuple[np.ndarray, bool, Dict]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[np.ndarray, bool, Dict]]:
+        """
+        Return ``(frames, bgr, info)`` for a cached clip, or None.
+
+        The frames array is shared and read-only; callers must not modify it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry
+
+    def put(self, key: Hashable, frames: np.ndarray, bgr: bool, info: Optional[Dict] = None):
+        """
+        Store a copy of ``frames`` (T, H, W, 3) uint8, evicting old clips to stay in budget.
+
+        ``info`` describes how the clip was sampled and is returned with it.
+        """
+        if not self.enabled or frames.nbytes > self.max_bytes:
+            return
+        frames = frames.copy()
+        frames.flags.writeable = False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0].nbytes
+            self._entries[key] = (frames, bgr, dict(info or {}))
+            self._bytes += frames.nbytes
+            self._counters["stores"] += 1
+            while self._bytes > self.max_bytes:
+                _, (evicted, _, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -5,12 +5,45 @@ from torch.autograd import Variable
 
 import numpy as np
 
+import math
 import os
 import sys
 from collections import OrderedDict
 
 
+def relu_inplace(x):
+    return F.relu(x, inplace=True)
+
+
+def clip_shape(x):
+    # (T, H, W) as plain ints, also while tracing, where sizes are traced tensors
+    return tuple(int(s) for s in x.shape[2:])
+
+
+def same_padding_plan(kernel, stride, shape, foldable=True):
+    """Static 'same' padding of a layer for inputs of shape (T, H, W).
+
+    Returns (pad, padding, output shape): ``pad`` is the F.pad argument still
+    needed (None when the padding is symmetric and ``foldable``) and ``padding``
+    the symmetric part handed to the conv/pool itself.
+    """
+    total = []
+    for k, st, s in zip(kernel, stride, shape):
+        total.append(max(k - st, 0) if s % st == 0 else max(k - (s % st), 0))
+    front = [p // 2 for p in total]
+    back = [p - f for p, f in zip(total, front)]
+    out_shape = tuple(int(math.ceil(float(s) / float(st))) for s, st in zip(shape, stride))
+    if foldable and front == back:
+        return None, tuple(front), out_shape
+    return (front[2], back[2], front[1], back[1], front[0], back[0]), (0, 0, 0), out_shape
+
+
 class MaxPool3dSamePadding(nn.MaxPool3d):
+
+    def __init__(self, *args, **kwargs):
+        super(MaxPool3dSamePadding, self).__init__(*args, **kwargs)
+        # (T, H, W) -> (explicit pad or None, pool padding); see InceptionI3d.plan_padding
+        self._pad_plans = {}
     
     def compute_pad(self, dim, s):
         if s % self.stride[dim] == 0:
@@ -18,7 +51,22 @@ class MaxPool3dSamePadding(nn.MaxPool3d):
         else:
             return max(self.kernel_size[dim] - (s % self.stride[dim]), 0)
 
+    def plan_padding(self, shape):
+        # MaxPool3d pads with -inf rather than zeros; both give the same maxima here
+        # because every pool in I3D follows a ReLU
+        pad, padding, out_shape = same_padding_plan(self.kernel_size, self.stride, shape)
+        self._pad_plans[tuple(shape)] = (pad, padding)
+        return out_shape
+
     def forward(self, x):
+        plan = self._pad_plans.get(clip_shape(x)) if self._pad_plans else None
+        if plan is not None:
+            pad, padding = plan
+            if pad is not None:
+                x = F.pad(x, pad)
+            return F.max_pool3d(x, self.kernel_size, self.stride, padding, self.dilation,
+                                ceil_mode=self.ceil_mode)
+
         # compute 'same' padding
         (batch, channel, t, h, w) = x.size()
         #print t,h,w
@@ -68,6 +116,10 @@ class Unit3D(nn.Module):
         self._use_bias = use_bias
         self.name = name
         self.padding = padding
+        # Value of the 'same' padding; see InceptionI3d.fold_input_normalization
+        self.pad_value = 0.0
+        # (T, H, W) -> (explicit pad or None, conv padding); see InceptionI3d.plan_padding
+        self._pad_plans = {}
         
         self.conv3d = nn.Conv3d(in_channels=in_channels,
                                 out_channels=self._output_channels,
@@ -85,8 +137,48 @@ class Unit3D(nn.Module):
         else:
             return max(self._kernel_shape[dim] - (s % self._stride[dim]), 0)
 
-            
+    def fuse_batch_norm(self):
+        """Folds the eval-mode BatchNorm3d into the convolution's weights and bias."""
+        if not self._use_batch_norm:
+            return
+        conv, bn = self.conv3d, self.bn
+        with torch.no_grad():
+            # bn(conv(x) + b) == conv(x) * scale + (b - mean) * scale + beta
+            scale = bn.weight.double() / torch.sqrt(bn.running_var.double() + bn.eps)
+            bias = conv.bias.double() if conv.bias is not None else torch.zeros_like(scale)
+            conv.weight.copy_(conv.weight.double() * scale.view(-1, 1, 1, 1, 1))
+            conv.bias = nn.Parameter(((bias - bn.running_mean.double()) * scale + bn.bias.double()).to(conv.weight.dtype),
+                                     requires_grad=False)
+        del self.bn
+        self._use_bias = True
+        self._use_batch_norm = False
+        # The conv output is a fresh tensor now, so the activation can overwrite it
+        if self._activation_fn is F.relu:
+            self._activation_fn = relu_inplace
+
+    def plan_padding(self, shape):
+        # A non-zero pad value cannot be expressed through the conv's own padding
+        pad, padding, out_shape = same_padding_plan(self._kernel_shape, self._stride, shape,
+                                                    foldable=self.pad_value == 0)
+        self._pad_plans[tuple(shape)] = (pad, padding)
+        return out_shape
+
     def forward(self, x):
+        plan = self._pad_plans.get(clip_shape(x)) if self._pad_plans else None
+        if plan is not None:
+            pad, padding = plan
+            if pad is not None:
+                x = F.pad(x, pad, value=self.pad_value)
+            x = F.conv3d(x, self.conv3d.weight, self.conv3d.bias, self.conv3d.stride, padding)
+        else:
+            x = self._conv_same(x)
+        if self._use_batch_norm:
+            x = self.bn(x)
+        if self._activation_fn is not None:
+            x = self._activation_fn(x)
+        return x
+
+    def _conv_same(self, x):
         # compute 'same' padding
         (batch, channel, t, h, w) = x.size()
         #print t,h,w
@@ -109,15 +201,10 @@ class Unit3D(nn.Module):
         pad = (pad_w_f, pad_w_b, pad_h_f, pad_h_b, pad_t_f, pad_t_b)
         #print x.size()
         #print pad
-        x = F.pad(x, pad)
+        x = F.pad(x, pad, value=self.pad_value)
         #print x.size()        
 
-        x = self.conv3d(x)
-        if self._use_batch_norm:
-            x = self.bn(x)
-        if self._activation_fn is not None:
-            x = self._activation_fn(x)
-        return x
+        return self.conv3d(x)
 
 
 
@@ -141,6 +228,12 @@ class InceptionModule(nn.Module):
                           name=name+'/Branch_3/Conv3d_0b_1x1')
         self.name = name
 
+    def plan_padding(self, shape):
+        # Every branch keeps the input's shape
+        for layer in (self.b0, self.b1a, self.b1b, self.b2a, self.b2b, self.b3a, self.b3b):
+            layer.plan_padding(shape)
+        return tuple(shape)
+
     def forward(self, x):    
         b0 = self.b0(x)
         b1 = self.b1b(self.b1a(x))
@@ -213,6 +306,8 @@ class InceptionI3d(nn.Module):
         self._spatial_squeeze = spatial_squeeze
         self._final_endpoint = final_endpoint
         self.logits = None
+        # True once the input scaling is folded into the first convolution
+        self.raw_input = False
 
         if self._final_endpoint not in self.VALID_ENDPOINTS:
             raise ValueError('Unknown final endpoint %s' % self._final_endpoint)
@@ -317,8 +412,80 @@ class InceptionI3d(nn.Module):
     def build(self):
         for k in self.end_points.keys():
             self.add_module(k, self.end_points[k])
+
+    def fold_input_normalization(self):
+        """Folds the (x / 255) * 2 - 1 input scaling into Conv3d_1a_7x7.
+
+        Afterwards the model takes raw pixel values, as uint8 or float in
+        [0, 255], so clips never need to be expanded and scaled beforehand. The
+        layer's 'same' padding becomes 127.5, the raw value of the 0 it used to
+        pad normalized clips with, so outputs match up to float rounding.
+        Must be called after the weights are loaded.
+        """
+        if self.raw_input:
+            return
+        unit = self._modules['Conv3d_1a_7x7']
+        conv = unit.conv3d
+        with torch.no_grad():
+            weight = conv.weight.double()
+            # conv(W, 2x/255 - 1) + b == conv(2W/255, x) + (b - sum(W))
+            bias = -weight.sum(dim=(1, 2, 3, 4))
+            if conv.bias is not None:
+                bias += conv.bias.double()
+            conv.weight.copy_(weight * (2.0 / 255.0))
+            conv.bias = nn.Parameter(bias.to(conv.weight.dtype), requires_grad=conv.weight.requires_grad)
+        unit._use_bias = True
+        unit.pad_value = 127.5
+        # Plans made so far may have folded this layer's padding into the conv
+        unit._pad_plans.clear()
+        self.raw_input = True
+
+    def fuse_for_inference(self):
+        """Folds every BatchNorm3d into the convolution before it, for inference.
+
+        Each Unit3D, including those in the InceptionModule branches, then runs
+        a single convolution (with bias) and an in-place ReLU instead of a
+        convolution, a separate normalization pass and a ReLU. Uses the running
+        statistics, so the model must be in eval mode; it cannot be trained
+        afterwards.
+        """
+        if self.training:
+            raise RuntimeError('fuse_for_inference() requires eval mode')
+        for module in self.modules():
+            if isinstance(module, Unit3D):
+                module.fuse_batch_norm()
+        return self
+
+    def plan_padding(self, input_shape):
+        """Precomputes the 'same' padding of every layer for clips of shape (T, H, W).
+
+        Inputs of a planned shape skip the per-layer padding arithmetic;
+        symmetric pads are passed to the convolutions and pools themselves
+        instead of materializing a padded copy of the activation, and only
+        asymmetric ones remain explicit. Can be called for several shapes; other
+        shapes keep computing their padding on every forward. Call it after
+        fold_input_normalization, whose padding cannot be folded.
+        """
+        shape = tuple(input_shape)
+        for end_point in self.VALID_ENDPOINTS:
+            if end_point in self.end_points:
+                shape = self._modules[end_point].plan_padding(shape)
+        # avg_pool: two-frame temporal window over the whole feature map
+        self.logits.plan_padding((max(shape[0] - 1, 1), 1, 1))
+
+    def clear_padding_plans(self):
+        for module in self.modules():
+            if isinstance(module, (Unit3D, MaxPool3dSamePadding)):
+                module._pad_plans.clear()
+
+    def _input(self, x):
+        # Raw uint8 clips are converted on the model's device, after any host-to-device copy
+        if self.raw_input and not x.is_floating_point():
+            x = x.to(self._modules['Conv3d_1a_7x7'].conv3d.weight.dtype)
+        return x
         
     def forward(self, x, pretrained=False, n_tune_layers=-1):
+        x = self._input(x)
         if pretrained:
             assert n_tune_layers >= 0
 
@@ -348,6 +515,7 @@ class InceptionI3d(nn.Module):
         
 
     def extract_features(self, x):
+        x = self._input(x)
         for end_point in self.VALID_ENDPOINTS:
             if end_point in self.end_points:
                 x = self._modules[end_point](x)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Accuracy of the inference runtime on the WLASL splits.
+
+Usage:
+    python evaluate.py [--split archive/nslt_100.json] [--videos DIR] [--subset test]
+                       [--profiles fast balanced accurate] [--limit N] [--json]
+
+Every video of the chosen subset is run through ``SignLanguageInference`` once
+per profile, exactly as the backend would preprocess it, and top-1/top-5
+accuracy plus per-clip latency are reported. Accuracy deltas are relative to
+the first profile given (``accurate`` by default), which is the accuracy cost
+of shedding load by switching profiles. Videos are looked up as
+``<video_id>.mp4`` in the directory written by ``start_kit/preprocess.py``;
+missing ones are skipped and counted.
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from inference_module import SignLanguageInference
+from profiles import PROFILES, get_profile
+from report import print_table
+
+ARCHIVE_DIR = Path(__file__).parent / "archive"
+VIDEOS_DIR = Path(__file__).parent / "start_kit" / "videos"
+
+
+def load_split(split_file: Path, subset: str = "test") -> List[Tuple[str, int]]:
+    """(video id, class index) of every video of ``subset`` in an nslt_*.json split."""
+    with open(split_file) as f:
+        content = json.load(f)
+    return sorted((vid, int(entry["action"][0])) for vid, entry in content.items() if entry["subset"] == subset)
+
+
+def split_model_size(split_file: Path) -> Optional[str]:
+    """Model size matching a split file, from its name (nslt_300.json -> "300")."""
+    match = re.search(r"nslt_(\d+)", split_file.name)
+    return match.group(1) if match else None
+
+
+def find_videos(samples: List[Tuple[str, int]], videos_dir: Path) -> Tuple[List[Tuple[Path, int]], int]:
+    """Paths of the samples present in ``videos_dir``, and the number missing."""
+    found = [(videos_dir / f"{vid}.mp4", label) for vid, label in samples]
+    present = [(path, label) for path, label in found if path.exists()]
+    return present, len(found) - len(present)
+
+
+def evaluate_model(model: SignLanguageInference, videos: List[Tuple[Path, int]], profile: Optional[str] = None,
+                   multi_clip: bool = False) -> Dict:
+    """
+    Top-1/top-5 accuracy and mean latency of ``model`` on labelled videos.
+
+    Args:
+        model: Loaded model instance
+        videos: (path, class index) pairs
+        profile: Quality/latency profile (defaults to INFERENCE_PROFILE)
+        multi_clip: Average consecutive windows over long videos
+
+    Returns:
+        Counts, accuracies in percent (overall, and averaged per class as in
+        code/I3D/test_i3d.py) and mean preprocess/forward milliseconds
+    """
+    name, shape = get_profile(profile)
+    top1 = top5 = failed = 0
+    # class index -> [videos, top-1 hits, top-5 hits]
+    per_class: Dict[int, List[int]] = {}
+    preprocess_ms = forward_ms = 0.0
+    for path, label in videos:
+        started = time.perf_counter()
+        try:
+            clip, _ = model.preprocess(str(path), shape.num_frames, multi_clip=multi_clip,
+                                       crop_size=shape.crop_size)
+        except Exception:
+            failed += 1
+            continue
+        decoded = time.perf_counter()
+        logits = torch.mean(model.forward(clip), dim=0)
+        preprocess_ms += (decoded - started) * 1000
+        forward_ms += (time.perf_counter() - decoded) * 1000
+        ranked = torch.topk(logits, min(5, logits.numel())).indices.tolist()
+        top1 += int(ranked[0] == label)
+        top5 += int(label in ranked)
+        counts = per_class.setdefault(label, [0, 0, 0])
+        counts[0] += 1
+        counts[1] += int(ranked[0] == label)
+        counts[2] += int(label in ranked)
+    evaluated = len(videos) - failed
+    return {
+        "profile": name,
+        "frames": shape.num_frames,
+        "crop": shape.crop_size,
+        "videos": evaluated,
+        "failed": failed,
+        "top1": round(100.0 * top1 / evaluated, 2) if evaluated else None,
+        "top5": round(100.0 * top5 / evaluated, 2) if evaluated else None,
+        "top1_per_class": _per_class_accuracy(per_class, 1),
+        "top5_per_class": _per_class_accuracy(per_class, 2),
+        "preprocess_ms": round(preprocess_ms / evaluated, 2) if evaluated else None,
+        "forward_ms": round(forward_ms / evaluated, 2) if evaluated else None,
+    }
+
+
+def _per_class_accuracy(per_class: Dict[int, List[int]], column: int) -> Optional[float]:
+    if not per_class:
+        return None
+    return round(100.0 * sum(c[column] / c[0] for c in per_class.values()) / len(per_class), 2)
+
+
+def add_deltas(rows: List[Dict]) -> List[Dict]:
+    """Accuracy and latency of every row relative to the first one."""
+    reference = rows[0]
+    for row in rows:
+        for key in ("top1", "top5", "top1_per_class", "top5_per_class"):
+            both = row[key] is not None and reference[key] is not None
+            row[f"{key}_delta"] = round(row[key] - reference[key], 2) if both else None
+        both = row["forward_ms"] and reference["forward_ms"]
+        row["speedup"] = round(reference["forward_ms"] / row["forward_ms"], 2) if both else None
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate inference profiles on a WLASL split")
+    parser.add_argument("--split", type=Path, default=ARCHIVE_DIR / "nslt_100.json", help="nslt_*.json split file")
+    parser.add_argument("--videos", type=Path, default=VIDEOS_DIR, help="Directory of <video_id>.mp4 files")
+    parser.add_argument("--subset", default="test", choices=["train", "val", "test"], help="Subset to evaluate")
+    parser.add_argument("--model_size", default=None, choices=["100", "300", "1000", "2000"],
+                        help="Model size (default: from the split file name)")
+    parser.add_argument("--profiles", nargs="+", default=["accurate", "balanced", "fast"], choices=sorted(PROFILES),
+                        help="Profiles to evaluate; deltas are relative to the first")
+    parser.add_argument("--multi_clip", action="store_true", help="Average consecutive windows over long videos")
+    parser.add_argument("--limit", type=int, default=0, help="Evaluate at most this many videos (0: all)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    model_size = args.model_size or split_model_size(args.split)
+    if model_size is None:
+        parser.error(f"Cannot infer the model size from {args.split.name}; pass --model_size")
+    videos, missing = find_videos(load_split(args.split, args.subset), args.videos)
+    if args.limit > 0:
+        videos = videos[:args.limit]
+    if not videos:
+        parser.error(f"None of the {args.subset} videos of {args.split.name} were found in {args.videos}")
+
+    model = SignLanguageInference(model_size)
+    rows = add_deltas([evaluate_model(model, videos, profile, args.multi_clip) for profile in args.profiles])
+    if args.json:
+        print(json.dumps({"split": args.split.name, "subset": args.subset, "model_size": model_size,
+                          "missing": missing, "profiles": rows}, indent=2))
+    else:
+        print(f"{args.split.name} ({args.subset}): {len(videos)} videos, {missing} missing, model {model_size}")
+        print_table(rows, ["profile", "frames", "crop", "videos", "top1", "top1_delta", "top5", "top5_delta",
+                            "preprocess_ms", "forward_ms", "speedup"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
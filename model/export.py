@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Export the serving model as frozen graphs, next to its weights.
+
+Usage:
+    python export.py torchscript [--model_size 100 300 ...] [--force]
+    python export.py onnx [--model_size 100 300 ...] [--force] [--opset 17]
+
+``torchscript`` builds the serving model of each size (``optimize_model``:
+folded input scaling, fused BatchNorms, static padding), traces it once per
+clip shape the runtime produces (``planned_shapes``: one per profile, plus
+multi-clip windows), freezes the trace and saves it as
+``archived/asl{size}/i3d_<weights sha256>_<T>x<H>x<W>.torchscript``. The
+inference module loads these in preference to building the model in Python,
+which skips the weight load and graph rewrites at worker startup and runs the
+forward without Python dispatch per layer. Graphs carry the weights digest,
+torch version and export version; ones that no longer match are ignored at
+load time, so re-run the export after retraining or upgrading torch.
+
+``onnx`` exports the same graphs as ONNX models with a dynamic batch
+dimension (``...<T>x<H>x<W>.onnx``, metadata in the model properties), for
+the ``onnxruntime`` engine (``INFERENCE_ENGINE=onnxruntime``). Requires the
+``onnx`` package; every graph is checked against the torch model in ONNX
+Runtime when it is installed.
+"""
+
+import argparse
+import json
+import sys
+import time
+import warnings
+from typing import Dict, List, Tuple
+
+import torch
+
+from inference_module import (
+    EXPORT_VERSION, ONNX_SUFFIX, TORCHSCRIPT_SUFFIX, InceptionI3d, build_model, planned_shapes
+)
+from model_weights import exported_artifact_path, resolve_weights_path, weights_sha256
+from onnx_engine import INPUT_NAME, OUTPUT_NAME, OnnxRuntimeModel, onnxruntime_available
+from report import print_table
+
+MODEL_SIZES = ["100", "300", "1000", "2000"]
+
+
+def _serving_model(model_size: str) -> Tuple[InceptionI3d, Dict]:
+    """
+    The serving model of ``model_size`` on the CPU, and the metadata its exported graphs carry.
+
+    Raises:
+        FileNotFoundError: when the model size has no weights
+        Exception: whatever loading the weights raised (random weights are never exported)
+    """
+    weights = resolve_weights_path(model_size)
+    if weights is None:
+        raise FileNotFoundError(f"No weights found for asl{model_size}")
+    model = build_model(int(model_size), weights, torch.device("cpu"), require_weights=True)
+    tensors = list(model.parameters()) + list(model.buffers())
+    meta = {
+        "model_size": model_size,
+        "weights": weights.name,
+        "weights_sha256": weights_sha256(weights),
+        "torch": torch.__version__,
+        "export_version": EXPORT_VERSION,
+        # Every graph freezes its own copy of the weights
+        "graph_parameter_bytes": sum(t.numel() * t.element_size() for t in tensors),
+    }
+    return model, meta
+
+
+def _max_abs_diff(exported, model: InceptionI3d, shape: Tuple[int, int, int]) -> float:
+    # The graph must reproduce the eager model, also at another batch size than it was traced with
+    check = torch.randint(0, 256, (2, 3) + shape, dtype=torch.uint8)
+    with torch.no_grad():
+        return float((exported(check) - model(check)).abs().max())
+
+
+def export_torchscript(model_size: str, force: bool = False) -> List[Dict]:
+    """
+    Trace, freeze and save the serving model of ``model_size`` for every planned clip shape.
+
+    Raises:
+        FileNotFoundError: when the model size has no weights
+        Exception: whatever loading the weights raised (random weights are never exported)
+    """
+    model, meta = _serving_model(model_size)
+    rows = []
+    for shape in planned_shapes():
+        path = exported_artifact_path(model_size, meta["weights_sha256"], shape, TORCHSCRIPT_SUFFIX)
+        row = {"model_size": model_size, "shape": "x".join(map(str, shape)), "file": path.name}
+        if path.exists() and not force:
+            rows.append({**row, "status": "exists", "export_ms": None, "max_abs_diff": None})
+            continue
+        started = time.perf_counter()
+        example = torch.randint(0, 256, (1, 3) + shape, dtype=torch.uint8)
+        with torch.no_grad(), warnings.catch_warnings():
+            # Padding plans are looked up by clip shape, which is fixed per graph
+            warnings.simplefilter("ignore", torch.jit.TracerWarning)
+            traced = torch.jit.freeze(torch.jit.trace(model, example))
+        max_abs_diff = _max_abs_diff(traced, model, shape)
+        torch.jit.save(traced, str(path), _extra_files={"meta.json": json.dumps({**meta, "shape": list(shape)})})
+        rows.append({**row, "status": "written", "export_ms": round((time.perf_counter() - started) * 1000, 1),
+                     "max_abs_diff": max_abs_diff})
+    return rows
+
+
+def export_onnx(model_size: str, force: bool = False, opset: int = 17) -> List[Dict]:
+    """
+    Export the serving model of ``model_size`` to ONNX for every planned clip shape.
+
+    The batch dimension is dynamic; time and space are fixed per graph like the
+    padding plans. ``max_abs_diff`` is None when onnxruntime is not installed.
+
+    Raises:
+        FileNotFoundError: when the model size has no weights
+        Exception: whatever loading the weights raised (random weights are never exported)
+    """
+    import onnx
+
+    model, meta = _serving_model(model_size)
+    rows = []
+    for shape in planned_shapes():
+        path = exported_artifact_path(model_size, meta["weights_sha256"], shape, ONNX_SUFFIX)
+        row = {"model_size": model_size, "shape": "x".join(map(str, shape)), "file": path.name}
+        if path.exists() and not force:
+            rows.append({**row, "status": "exists", "export_ms": None, "max_abs_diff": None})
+            continue
+        started = time.perf_counter()
+        example = torch.randint(0, 256, (1, 3) + shape, dtype=torch.uint8)
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter("ignore", torch.jit.TracerWarning)
+            torch.onnx.export(model, (example,), str(path), input_names=[INPUT_NAME], output_names=[OUTPUT_NAME],
+                              dynamic_axes={INPUT_NAME: {0: "batch"}, OUTPUT_NAME: {0: "batch"}},
+                              opset_version=opset, dynamo=False)
+        graph = onnx.load(str(path))
+        props = {**meta, "shape": "x".join(map(str, shape))}
+        onnx.helper.set_model_props(graph, {key: str(value) for key, value in props.items()})
+        onnx.save(graph, str(path))
+        max_abs_diff = _max_abs_diff(OnnxRuntimeModel(path), model, shape) if onnxruntime_available() else None
+        rows.append({**row, "status": "written", "export_ms": round((time.perf_counter() - started) * 1000, 1),
+                     "max_abs_diff": max_abs_diff})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the serving model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    torchscript = subparsers.add_parser("torchscript", help="Export frozen TorchScript graphs per clip shape")
+    torchscript.add_argument("--model_size", nargs="+", default=MODEL_SIZES, choices=MODEL_SIZES,
+                             help="Model sizes to export (default: all)")
+    torchscript.add_argument("--force", action="store_true", help="Overwrite existing graphs")
+    torchscript.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    onnx = subparsers.add_parser("onnx", help="Export ONNX graphs per clip shape, with a dynamic batch dimension")
+    onnx.add_argument("--model_size", nargs="+", default=MODEL_SIZES, choices=MODEL_SIZES,
+                      help="Model sizes to export (default: all)")
+    onnx.add_argument("--force", action="store_true", help="Overwrite existing graphs")
+    onnx.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    onnx.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    args = parser.parse_args(argv)
+
+    if args.command in ("torchscript", "onnx"):
+        rows, failed = [], False
+        for model_size in args.model_size:
+            try:
+                if args.command == "torchscript":
+                    rows += export_torchscript(model_size, args.force)
+                else:
+                    rows += export_onnx(model_size, args.force, args.opset)
+            except Exception as e:
+                print(f"asl{model_size}: export failed: {e}", file=sys.stderr)
+                failed = True
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        elif rows:
+            print_table(rows, ["model_size", "shape", "file", "status", "export_ms", "max_abs_diff"])
+        if failed:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
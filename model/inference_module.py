@@ -5,13 +5,19 @@ This module can be imported by the backend to run model inference.
 """
 
 import torch
+import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
 import cv2
 import os
 import sys
+import time
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import logging
 
 # Add the I3D code path
@@ -20,22 +26,293 @@ i3d_path = current_dir / "code" / "I3D"
 sys.path.append(str(i3d_path))
 
 from pytorch_i3d import InceptionI3d
+from clip_cache import ClipCache
+from inference_protocol import FrameTooLarge, ProtocolError, read_message, write_message
+from micro_batcher import MicroBatcher
+from onnx_engine import OnnxRuntimeModel, onnxruntime_available
+from model_weights import exported_artifact_path, resolve_weights_path, weights_sha256
+from profiles import PROFILES, get_profile
+from video_io import (
+    DECODE_BACKEND, ActiveSegment, EncodedVideo, FrameIndices, VideoSource, count_frames, decode_pyav,
+    detect_active_segment,
+    open_capture, pyav_available, sample_frames, sampler_costs, sampling_indices, window_starts
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Micro-batching of concurrent requests (BATCH_MAX_SIZE=1 disables it)
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "4"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+# Decoder threads that run ahead of the model in batch prediction
+PREPROCESS_THREADS = int(os.getenv("PREPROCESS_THREADS", "2"))
+# Requests a persistent worker processes concurrently (decode overlaps, forwards are batched)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", str(max(1, BATCH_MAX_SIZE))))
+# Budget for decoded clips shared by all model sizes in this process (0 disables the cache)
+CLIP_CACHE_BYTES = int(os.getenv("CLIP_CACHE_BYTES", str(256 * 1024 * 1024)))
+clip_cache = ClipCache(CLIP_CACHE_BYTES)
+
+# Per-thread uint8 frame buffers reused across clips (decoding runs on several threads)
+_frame_buffers = threading.local()
+
+def _frame_buffer(num_frames: int, size: int = 224) -> np.ndarray:
+    """Reusable (T, H, W, 3) uint8 buffer owned by the calling thread."""
+    buffer = getattr(_frame_buffers, "buffer", None)
+    # Grow only, so multi-clip decodes do not thrash the buffer of regular ones
+    if buffer is None or buffer.shape[1:] != (size, size, 3) or len(buffer) < num_frames:
+        buffer = np.empty((num_frames, size, size, 3), dtype=np.uint8)
+        _frame_buffers.buffer = buffer
+    return buffer[:num_frames]
+
+def _clip_cache_key(video: VideoSource, num_frames: int, size: int = 224, **options) -> Optional[tuple]:
+    """Cache key covering the content and every parameter that shapes the decoded clip."""
+    # Only uploads carry a content hash; bare paths (e.g. CLI runs) are decoded every time
+    if not clip_cache.enabled or not isinstance(video, EncodedVideo):
+        return None
+    return (video.sha256, num_frames, size, DECODE_BACKEND) + tuple(sorted(options.items()))
+
+def clip_to_tensor(frames: np.ndarray, bgr: bool = False) -> torch.Tensor:
+    """
+    Convert (T, H, W, 3) uint8 frames to a (1, 3, T, H, W) uint8 tensor;
+    (N, T, H, W, 3) stacks of clips become (N, 3, T, H, W).
+    
+    Clips stay uint8 (a quarter of the float32 size) up to the model, whose first
+    convolution has the [-1, 1] scaling folded in (see optimize_model). Channel
+    reordering and the layout change happen in a single copy into the output tensor.
+    """
+    if frames.ndim == 4:
+        frames = frames[None]
+    if bgr:
+        frames = frames[..., ::-1]
+    tensor = torch.empty(frames.shape[:1] + (3,) + frames.shape[1:4], dtype=torch.uint8)
+    np.copyto(tensor.numpy(), frames.transpose(0, 4, 1, 2, 3))
+    return tensor
+
+# Restrict sampling to the detected active (moving) segment unless a request says otherwise
+ACTIVE_SEGMENT_DEFAULT = os.getenv("ACTIVE_SEGMENT", "0").lower() in ("1", "true", "yes")
+
+# Multi-clip inference for videos longer than one window: frames per window, frames between
+# window starts and the most windows per video; all windows share one batched forward
+MULTI_CLIP_DEFAULT = os.getenv("MULTI_CLIP", "0").lower() in ("1", "true", "yes")
+# (0: the profile's frame count, and stride = window)
+MULTI_CLIP_WINDOW = int(os.getenv("MULTI_CLIP_WINDOW", "0"))
+MULTI_CLIP_STRIDE = int(os.getenv("MULTI_CLIP_STRIDE", "0"))
+MULTI_CLIP_MAX = int(os.getenv("MULTI_CLIP_MAX", "4"))
+
+# Precompute per-layer padding for the profiles' clip shapes instead of on every forward
+STATIC_PADDING = os.getenv("STATIC_PADDING", "1").lower() in ("1", "true", "yes")
+# Prefer graphs exported with `python export.py torchscript` over building the model in Python
+TORCHSCRIPT = os.getenv("TORCHSCRIPT", "1").lower() in ("1", "true", "yes")
+TORCHSCRIPT_SUFFIX = ".torchscript"
+# Bump when optimize_model changes the graph, so older exported artifacts are not loaded
+EXPORT_VERSION = 1
+ONNX_SUFFIX = ".onnx"
+# Engine running the forward: "torch" (TorchScript graphs / eager) or "onnxruntime" (graphs
+# exported with `python export.py onnx`, CPU only); shapes without an ONNX graph fall back to torch
+ENGINES = ("torch", "onnxruntime")
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "torch")
+# "int8" runs the graphs quantized with `python quantize.py`, whatever the engine; shapes
+# without a quantized graph run in fp32. "bf16" runs the Python model in channels_last_3d
+# under CPU autocast bfloat16, whatever the engine, and fp32 on CPUs without native bf16
+PRECISIONS = ("fp32", "int8", "bf16")
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32")
+INT8_TORCHSCRIPT_SUFFIX = ".int8.torchscript"
+
+class SpatialGlobalAvgPool(nn.Module):
+    """
+    Replacement for InceptionI3d's final AvgPool3d([2, 7, 7]) that accepts any crop size.
+    
+    The fixed 7x7 kernel only fits the 7x7 feature maps of 224-pixel crops; other
+    crops are averaged over their whole feature map instead, with the same
+    two-step temporal window.
+    """
+    def __init__(self, pool: nn.AvgPool3d):
+        super().__init__()
+        self.pool = pool
+    
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if tuple(x.shape[-2:]) == tuple(self.pool.kernel_size[1:]):
+            return self.pool(x)
+        return F.avg_pool3d(x.mean(dim=(3, 4), keepdim=True), kernel_size=(self.pool.kernel_size[0], 1, 1),
+                            stride=1)
+
+def planned_shapes() -> List[Tuple[int, int, int]]:
+    """(T, H, W) of every clip the runtime produces: one per profile, plus multi-clip windows."""
+    shapes = set()
+    for profile in PROFILES.values():
+        shapes.add((profile.num_frames, profile.crop_size, profile.crop_size))
+        if MULTI_CLIP_WINDOW:
+            shapes.add((MULTI_CLIP_WINDOW, profile.crop_size, profile.crop_size))
+    return sorted(shapes)
+
+def optimize_model(model: InceptionI3d) -> InceptionI3d:
+    """
+    Prepare a loaded InceptionI3d for serving, in place.
+    
+    The model is switched to eval mode, the final pool is made crop-size agnostic
+    for the profiles, the input scaling is folded into the first convolution so
+    the model takes uint8 clips, every BatchNorm is fused into its convolution,
+    and (unless STATIC_PADDING=0) the 'same' padding of every layer is planned
+    for the clip shapes of all profiles. Outputs match the unmodified model on
+    normalized clips up to float rounding (``test_parity.py`` checks this).
+    """
+    model.eval()
+    if not isinstance(model.avg_pool, SpatialGlobalAvgPool):
+        model.avg_pool = SpatialGlobalAvgPool(model.avg_pool)
+    model.fold_input_normalization()
+    model.fuse_for_inference()
+    if STATIC_PADDING:
+        for shape in planned_shapes():
+            model.plan_padding(shape)
+    return model
+
+def bf16_supported() -> bool:
+    """Whether this CPU runs bfloat16 natively (AVX512-BF16 or AMX), through oneDNN."""
+    if not torch.backends.mkldnn.is_available():
+        return False
+    # Without these, oneDNN emulates bf16 with AVX512 and is slower than fp32
+    checks = [getattr(torch.cpu, name, None) for name in ("_is_avx512_bf16_supported", "_is_amx_tile_supported")]
+    return any(check() for check in checks if check is not None)
+
+def build_model(num_classes: int, weights_path: Optional[Path], device: torch.device,
+                require_weights: bool = False,
+                memory_format: torch.memory_format = torch.contiguous_format) -> InceptionI3d:
+    """
+    Build InceptionI3d, load its weights and prepare it for serving (optimize_model).
+    
+    Missing or unreadable weights leave the model randomly initialized, with a
+    warning, unless ``require_weights`` is set, in which case the error is raised.
+    ``memory_format`` is the layout of the convolution weights.
+    """
+    model = InceptionI3d(400, in_channels=3)
+    model.replace_logits(num_classes)
+    
+    # Load pre-trained weights if available; otherwise proceed with random weights
+    if weights_path and weights_path.exists():
+        try:
+            model.load_state_dict(torch.load(weights_path, map_location=device))
+            logger.info("Model weights loaded successfully")
+        except Exception as load_err:
+            if require_weights:
+                raise
+            logger.warning(f"Failed to load weights from {weights_path}: {load_err}. Proceeding with randomly initialized weights.")
+    else:
+        if require_weights:
+            raise FileNotFoundError(f"Weights file not found at {weights_path}")
+        logger.warning(f"Weights file not found at {weights_path}. Proceeding with randomly initialized weights.")
+    
+    optimize_model(model)
+    return model.to(device, memory_format=memory_format)
+
+def load_torchscript(model_size: str, weights_path: Optional[Path], device: torch.device,
+                     suffix: str = TORCHSCRIPT_SUFFIX) -> Tuple[Dict[Tuple[int, int, int], torch.jit.ScriptModule], int]:
+    """
+    Load the exported TorchScript graphs matching the current weights.
+    
+    Artifacts exported from other weights, another torch version or an older
+    EXPORT_VERSION are ignored. ``suffix`` selects the fp32 graphs of export.py
+    (TORCHSCRIPT_SUFFIX) or the int8 graphs of quantize.py (INT8_TORCHSCRIPT_SUFFIX).
+    
+    Returns:
+        Graphs by clip shape (T, H, W), and the parameter bytes each of them holds
+    """
+    if weights_path is None or not weights_path.exists():
+        return {}, 0
+    digest = weights_sha256(weights_path)
+    modules, graph_bytes = {}, 0
+    for shape in planned_shapes():
+        path = exported_artifact_path(model_size, digest, shape, suffix)
+        if not path.exists():
+            continue
+        extra_files = {"meta.json": ""}
+        try:
+            module = torch.jit.load(str(path), map_location=device, _extra_files=extra_files)
+            meta = json.loads(extra_files["meta.json"] or "{}")
+        except Exception as e:
+            logger.warning(f"Failed to load exported graph {path.name}: {e}")
+            continue
+        if not _export_metadata_matches(meta, digest, path.name):
+            continue
+        modules[shape] = module
+        graph_bytes = meta.get("graph_parameter_bytes", graph_bytes)
+    return modules, graph_bytes
+
+def _export_metadata_matches(meta: Dict, digest: str, name: str) -> bool:
+    """Whether an exported graph was produced from these weights by this runtime."""
+    if (meta.get("weights_sha256") != digest or meta.get("torch") != torch.__version__
+            or str(meta.get("export_version")) != str(EXPORT_VERSION)):
+        logger.warning(f"Ignoring stale exported graph {name} (re-run export.py)")
+        return False
+    return True
+
+def load_onnx(model_size: str, weights_path: Optional[Path], options=None) -> Dict[Tuple[int, int, int], OnnxRuntimeModel]:
+    """
+    Open ONNX Runtime sessions on the exported ONNX graphs matching the current weights.
+    
+    Args:
+        model_size: Size of the model
+        weights_path: Weights the graphs must have been exported from
+        options: onnxruntime.SessionOptions (default: onnx_engine.session_options())
+    
+    Returns:
+        Sessions by clip shape (T, H, W)
+    """
+    if weights_path is None or not weights_path.exists():
+        return {}
+    digest = weights_sha256(weights_path)
+    sessions = {}
+    for shape in planned_shapes():
+        path = exported_artifact_path(model_size, digest, shape, ONNX_SUFFIX)
+        if not path.exists():
+            continue
+        try:
+            session = OnnxRuntimeModel(path, options)
+        except Exception as e:
+            logger.warning(f"Failed to load exported graph {path.name}: {e}")
+            continue
+        if _export_metadata_matches(session.metadata, digest, path.name):
+            sessions[shape] = session
+    return sessions
+
+# Dummy forwards run on preloaded models before a worker reports ready (0 disables warmup)
+WARMUP_RUNS = int(os.getenv("WARMUP_RUNS", "2"))
+
 class SignLanguageInference:
-    def __init__(self, model_size: str = "2000"):
+    def __init__(self, model_size: str = "2000", engine: Optional[str] = None, precision: Optional[str] = None):
         """
         Initialize the sign language inference model.
         
         Args:
             model_size: Size of the model ("100", "300", "1000", or "2000")
+            engine: "torch" or "onnxruntime" (default: INFERENCE_ENGINE)
+            precision: "fp32", "int8" or "bf16" (default: INFERENCE_PRECISION)
+        
+        Raises:
+            ValueError: for unknown engines or precisions
         """
         self.model_size = model_size
         self.num_classes = int(model_size)
+        self.engine = engine or INFERENCE_ENGINE
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown engine {self.engine!r}; valid engines: {', '.join(ENGINES)}")
+        self.precision = precision or INFERENCE_PRECISION
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {self.precision!r}; valid precisions: {', '.join(PRECISIONS)}")
         self.model = None
+        # Exported graphs by clip shape (T, H, W); the Python model handles the other shapes
+        self.int8: Dict[Tuple[int, int, int], torch.jit.ScriptModule] = {}
+        self.sessions: Dict[Tuple[int, int, int], OnnxRuntimeModel] = {}
+        self.scripted: Dict[Tuple[int, int, int], torch.jit.ScriptModule] = {}
+        # precision="bf16": the Python model and its inputs are channels_last_3d
+        self.bf16 = False
+        self.memory_format = torch.contiguous_format
+        # Parameter bytes of one exported graph of each kind; every graph holds its own copy
+        self._graph_bytes = {"int8": 0, "onnx": 0, "torchscript": 0}
+        self._model_lock = threading.Lock()
+        self.batcher: Optional[MicroBatcher] = None
+        self.load_time_ms: Optional[float] = None
+        self.warm_latency_ms: Optional[float] = None
         self.class_list = []
         # Prefer CUDA if available; otherwise CPU
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -46,59 +323,95 @@ class SignLanguageInference:
         self.weights_path = self._resolve_weights_path()
         self.class_list_path = self.base_path / "code" / "I3D" / "preprocess" / "wlasl_class_list.txt"
         
+        t_start = time.perf_counter()
         self._load_model()
         self._load_class_list()
+        self.load_time_ms = round((time.perf_counter() - t_start) * 1000, 2)
+        if BATCH_MAX_SIZE > 1:
+            self.batcher = MicroBatcher(self.forward, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+                                        name=f"batcher-asl{model_size}")
     
     def _load_model(self):
-        """Load the pre-trained I3D model."""
+        """Load the exported graphs of the pre-trained I3D model, or build it in Python."""
         try:
-            logger.info(f"Loading I3D model from {self.weights_path}")
+            if self.precision == "int8":
+                if self.device.type != "cpu":
+                    logger.warning(f"Quantized graphs run on the CPU only; using fp32 on {self.device}")
+                else:
+                    self.int8, self._graph_bytes["int8"] = load_torchscript(
+                        self.model_size, self.weights_path, self.device, suffix=INT8_TORCHSCRIPT_SUFFIX)
+                    if self.int8:
+                        logger.info(f"Loaded quantized graphs for clip shapes {sorted(self.int8)}")
+                    else:
+                        logger.warning("No quantized graphs match the weights (run quantize.py); using fp32")
+            if self.precision == "bf16":
+                if self.device.type != "cpu":
+                    logger.warning(f"bf16 autocast runs on the CPU only; using fp32 on {self.device}")
+                elif not bf16_supported():
+                    logger.warning("This CPU has no native bf16 support (AVX512-BF16/AMX); using fp32")
+                else:
+                    self.bf16 = True
+                    self.memory_format = torch.channels_last_3d
+            if (self.engine == "onnxruntime" and not self.bf16
+                    and any(shape not in self.int8 for shape in planned_shapes())):
+                if not onnxruntime_available():
+                    logger.warning("onnxruntime is not installed; using the torch engine")
+                elif self.device.type != "cpu":
+                    logger.warning(f"The onnxruntime engine runs on the CPU only; using the torch engine on {self.device}")
+                else:
+                    self.sessions = load_onnx(self.model_size, self.weights_path)
+                    if self.sessions:
+                        logger.info(f"Loaded ONNX graphs for clip shapes {sorted(self.sessions)}")
+                        metadata = next(iter(self.sessions.values())).metadata
+                        self._graph_bytes["onnx"] = int(metadata.get("graph_parameter_bytes", 0))
+                    else:
+                        logger.warning("No ONNX graphs match the weights (run export.py onnx); using the torch engine")
             
-            # Initialize model
-            self.model = InceptionI3d(400, in_channels=3)
-            self.model.replace_logits(self.num_classes)
+            exported = set(self.int8) | set(self.sessions)
+            if TORCHSCRIPT and not self.bf16 and any(shape not in exported for shape in planned_shapes()):
+                self.scripted, self._graph_bytes["torchscript"] = load_torchscript(
+                    self.model_size, self.weights_path, self.device)
+                if self.scripted:
+                    logger.info(f"Loaded exported graphs for clip shapes {sorted(self.scripted)}")
             
-            # Load pre-trained weights if available; otherwise proceed with random weights
-            if self.weights_path and self.weights_path.exists():
-                try:
-                    self.model.load_state_dict(torch.load(self.weights_path, map_location=self.device))
-                    logger.info("Model weights loaded successfully")
-                except Exception as load_err:
-                    logger.warning(f"Failed to load weights from {self.weights_path}: {load_err}. Proceeding with randomly initialized weights.")
-            else:
-                logger.warning(f"Weights file not found at {self.weights_path}. Proceeding with randomly initialized weights.")
-
-            self.model.to(self.device)
-            self.model.eval()
+            # The Python model is only needed for clip shapes without an exported graph, and for bf16
+            exported |= set(self.scripted)
+            if self.bf16 or any(shape not in exported for shape in planned_shapes()):
+                logger.info(f"Loading I3D model from {self.weights_path}")
+                self.model = build_model(self.num_classes, self.weights_path, self.device,
+                                         memory_format=self.memory_format)
             logger.info(f"Model loaded successfully on {self.device}")
             
         except Exception as e:
             logger.error(f"Error loading model: {e}")
             raise
+    
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None or bool(self.int8) or bool(self.sessions) or bool(self.scripted)
+    
+    def _model_for(self, shape: Tuple[int, int, int]):
+        """Exported graph for this clip shape, else the Python model (built on first use)."""
+        module = self.int8.get(shape) or self.sessions.get(shape) or self.scripted.get(shape)
+        if module is not None:
+            return module
+        if self.model is None:
+            with self._model_lock:
+                if self.model is None:
+                    self.model = build_model(self.num_classes, self.weights_path, self.device,
+                                             memory_format=self.memory_format)
+        return self.model
 
     def _resolve_weights_path(self) -> Optional[Path]:
         """
         Dynamically resolve the best weights file for the given model size.
 
-        Priority:
-        1) Files containing "FINAL" in name
-        2) Most recent .pt file in directory
+        See model_weights.resolve_weights_path for the selection rules.
         """
         try:
-            weights_dir = self.base_path / "code" / "I3D" / "archived" / f"asl{self.model_size}"
-            if not weights_dir.exists():
-                logger.warning(f"Weights directory not found: {weights_dir}")
-                return None
-
-            pt_files = sorted(list(weights_dir.glob("*.pt")), key=lambda p: p.stat().st_mtime, reverse=True)
-            if not pt_files:
-                logger.warning(f"No .pt weight files found in {weights_dir}")
-                return None
-
-            # Prefer any file with "FINAL" in its name; otherwise use the most recent
-            final_candidates = [p for p in pt_files if "FINAL" in p.name.upper()]
-            chosen = final_candidates[0] if final_candidates else pt_files[0]
-            logger.info(f"Resolved weights file: {chosen}")
+            chosen = resolve_weights_path(self.model_size)
+            if chosen is not None:
+                logger.info(f"Resolved weights file: {chosen}")
             return chosen
         except Exception as e:
             logger.warning(f"Failed to resolve weights path: {e}")
@@ -131,192 +444,580 @@ class SignLanguageInference:
             logger.error(f"Error loading class list: {e}")
             self.class_list = [f"sign_{i}" for i in range(self.num_classes)]
     
-    def preprocess_video(self, video_path: str, max_frames: int = 64) -> torch.Tensor:
+    def preprocess_video(self, video: VideoSource, max_frames: int = 64,
+                         active_segment: bool = False, multi_clip: bool = False,
+                         crop_size: int = 224) -> torch.Tensor:
         """
         Preprocess video for model inference.
         
         Args:
-            video_path: Path to the video file
+            video: Path to the video file, or the encoded file in memory
             max_frames: Maximum number of frames to extract
+            active_segment: Sample only the interval in which motion is detected
+            multi_clip: Cover long videos with several consecutive-frame windows
+            crop_size: Side of the square center crop
             
         Returns:
             Preprocessed video tensor
         """
+        return self.preprocess(video, max_frames, active_segment, multi_clip, crop_size)[0]
+    
+    def preprocess(self, video: VideoSource, max_frames: int = 64, active_segment: bool = False,
+                   multi_clip: bool = False, crop_size: int = 224) -> Tuple[torch.Tensor, Dict]:
+        """
+        Preprocess video for model inference and describe how it was sampled.
+        
+        With ``multi_clip``, videos (or active segments) longer than one window
+        (MULTI_CLIP_WINDOW, by default ``max_frames``) become one clip per window,
+        stacked along the batch dimension; shorter ones are sampled as usual.
+        
+        Returns:
+            Preprocessed video tensor, and a dict with the detected "active_segment"
+            when detection was requested and the frame range of every window as
+            "clips" in multi-clip mode (empty otherwise)
+        """
+        # Capture shared by the motion pass and the sampler when both run on OpenCV
+        captures = ExitStack()
         try:
-            # For some webm encodings, OpenCV may need ffmpeg backend
-            vidcap = cv2.VideoCapture(video_path)
-            if not vidcap.isOpened():
-                raise ValueError(f"Unable to open video file: {video_path}")
-            frames = []
+            # Identical uploads decode to identical clips, whatever the model size
+            cache_key = _clip_cache_key(video, max_frames, crop_size, active_segment=active_segment,
+                                        multi_clip=multi_clip)
+            cached = clip_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                frames, bgr, info = cached
+                return clip_to_tensor(frames, bgr=bgr), dict(info)
+            
+            info = {}
+            segment = None
+            vidcap = None
+            if active_segment:
+                if not pyav_available():
+                    vidcap = captures.enter_context(open_capture(video))
+                segment = detect_active_segment(video, vidcap)
+                if segment is not None:
+                    info["active_segment"] = segment.to_dict()
+                if vidcap is not None and (segment is None or vidcap.get(cv2.CAP_PROP_POS_FRAMES) != 0):
+                    # Not rewound to the first frame: the sampler opens its own capture
+                    vidcap = None
             
+            if multi_clip:
+                clips = self._decode_windows(video, MULTI_CLIP_WINDOW or max_frames, crop_size,
+                                             segment, vidcap)
+                if clips is not None:
+                    frames, bgr, info["clips"] = clips
+                    if cache_key is not None:
+                        clip_cache.put(cache_key, frames, bgr, info)
+                    tensor = clip_to_tensor(frames, bgr=bgr)
+                    logger.info(f"Preprocessed video: {tensor.shape}")
+                    return tensor, info
+            
+            # Crops are written straight into this thread's uint8 buffer
+            buffer = _frame_buffer(max_frames, crop_size)
+            count, bgr = self._decode_frames(video, buffer, segment, vidcap=vidcap)
+            
+            if count == 0:
+                raise ValueError("No frames extracted from video")
+            
+            # Pad to max_frames by repeating the last frame
+            buffer[count:] = buffer[count - 1]
+            if cache_key is not None:
+                clip_cache.put(cache_key, buffer, bgr, info)
+            
+            # BGR -> RGB and (T, H, W, C) -> (1, C, T, H, W) in one pass; stays uint8
+            tensor = clip_to_tensor(buffer, bgr=bgr)
+            
+            logger.info(f"Preprocessed video: {tensor.shape}")
+            return tensor, info
+            
+        except Exception as e:
+            logger.error(f"Error preprocessing video: {e}")
+            raise
+        finally:
+            captures.close()
+    
+    def _decode_windows(self, video: VideoSource, window: int, crop_size: int = 224,
+                        segment: Optional[ActiveSegment] = None,
+                        vidcap: Optional[cv2.VideoCapture] = None) -> Optional[Tuple[np.ndarray, bool, List[Dict]]]:
+        """
+        Decode consecutive-frame windows covering the video (or ``segment``) in one pass.
+        
+        Overlapping windows share their decoded frames; windows running past the
+        real end of the stream repeat its last frame.
+        
+        Returns:
+            (N, window, crop_size, crop_size, 3) frames, whether they are in BGR order,
+            and the frame range of each window; None if one window covers the video
+        """
+        plan = {}
+        
+        def plan_windows(total_frames: int) -> Optional[np.ndarray]:
+            first, last = (segment.start, segment.end) if segment is not None else (0, total_frames - 1)
+            starts = window_starts(first, last, window, MULTI_CLIP_STRIDE or window, MULTI_CLIP_MAX)
+            if len(starts) < 2:
+                return None
+            plan["windows"] = starts[:, None] + np.arange(window)
+            plan["indices"] = np.unique(plan["windows"])
+            return plan["indices"]
+        
+        if segment is not None:
+            if plan_windows(segment.total_frames) is None:
+                return None
+            indices = plan["indices"]
+        else:
+            # The decoder plans the windows from the frame count of the capture it opens
+            indices = plan_windows
+        
+        # Room for every window's frames; overlapping windows need fewer
+        buffer = _frame_buffer(len(indices) if segment is not None else window * max(2, MULTI_CLIP_MAX), crop_size)
+        count, bgr = self._decode_frames(video, buffer, segment, indices, vidcap)
+        if not plan:
+            return None
+        if count == 0:
+            raise ValueError("No frames extracted from video")
+        windows, indices = plan["windows"], plan["indices"]
+        positions = np.minimum(np.searchsorted(indices, windows), count - 1)
+        # Fancy indexing copies, so the thread's buffer can be reused right away
+        frames = buffer[positions]
+        ranges = [{"start_frame": int(window[0]), "end_frame": int(indices[positions[i, -1]])}
+                  for i, window in enumerate(windows)]
+        return frames, bgr, ranges
+    
+    def _decode_frames(self, video: VideoSource, buffer: np.ndarray, segment: Optional[ActiveSegment] = None,
+                       indices: Optional[FrameIndices] = None,
+                       vidcap: Optional[cv2.VideoCapture] = None) -> Tuple[int, bool]:
+        """
+        Decode sampled, resized and center-cropped frames into ``buffer``,
+        optionally only from ``segment`` or exactly the ascending ``indices``
+        (or those a function of the frame count returns; see decode_pyav).
+        OpenCV reads from ``vidcap`` when given (positioned at the first frame).
+        
+        Returns:
+            Number of frames written, and whether they are in BGR order
+        """
+        if DECODE_BACKEND == "pyav":
+            if pyav_available():
+                try:
+                    return decode_pyav(video, buffer, segment, indices), False
+                except Exception as e:
+                    logger.warning(f"PyAV could not decode {video}: {e}. Falling back to OpenCV.")
+            else:
+                logger.warning("DECODE_BACKEND=pyav but PyAV is not installed. Falling back to OpenCV.")
+        return self._decode_opencv(video, buffer, segment, indices, vidcap), True
+    
+    def _decode_opencv(self, video: VideoSource, buffer: np.ndarray, segment: Optional[ActiveSegment] = None,
+                       indices: Optional[FrameIndices] = None, vidcap: Optional[cv2.VideoCapture] = None) -> int:
+        """Decode frames with OpenCV into ``buffer`` (BGR); returns the number written."""
+        max_frames, size = buffer.shape[0], buffer.shape[1]
+        count = 0
+        with nullcontext(vidcap) if vidcap is not None else open_capture(video) as vidcap:
             # Get video properties
             fps = vidcap.get(cv2.CAP_PROP_FPS)
             total_frames = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
             
-            # Determine uniform frame indices across the entire clip
-            if total_frames > 0:
-                if total_frames >= max_frames:
-                    frame_indices = np.linspace(0, total_frames - 1, max_frames, dtype=int)
-                else:
-                    frame_indices = np.arange(total_frames, dtype=int)
+            # Determine uniform frame indices across the entire clip (by timestamp if
+            # the container has no frame count)
+            if callable(indices):
+                frame_indices, probed = indices(count_frames(video, total_frames)), total_frames <= 0
+                if frame_indices is None:
+                    return 0
+            elif indices is not None:
+                frame_indices, probed = indices, total_frames <= 0
             else:
-                frame_indices = np.arange(max_frames, dtype=int)
-
-            # Try random-access sampling; if it fails, fallback to sequential sampling
-            def _read_frame_at(index: int):
-                if index != int(vidcap.get(cv2.CAP_PROP_POS_FRAMES)):
-                    vidcap.set(cv2.CAP_PROP_POS_FRAMES, index)
-                ok, frame = vidcap.read()
-                return ok, frame
-
-            for idx in frame_indices:
-                ok, img = _read_frame_at(int(idx))
-                if not ok:
-                    # Fallback: read sequentially
-                    ok_seq, img = vidcap.read()
-                    if not ok_seq:
-                        break
-
-                # Resize to 224x224
+                frame_indices, probed = sampling_indices(video, total_frames, max_frames, segment)
+
+            # Seek to each index or decode forward once, whichever is cheaper for this codec;
+            # frame-index seeks are unreliable in streams without a frame count
+            mode = "sequential" if probed else None
+            for _, img in sample_frames(vidcap, [int(idx) for idx in frame_indices], mode=mode):
+                # Resize the short side to the crop size
                 h, w, c = img.shape if len(img.shape) == 3 else (img.shape[0], img.shape[1], 1)
-                scale = 224 / min(h, w)
+                scale = size / min(h, w)
                 new_h, new_w = int(h * scale), int(w * scale)
                 img = cv2.resize(img, (new_w, new_h))
 
-                # Center crop to 224x224
-                start_h = (new_h - 224) // 2
-                start_w = (new_w - 224) // 2
-                img = img[start_h:start_h + 224, start_w:start_w + 224]
-
-                # Ensure 3 channels (RGB)
-                if len(img.shape) == 2 or (len(img.shape) == 3 and img.shape[2] == 1):
-                    img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-                else:
-                    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-                # Normalize to [-1, 1]
-                img = (img.astype(np.float32) / 255.0) * 2 - 1
-                frames.append(img)
+                # Center crop into the buffer (BGR; grayscale is broadcast to 3 channels)
+                start_h = (new_h - size) // 2
+                start_w = (new_w - size) // 2
+                crop = img[start_h:start_h + size, start_w:start_w + size]
+                buffer[count] = crop if crop.ndim == 3 else crop[..., None]
+                count += 1
 
-                if len(frames) >= max_frames:
+                if count >= max_frames:
                     break
+        return count
+    
+    def forward(self, batch: torch.Tensor) -> torch.Tensor:
+        """
+        Run the model on a batch of clips.
+        
+        Args:
+            batch: Clip tensor of shape (B, C, T, H, W)
             
-            vidcap.release()
-            
-            if not frames:
-                raise ValueError("No frames extracted from video")
-            
-            # Pad or truncate to max_frames
-            while len(frames) < max_frames:
-                frames.append(frames[-1])  # Repeat last frame
-            
-            frames = frames[:max_frames]
-            
-            # Convert to tensor: (T, H, W, C) -> (1, C, T, H, W)
-            frames_array = np.asarray(frames, dtype=np.float32)
-            frames_array = np.ascontiguousarray(frames_array)
-            tensor = torch.from_numpy(frames_array).permute(3, 0, 1, 2).unsqueeze(0)
-            
-            logger.info(f"Preprocessed video: {tensor.shape}")
-            return tensor
+        Returns:
+            Class logits of shape (B, num_classes), averaged over time
+        """
+        with torch.no_grad():
+            model = self._model_for(tuple(batch.shape[2:]))
+            batch = batch.to(self.device)
+            if self.bf16:
+                # Channels-last activations let oneDNN use its AMX/AVX512-BF16 convolutions
+                with torch.autocast("cpu", dtype=torch.bfloat16):
+                    per_frame_logits = model(batch.contiguous(memory_format=self.memory_format)).float()
+            else:
+                per_frame_logits = model(batch)
+            # Aggregate temporal logits by mean for stability
+            return torch.mean(per_frame_logits, dim=2)
+    
+    def _format_prediction(self, predictions: torch.Tensor, top_k: int) -> Dict:
+        """Turn one row of class logits into the top-k prediction payload."""
+        probs = F.softmax(predictions, dim=1)
+        
+        # Get top-k predictions
+        top_probs, top_indices = torch.topk(probs, top_k, dim=1)
+        
+        # Convert to lists
+        top_probs = top_probs.cpu().numpy()[0]
+        top_indices = top_indices.cpu().numpy()[0]
+        
+        # Get predicted words
+        predicted_words = []
+        for prob, idx in zip(top_probs, top_indices):
+            if idx < len(self.class_list):
+                word = self.class_list[idx]
+            else:
+                word = f"unknown_{idx}"
             
-        except Exception as e:
-            logger.error(f"Error preprocessing video: {e}")
-            raise
+            predicted_words.append({
+                "text": word,
+                "confidence": float(prob)
+            })
+        
+        # Main prediction
+        main_prediction = predicted_words[0]
+        
+        return {
+            "text": main_prediction["text"],
+            "confidence": main_prediction["confidence"],
+            "alternatives": predicted_words[1:],
+            "model_info": {
+                "model_size": self.model_size,
+                "num_classes": self.num_classes,
+                "device": str(self.device)
+            }
+        }
     
-    def predict(self, video_path: str, top_k: int = 5) -> Dict:
+    def _combine_clips(self, logits: torch.Tensor, info: Dict, clip_results: bool) -> Tuple[torch.Tensor, Dict]:
+        """
+        Average the logits of a video's windows into one row, as test_i3d's ensemble does.
+        
+        Returns:
+            (1, num_classes) logits, and ``info`` with each window's top prediction
+            added to "clips" when ``clip_results`` is set
+        """
+        if "clips" in info and clip_results:
+            clips = []
+            for row, clip in enumerate(info["clips"]):
+                top = self._format_prediction(logits[row:row + 1], 1)
+                clips.append({**clip, "text": top["text"], "confidence": top["confidence"]})
+            info = {**info, "clips": clips}
+        return torch.mean(logits, dim=0, keepdim=True), info
+    
+    def predict(self, video: VideoSource, top_k: int = 5, active_segment: Optional[bool] = None,
+                multi_clip: Optional[bool] = None, clip_results: bool = False,
+                profile: Optional[str] = None) -> Dict:
         """
         Run inference on a video file.
         
         Args:
-            video_path: Path to the video file
+            video: Path to the video file, or the encoded file in memory
             top_k: Number of top predictions to return
+            active_segment: Sample only the detected active segment (defaults to ACTIVE_SEGMENT)
+            multi_clip: Average the predictions of consecutive windows over long videos
+                (defaults to MULTI_CLIP)
+            clip_results: Also return the top prediction of every window
+            profile: Quality/latency profile setting frame count and crop size
+                (defaults to INFERENCE_PROFILE)
             
         Returns:
             Dictionary containing predictions and metadata
         """
         try:
-            if self.model is None:
+            if not self.loaded:
                 raise ValueError("Model not loaded")
             
+            if active_segment is None:
+                active_segment = ACTIVE_SEGMENT_DEFAULT
+            if multi_clip is None:
+                multi_clip = MULTI_CLIP_DEFAULT
+            profile, shape = get_profile(profile)
+            
             # Preprocess video
-            video_tensor = self.preprocess_video(video_path)
-            video_tensor = video_tensor.to(self.device)
+            t_start = time.perf_counter()
+            video_tensor, sampling_info = self.preprocess(video, shape.num_frames, active_segment=active_segment,
+                                                          multi_clip=multi_clip, crop_size=shape.crop_size)
+            t_preprocessed = time.perf_counter()
             
-            # Run inference
-            with torch.no_grad():
-                per_frame_logits = self.model(video_tensor)
-                # Aggregate temporal logits by mean for stability
-                predictions = torch.mean(per_frame_logits, dim=2)
-                probs = F.softmax(predictions, dim=1)
-                
-                # Get top-k predictions
-                top_probs, top_indices = torch.topk(probs, top_k, dim=1)
-                
-                # Convert to lists
-                top_probs = top_probs.cpu().numpy()[0]
-                top_indices = top_indices.cpu().numpy()[0]
-                
-                # Get predicted words
-                predicted_words = []
-                for i, (prob, idx) in enumerate(zip(top_probs, top_indices)):
-                    if idx < len(self.class_list):
-                        word = self.class_list[idx]
-                    else:
-                        word = f"unknown_{idx}"
-                    
-                    predicted_words.append({
-                        "text": word,
-                        "confidence": float(prob)
-                    })
-                
-                # Main prediction
-                main_prediction = predicted_words[0]
-                
-                result = {
-                    "text": main_prediction["text"],
-                    "confidence": main_prediction["confidence"],
-                    "alternatives": predicted_words[1:],
-                    "model_info": {
-                        "model_size": self.model_size,
-                        "num_classes": self.num_classes,
-                        "device": str(self.device)
-                    }
-                }
-                
-                logger.info(f"Prediction: {main_prediction['text']} (confidence: {main_prediction['confidence']:.3f})")
-                return result
+            # Run inference, sharing the forward with concurrent requests when batching is on;
+            # the windows of a multi-clip video already form a batch of their own
+            batch_info = {"batch_size": video_tensor.shape[0], "queue_ms": 0.0}
+            if self.batcher is not None and video_tensor.shape[0] == 1:
+                predictions, batch_info = self.batcher.submit(video_tensor)
+            else:
+                predictions = self.forward(video_tensor)
+            predictions, sampling_info = self._combine_clips(predictions, sampling_info, clip_results)
+            t_forward = time.perf_counter()
+            
+            result = self._format_prediction(predictions, top_k)
+            result["model_info"]["batch_size"] = batch_info["batch_size"]
+            result["model_info"]["profile"] = profile
+            result.update(sampling_info)
+            
+            t_end = time.perf_counter()
+            result["timings"] = {
+                "preprocess_ms": round((t_preprocessed - t_start) * 1000, 2),
+                "batch_queue_ms": batch_info["queue_ms"],
+                "inference_ms": round((t_forward - t_preprocessed) * 1000, 2),
+                "postprocess_ms": round((t_end - t_forward) * 1000, 2),
+                "total_ms": round((t_end - t_start) * 1000, 2)
+            }
+            
+            logger.info(f"Prediction: {result['text']} (confidence: {result['confidence']:.3f})")
+            return result
                 
         except Exception as e:
             logger.error(f"Error during inference: {e}")
             raise
+    
+    def predict_clip(self, frames: np.ndarray, top_k: int = 5) -> Dict:
+        """
+        Run inference on already decoded frames, e.g. a streaming ring buffer.
+        
+        Args:
+            frames: RGB uint8 frames of shape (T, 224, 224, 3)
+            top_k: Number of top predictions to return
+            
+        Returns:
+            Dictionary containing predictions and metadata
+        """
+        if not self.loaded:
+            raise ValueError("Model not loaded")
+        t_start = time.perf_counter()
+        # (T, H, W, C) uint8 -> (1, C, T, H, W) uint8
+        video_tensor = clip_to_tensor(frames)
+        t_preprocessed = time.perf_counter()
+        
+        batch_info = {"batch_size": 1, "queue_ms": 0.0}
+        if self.batcher is not None:
+            predictions, batch_info = self.batcher.submit(video_tensor)
+        else:
+            predictions = self.forward(video_tensor)
+        t_forward = time.perf_counter()
+        
+        result = self._format_prediction(predictions, top_k)
+        result["model_info"]["batch_size"] = batch_info["batch_size"]
+        t_end = time.perf_counter()
+        result["timings"] = {
+            "preprocess_ms": round((t_preprocessed - t_start) * 1000, 2),
+            "batch_queue_ms": batch_info["queue_ms"],
+            "inference_ms": round((t_forward - t_preprocessed) * 1000, 2),
+            "postprocess_ms": round((t_end - t_forward) * 1000, 2),
+            "total_ms": round((t_end - t_start) * 1000, 2)
+        }
+        return result
+    
+    def predict_batch(self, videos: List[VideoSource], top_k: int = 5, batch_size: Optional[int] = None,
+                      active_segment: Optional[bool] = None, multi_clip: Optional[bool] = None,
+                      clip_results: bool = False, profile: Optional[str] = None) -> List[Dict]:
+        """
+        Run inference on many videos with decoding pipelined against batched forwards.
+        
+        Clips are decoded on a thread pool, at most two batches ahead of the model,
+        while the model runs on the previous batch. Ready clips are stacked into
+        forwards of up to ``batch_size`` videos (all windows of a multi-clip video
+        go into the same forward).
+        
+        Args:
+            videos: Paths to the video files, or encoded files in memory
+            top_k: Number of top predictions to return per video
+            batch_size: Clips per forward (defaults to BATCH_MAX_SIZE)
+            active_segment: Sample only the detected active segments (defaults to ACTIVE_SEGMENT)
+            multi_clip: Average the predictions of consecutive windows over long videos
+                (defaults to MULTI_CLIP)
+            clip_results: Also return the top prediction of every window
+            profile: Quality/latency profile for every video (defaults to INFERENCE_PROFILE)
+            
+        Returns:
+            One result per input video, in input order; failed videos carry "error"
+        """
+        if not self.loaded:
+            raise ValueError("Model not loaded")
+        if active_segment is None:
+            active_segment = ACTIVE_SEGMENT_DEFAULT
+        if multi_clip is None:
+            multi_clip = MULTI_CLIP_DEFAULT
+        profile, shape = get_profile(profile)
+        batch_size = max(1, batch_size or BATCH_MAX_SIZE)
+        prefetch = 2 * batch_size
+        results: List[Optional[Dict]] = [None] * len(videos)
+        
+        def _decode(index: int):
+            started = time.perf_counter()
+            clip, info = self.preprocess(videos[index], shape.num_frames, active_segment=active_segment,
+                                         multi_clip=multi_clip, crop_size=shape.crop_size)
+            return clip, info, (time.perf_counter() - started) * 1000
+        
+        def _flush(chunk: List):
+            # Only clips of identical shape can be stacked: multi-clip windows (MULTI_CLIP_WINDOW
+            # frames) and single clips of short videos (the profile's frame count) may differ
+            groups: Dict[Tuple[int, ...], List] = {}
+            for item in chunk:
+                groups.setdefault(tuple(item[1].shape[1:]), []).append(item)
+            for group in groups.values():
+                try:
+                    _forward_group(group)
+                except Exception as e:
+                    logger.error(f"Batched forward of {len(group)} videos failed: {e}")
+                    for index, _, _, _ in group:
+                        results[index] = {
+                            "text": "Unable to process video",
+                            "confidence": 0.0,
+                            "alternatives": [],
+                            "error": str(e),
+                            "error_type": type(e).__name__
+                        }
+        
+        def _forward_group(group: List):
+            started = time.perf_counter()
+            predictions = self.forward(torch.cat([clip for _, clip, _, _ in group], dim=0))
+            forward_ms = (time.perf_counter() - started) * 1000
+            row = 0
+            for index, clip, info, preprocess_ms in group:
+                logits, info = self._combine_clips(predictions[row:row + clip.shape[0]], info, clip_results)
+                row += clip.shape[0]
+                result = self._format_prediction(logits, top_k)
+                result["model_info"]["batch_size"] = len(group)
+                result["model_info"]["profile"] = profile
+                result.update(info)
+                result["timings"] = {
+                    "preprocess_ms": round(preprocess_ms, 2),
+                    "inference_ms": round(forward_ms, 2)
+                }
+                results[index] = result
+        
+        with ThreadPoolExecutor(max_workers=PREPROCESS_THREADS, thread_name_prefix="decode") as executor:
+            in_flight = {}
+            next_index = 0
+            chunk = []
+            for index in range(len(videos)):
+                # Keep the decoders a bounded distance ahead of the model
+                while next_index < len(videos) and next_index < index + prefetch:
+                    in_flight[next_index] = executor.submit(_decode, next_index)
+                    next_index += 1
+                try:
+                    clip, info, preprocess_ms = in_flight.pop(index).result()
+                    chunk.append((index, clip, info, preprocess_ms))
+                except Exception as e:
+                    logger.error(f"Error preprocessing {videos[index]}: {e}")
+                    results[index] = {
+                        "text": "Unable to process video",
+                        "confidence": 0.0,
+                        "alternatives": [],
+                        "error": str(e),
+                        "error_type": type(e).__name__
+                    }
+                if len(chunk) == batch_size:
+                    _flush(chunk)
+                    chunk = []
+            if chunk:
+                _flush(chunk)
+        
+        logger.info(f"Batch prediction completed for {len(videos)} videos")
+        return results
+    
+    def warmup(self, runs: int = WARMUP_RUNS, profile: Optional[str] = None) -> Optional[float]:
+        """
+        Run dummy forwards so the first real request does not pay for allocator
+        growth, cuDNN autotuning and lazy kernel initialization.
+        
+        Args:
+            runs: Number of forwards; the last one is reported as the warm latency
+            profile: Profile whose clip shape is warmed up (defaults to INFERENCE_PROFILE)
+            
+        Returns:
+            Latency of the last forward in milliseconds, or None if no forward ran
+        """
+        if not self.loaded or runs <= 0:
+            return None
+        _, shape = get_profile(profile)
+        dummy = torch.zeros(1, 3, shape.num_frames, shape.crop_size, shape.crop_size, dtype=torch.uint8)
+        for _ in range(runs):
+            started = time.perf_counter()
+            self.forward(dummy)
+            if self.device.type == "cuda":
+                torch.cuda.synchronize(self.device)
+            latency_ms = (time.perf_counter() - started) * 1000
+        self.warm_latency_ms = round(latency_ms, 2)
+        logger.info(f"Warmed up model {self.model_size}: {self.warm_latency_ms} ms per forward")
+        return self.warm_latency_ms
+    
+    def parameter_bytes(self) -> int:
+        """Memory held by the parameters and buffers of the Python model and every loaded graph."""
+        total = (len(self.int8) * self._graph_bytes["int8"] + len(self.sessions) * self._graph_bytes["onnx"]
+                 + len(self.scripted) * self._graph_bytes["torchscript"])
+        if self.model is not None:
+            tensors = list(self.model.parameters()) + list(self.model.buffers())
+            total += sum(t.numel() * t.element_size() for t in tensors)
+        return total
+    
+    def stats(self) -> Dict:
+        """Runtime statistics for this model instance."""
+        return {
+            "model_size": self.model_size,
+            "device": str(self.device),
+            "weights": self.weights_path.name if self.weights_path else None,
+            "load_time_ms": self.load_time_ms,
+            "parameter_bytes": self.parameter_bytes(),
+            "engine": "onnxruntime" if self.sessions else "torchscript" if self.int8 or self.scripted else "eager",
+            "precision": "int8" if self.int8 else "bf16" if self.bf16 else "fp32",
+            "memory_format": "channels_last_3d" if self.memory_format == torch.channels_last_3d else "contiguous",
+            "exported_shapes": ["x".join(map(str, shape))
+                                for shape in sorted(set(self.int8) | set(self.sessions) | set(self.scripted))],
+            "warm_latency_ms": self.warm_latency_ms,
+            "batching": self.batcher.stats() if self.batcher is not None else None
+        }
 
 # Global model instances, cached per model size
 _model_instances: Dict[str, SignLanguageInference] = {}
+_model_instances_lock = threading.Lock()
 
 def get_model(model_size: str = "2000") -> SignLanguageInference:
     """Get or create a model instance for the given size."""
     global _model_instances
     instance = _model_instances.get(model_size)
     if instance is None:
-        instance = SignLanguageInference(model_size)
-        _model_instances[model_size] = instance
+        with _model_instances_lock:
+            instance = _model_instances.get(model_size)
+            if instance is None:
+                instance = SignLanguageInference(model_size)
+                _model_instances[model_size] = instance
     return instance
 
-def run_inference(video_path: str, model_size: str = "2000") -> Dict:
+def run_inference(video: VideoSource, model_size: str = "2000", **options) -> Dict:
     """
     Run sign language inference on a video file.
     
     Args:
-        video_path: Path to the video file
+        video: Path to the video file, or the encoded file in memory
         model_size: Size of the model to use
+        **options: Per-request options passed to SignLanguageInference.predict
+            (e.g. active_segment)
         
     Returns:
         Dictionary containing prediction results
     """
     try:
         model = get_model(model_size)
-        result = model.predict(video_path)
+        result = model.predict(video, **options)
         return result
         
     except Exception as e:
@@ -326,21 +1027,204 @@ def run_inference(video_path: str, model_size: str = "2000") -> Dict:
             "text": "Unable to process video",
             "confidence": 0.0,
             "alternatives": [],
-            "error": str(e)
+            "error": str(e),
+            "error_type": type(e).__name__
         }
 
+def run_batch_inference(videos: List[VideoSource], model_size: str = "2000", **options) -> List[Dict]:
+    """
+    Run sign language inference on several video files as batched forwards.
+    
+    Args:
+        videos: Paths to the video files, or encoded files in memory
+        model_size: Size of the model to use
+        **options: Per-request options passed to SignLanguageInference.predict_batch
+        
+    Returns:
+        One result dictionary per video, in input order
+    """
+    try:
+        model = get_model(model_size)
+        return model.predict_batch(videos, **options)
+    
+    except Exception as e:
+        logger.error(f"Batch inference failed: {e}")
+        return [{
+            "text": "Unable to process video",
+            "confidence": 0.0,
+            "alternatives": [],
+            "error": str(e),
+            "error_type": type(e).__name__
+        } for _ in videos]
+
+def _video_sources(specs: List[Dict], payload: bytes) -> List[VideoSource]:
+    """
+    Decode the video descriptors of a worker request.
+    
+    Each descriptor is either {"path": ..., "sha256": ...} (the hash is optional) or
+    {"length": n, "suffix": ..., "sha256": ...}; inline videos are stored back to back in
+    the request payload. Hashed files become EncodedVideo, so their decoded clips are cached.
+    """
+    view = memoryview(payload)
+    offset = 0
+    sources: List[VideoSource] = []
+    for spec in specs:
+        if "path" in spec and spec.get("sha256"):
+            path = spec["path"]
+            sources.append(EncodedVideo(suffix=os.path.splitext(path)[1], sha256=spec["sha256"], path=path))
+        elif "path" in spec:
+            sources.append(spec["path"])
+        else:
+            length = int(spec["length"])
+            sources.append(EncodedVideo(bytes(view[offset:offset + length]), spec.get("suffix", ".mp4"),
+                                        sha256=spec.get("sha256")))
+            offset += length
+    return sources
+
+def handle_request(request: Dict, payload: bytes = b"") -> Dict:
+    """
+    Execute one worker request and build its reply (without the request id).
+    
+    Args:
+        request: Decoded request header with an "op" field
+        payload: Binary payload that accompanied the request
+        
+    Returns:
+        Reply message; "ok" is False only for malformed requests
+    """
+    op = request.get("op")
+    if op == "ping":
+        return {"ok": True, "models": sorted(_model_instances)}
+    if op == "stats":
+        return {"ok": True, "pid": os.getpid(),
+                "models": {size: model.stats() for size, model in sorted(_model_instances.items())},
+                "frame_sampler": sampler_costs.stats(),
+                "clip_cache": clip_cache.stats()}
+    if op == "predict":
+        video = _video_sources([request["video"]], payload)[0]
+        result = run_inference(video, request.get("model_size", "2000"), **request.get("options", {}))
+        return {"ok": True, "result": result}
+    if op == "predict_clip":
+        # Raw uint8 frames, shape given in the header
+        frames = np.frombuffer(bytearray(payload), dtype=np.uint8).reshape(request["shape"])
+        model = get_model(request.get("model_size", "2000"))
+        result = model.predict_clip(frames, request.get("top_k", 5))
+        return {"ok": True, "result": result}
+    if op == "predict_batch":
+        videos = _video_sources(request["videos"], payload)
+        results = run_batch_inference(videos, request.get("model_size", "2000"), **request.get("options", {}))
+        return {"ok": True, "results": results}
+    return {"ok": False, "error": f"Unknown op: {op}"}
+
+def serve(preload_sizes: List[str]):
+    """
+    Run as a persistent inference worker.
+
+    Models in ``preload_sizes`` are loaded up front, then requests are read from
+    stdin and answered on stdout as ``inference_protocol`` frames tagged with the
+    request id. Up to WORKER_THREADS requests are handled concurrently so that
+    decoding overlaps and forwards can be micro-batched; replies may therefore
+    arrive out of order. stdout is reserved for replies; everything else goes to stderr.
+    """
+    channel = sys.stdout.buffer
+    requests = sys.stdin.buffer
+    sys.stdout = sys.stderr
+    reply_lock = threading.Lock()
+
+    def reply(message: Dict):
+        with reply_lock:
+            write_message(channel, message)
+
+    def process(request: Dict, payload: bytes):
+        request_id = request.get("id")
+        try:
+            message = handle_request(request, payload)
+        except Exception as e:
+            logger.error(f"Worker request {request_id} failed: {e}")
+            message = {"ok": False, "error": str(e), "error_type": type(e).__name__}
+        reply({"id": request_id, **message})
+
+    for size in preload_sizes:
+        get_model(size).warmup()
+    reply({"type": "ready", "pid": os.getpid(), "models": sorted(_model_instances)})
+
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="worker") as executor:
+        while True:
+            try:
+                frame = read_message(requests)
+            except FrameTooLarge as e:
+                # The payload was skipped and the stream is still in sync: reject just this request
+                logger.error(f"Rejected request {(e.message or {}).get('id')}: {e}")
+                reply({"id": (e.message or {}).get("id"), "ok": False, "error": str(e),
+                       "error_type": type(e).__name__})
+                continue
+            except ProtocolError as e:
+                # Nothing after a malformed frame can be trusted; stop reading and let the
+                # requests in flight finish before exiting
+                logger.error(f"Malformed request frame, closing the worker: {e}")
+                break
+            if frame is None:
+                break
+            request, payload = frame
+            if request.get("op") == "ping":
+                # Answer health checks directly so they are not stuck behind inference
+                process(request, payload)
+            else:
+                executor.submit(process, request, payload)
+
 if __name__ == "__main__":
     # Test the inference module
     import argparse
     
     parser = argparse.ArgumentParser(description="Sign Language Inference Test")
-    parser.add_argument("video_path", help="Path to video file")
+    parser.add_argument("video_path", nargs="?", help="Path to video file")
     parser.add_argument("--model_size", default="2000", choices=["100", "300", "1000", "2000"], 
                        help="Model size to use")
+    parser.add_argument("--serve", action="store_true",
+                       help="Run as a persistent worker reading requests from stdin")
+    parser.add_argument("--preload", nargs="*", default=[], choices=["100", "300", "1000", "2000"],
+                       help="Model sizes to load and warm up before serving")
+    parser.add_argument("--active_segment", action=argparse.BooleanOptionalAction, default=None,
+                       help="Sample only the segment of the video that contains motion (default: ACTIVE_SEGMENT)")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=None,
+                       help="Quality/latency profile (default: INFERENCE_PROFILE)")
+    parser.add_argument("--multi_clip", action=argparse.BooleanOptionalAction, default=None,
+                       help="Average consecutive windows over videos longer than one window (default: MULTI_CLIP)")
+    parser.add_argument("--clip_results", action="store_true",
+                       help="Also report the top prediction of every window in multi-clip mode")
+    parser.add_argument("--engine", choices=ENGINES, default=None,
+                       help="Inference engine (default: INFERENCE_ENGINE)")
+    parser.add_argument("--precision", choices=PRECISIONS, default=None,
+                       help="Numeric precision (default: INFERENCE_PRECISION)")
+    parser.add_argument("--protocol", action="store_true",
+                       help="Write the full result as a single inference_protocol frame on stdout")
     
     args = parser.parse_args()
+    if args.engine:
+        INFERENCE_ENGINE = args.engine
+    if args.precision:
+        INFERENCE_PRECISION = args.precision
+    
+    if args.serve:
+        serve(args.preload)
+        sys.exit(0)
+    if not args.video_path:
+        parser.error("video_path is required unless --serve is given")
+    options = {name: getattr(args, name) for name in ("active_segment", "multi_clip")
+               if getattr(args, name) is not None}
+    if args.clip_results:
+        options["clip_results"] = True
+    if args.profile:
+        options["profile"] = args.profile
+    
+    if args.protocol:
+        channel = sys.stdout.buffer
+        sys.stdout = sys.stderr
+        result = run_inference(args.video_path, args.model_size, **options)
+        write_message(channel, {"ok": True, "result": result})
+        sys.exit(0)
     
-    result = run_inference(args.video_path, args.model_size)
+    result = run_inference(args.video_path, args.model_size, **options)
     print(f"Prediction: {result.get('text', 'N/A')}")
     print(f"Confidence: {result.get('confidence', 0.0):.3f}")
     if 'model_info' in result:
@@ -0,0 +1,106 @@
+"""
+Length-prefixed message framing between the backend and the model runtime.
+
+A frame is an 8-byte header holding two big-endian uint32 lengths (JSON header,
+binary payload), followed by the UTF-8 JSON header and the raw payload bytes.
+The payload is empty for ordinary requests and replies; it lets callers ship
+video bytes or clip buffers without base64 inflation.
+
+This module only depends on the standard library so that the backend can import
+it without the model's dependencies.
+"""
+
+import json
+import struct
+from typing import BinaryIO, Dict, Optional, Sequence, Tuple, Union
+
+_FRAME_HEADER = struct.Struct(">II")
+
+# Sanity limits so that a corrupted stream fails fast instead of allocating gigabytes
+MAX_HEADER_BYTES = 16 * 1024 * 1024
+MAX_PAYLOAD_BYTES = 1024 * 1024 * 1024
+
+
+class ProtocolError(RuntimeError):
+    """Raised when a frame is truncated or malformed."""
+
+
+class FrameTooLarge(ProtocolError):
+    """
+    Raised when a frame's payload exceeds MAX_PAYLOAD_BYTES.
+
+    On reading, the payload has been skipped, so the stream is still in sync and
+    ``message`` (the frame's header) tells which request it belonged to. On
+    writing, nothing has been written.
+    """
+
+    def __init__(self, payload_len: int, message: Optional[Dict] = None):
+        super().__init__(f"Frame payload too large ({payload_len} > {MAX_PAYLOAD_BYTES} bytes)")
+        self.message = message
+
+
+def write_message(stream: BinaryIO, message: Dict, payload: Union[bytes, Sequence[bytes]] = b"") -> None:
+    """
+    Write one frame to a binary stream and flush it.
+
+    ``payload`` may be given as several parts, which are written back to back
+    without being joined in memory first.
+    """
+    parts = [payload] if isinstance(payload, (bytes, bytearray, memoryview)) else list(payload)
+    payload_len = sum(len(part) for part in parts)
+    if payload_len > MAX_PAYLOAD_BYTES:
+        raise FrameTooLarge(payload_len)
+    header = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    stream.write(_FRAME_HEADER.pack(len(header), payload_len) + header)
+    for part in parts:
+        if part:
+            stream.write(part)
+    stream.flush()
+
+
+def read_message(stream: BinaryIO) -> Optional[Tuple[Dict, bytes]]:
+    """
+    Read one frame from a binary stream.
+
+    Returns:
+        (message, payload), or None if the stream ended cleanly before a new frame
+    """
+    prefix = _read_exact(stream, _FRAME_HEADER.size, allow_eof=True)
+    if prefix is None:
+        return None
+    header_len, payload_len = _FRAME_HEADER.unpack(prefix)
+    if header_len > MAX_HEADER_BYTES:
+        raise ProtocolError(f"Frame header too large ({header_len} bytes)")
+    try:
+        message = json.loads(_read_exact(stream, header_len).decode("utf-8"))
+    except ValueError as e:
+        raise ProtocolError(f"Malformed frame header: {e}")
+    if payload_len > MAX_PAYLOAD_BYTES:
+        # A well-formed header with an oversized payload: skip the payload, keeping the stream usable
+        _skip_exact(stream, payload_len)
+        raise FrameTooLarge(payload_len, message)
+    payload = _read_exact(stream, payload_len) if payload_len else b""
+    return message, payload
+
+
+def _skip_exact(stream: BinaryIO, size: int) -> None:
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            raise ProtocolError(f"Stream ended mid-frame ({size - remaining}/{size} bytes)")
+        remaining -= len(chunk)
+
+
+def _read_exact(stream: BinaryIO, size: int, allow_eof: bool = False) -> Optional[bytes]:
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            if allow_eof and remaining == size:
+                return None
+            raise ProtocolError(f"Stream ended mid-frame ({size - remaining}/{size} bytes)")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
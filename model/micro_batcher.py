@@ -0,0 +1,110 @@
+"""
+Dynamic micro-batching for model forwards.
+
+Concurrent callers submit single clips; a scheduler thread gathers whatever
+arrives within ``max_wait_ms`` (up to ``max_batch_size`` clips of the same shape),
+runs one batched forward and hands each caller its own row of the output.
+"""
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+import torch
+
+
+class _Pending:
+    __slots__ = ("clip", "future", "enqueued_at")
+
+    def __init__(self, clip: torch.Tensor):
+        self.clip = clip
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    def __init__(self, forward_fn: Callable[[torch.Tensor], torch.Tensor],
+                 max_batch_size: int = 4, max_wait_ms: float = 10.0, name: str = "batcher"):
+        """
+        Initialize the batcher and start its scheduler thread.
+
+        Args:
+            forward_fn: Maps a (B, ...) batch to a (B, ...) output
+            max_batch_size: Largest batch handed to forward_fn
+            max_wait_ms: How long the first clip of a batch waits for company
+            name: Thread name, for logs
+        """
+        self.forward_fn = forward_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._histogram: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, clip: torch.Tensor) -> Tuple[torch.Tensor, Dict]:
+        """
+        Run one (1, ...) clip through the model as part of a batch (blocking).
+
+        Returns:
+            The clip's (1, ...) output and {"batch_size", "queue_ms"} for this call
+        """
+        pending = _Pending(clip)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            histogram = dict(sorted(self._histogram.items()))
+        batches = sum(histogram.values())
+        requests = sum(size * count for size, count in histogram.items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000.0,
+            "batches": batches,
+            "requests": requests,
+            "mean_batch_size": round(requests / batches, 3) if batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in histogram.items()},
+        }
+
+    def _collect(self) -> List[_Pending]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            # Only clips of identical shape can be stacked
+            groups: Dict[Tuple[int, ...], List[_Pending]] = {}
+            for pending in batch:
+                groups.setdefault(tuple(pending.clip.shape), []).append(pending)
+            for group in groups.values():
+                self._run(group)
+
+    def _run(self, group: List[_Pending]):
+        started = time.perf_counter()
+        try:
+            inputs = group[0].clip if len(group) == 1 else torch.cat([p.clip for p in group], dim=0)
+            outputs = self.forward_fn(inputs)
+        except Exception as e:
+            for pending in group:
+                pending.future.set_exception(e)
+            return
+        with self._stats_lock:
+            self._histogram[len(group)] += 1
+        for i, pending in enumerate(group):
+            pending.future.set_result((outputs[i:i + 1], {
+                "batch_size": len(group),
+                "queue_ms": round((started - pending.enqueued_at) * 1000, 2),
+            }))
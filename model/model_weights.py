@@ -0,0 +1,89 @@
+"""
+Location and identity of the archived I3D weights, and of the graphs exported
+from them.
+
+Kept free of torch so that the backend can key caches on the exact weights file
+the model runtime will load.
+"""
+
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(__file__).parent / "code" / "I3D" / "archived"
+
+
+def weights_dir(model_size: str) -> Path:
+    """Directory holding the weights (and derived artifacts) of a model size."""
+    return ARCHIVE_DIR / f"asl{model_size}"
+
+
+def resolve_weights_path(model_size: str) -> Optional[Path]:
+    """
+    Resolve the best weights file for the given model size.
+
+    Priority:
+    1) Files containing "FINAL" in name
+    2) Most recent .pt file in directory
+    """
+    directory = weights_dir(model_size)
+    if not directory.exists():
+        logger.warning(f"Weights directory not found: {directory}")
+        return None
+
+    pt_files = sorted(list(directory.glob("*.pt")), key=lambda p: p.stat().st_mtime, reverse=True)
+    if not pt_files:
+        logger.warning(f"No .pt weight files found in {directory}")
+        return None
+
+    # Prefer any file with "FINAL" in its name; otherwise use the most recent
+    final_candidates = [p for p in pt_files if "FINAL" in p.name.upper()]
+    return final_candidates[0] if final_candidates else pt_files[0]
+
+
+def weights_fingerprint(model_size: str) -> Tuple[str, Optional[str], Optional[float]]:
+    """
+    Identify the weights a model size currently resolves to.
+
+    Returns:
+        (model_size, weights file name, weights mtime); name and mtime are None
+        when no weights file exists
+    """
+    try:
+        path = resolve_weights_path(model_size)
+        if path is None:
+            return model_size, None, None
+        return model_size, path.name, path.stat().st_mtime
+    except OSError as e:
+        logger.warning(f"Failed to fingerprint weights for asl{model_size}: {e}")
+        return model_size, None, None
+
+
+_sha256_cache: Dict[Tuple[str, float, int], str] = {}
+
+
+def weights_sha256(path: Path) -> str:
+    """SHA-256 of a weights file (memoized per path, mtime and size)."""
+    stat = path.stat()
+    key = (str(path), stat.st_mtime, stat.st_size)
+    digest = _sha256_cache.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        digest = _sha256_cache[key] = sha.hexdigest()
+    return digest
+
+
+def exported_artifact_path(model_size: str, weights_digest: str, shape: Tuple[int, int, int], suffix: str) -> Path:
+    """
+    Location of a serialized graph exported from the weights with ``weights_digest``
+    for clips of ``shape`` (T, H, W), next to the weights.
+
+    The suffix must not be ".pt" so that resolve_weights_path never picks it up.
+    """
+    return weights_dir(model_size) / f"i3d_{weights_digest[:16]}_{'x'.join(map(str, shape))}{suffix}"
@@ -0,0 +1,85 @@
+"""
+ONNX Runtime engine for exported I3D graphs.
+
+``python export.py onnx`` writes one graph per planned clip shape, with a
+dynamic batch dimension, next to the weights. ``OnnxRuntimeModel`` wraps an
+``InferenceSession`` on such a graph so the inference module can call it like
+the torch model: uint8 clips in, per-frame logits out.
+
+Sessions run on the CPU execution provider. Thread counts and the graph
+optimization level come from the environment (``ORT_INTRA_OP_THREADS``,
+``ORT_INTER_OP_THREADS``, ``ORT_GRAPH_OPTIMIZATION``) unless given explicitly.
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+
+try:
+    import onnxruntime as ort
+except ImportError:  # ONNX Runtime is optional; the torch engine is always available
+    ort = None
+
+# 0 lets ONNX Runtime choose (intra-op: one thread per physical core)
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "0"))
+ORT_GRAPH_OPTIMIZATION = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")
+
+GRAPH_OPTIMIZATION_LEVELS = ("disable", "basic", "extended", "all")
+
+INPUT_NAME = "clip"
+OUTPUT_NAME = "logits"
+
+
+def onnxruntime_available() -> bool:
+    return ort is not None
+
+
+def session_options(intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None,
+                    graph_optimization: Optional[str] = None) -> "ort.SessionOptions":
+    """
+    ONNX Runtime session options (environment defaults for arguments left as None).
+
+    Raises:
+        ValueError: for unknown graph optimization levels
+    """
+    graph_optimization = graph_optimization or ORT_GRAPH_OPTIMIZATION
+    if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown graph optimization level {graph_optimization!r}; "
+                         f"valid levels: {', '.join(GRAPH_OPTIMIZATION_LEVELS)}")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = ORT_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+    options.inter_op_num_threads = ORT_INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+    options.graph_optimization_level = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }[graph_optimization]
+    return options
+
+
+class OnnxRuntimeModel:
+    def __init__(self, path: Path, options: Optional["ort.SessionOptions"] = None):
+        """
+        Open an exported graph.
+
+        Args:
+            path: .onnx file written by export.py
+            options: Session options (default: session_options())
+        """
+        if ort is None:
+            raise ImportError("onnxruntime is not installed")
+        self.path = path
+        self.session = ort.InferenceSession(str(path), options or session_options(),
+                                            providers=["CPUExecutionProvider"])
+        self.metadata: Dict[str, str] = dict(self.session.get_modelmeta().custom_metadata_map)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        """Per-frame logits (B, num_classes, T') of a uint8 (B, C, T, H, W) batch."""
+        clip = np.ascontiguousarray(batch.cpu().numpy())
+        (logits,) = self.session.run([OUTPUT_NAME], {INPUT_NAME: clip})
+        return torch.from_numpy(logits)
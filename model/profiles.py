@@ -0,0 +1,41 @@
+"""
+Quality/latency profiles of the inference runtime.
+
+A profile fixes the clip shape fed to I3D: how many frames are sampled and the
+size of the square center crop. InceptionI3d is fully convolutional, so smaller
+clips run proportionally faster at some cost in accuracy (see evaluate.py).
+Clips need at least 16 frames to survive the network's temporal downsampling.
+
+Kept free of torch so that the backend can validate profile names.
+"""
+
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class Profile(NamedTuple):
+    num_frames: int
+    crop_size: int
+
+
+PROFILES: Dict[str, Profile] = {
+    "fast": Profile(num_frames=32, crop_size=160),
+    "balanced": Profile(num_frames=48, crop_size=192),
+    "accurate": Profile(num_frames=64, crop_size=224),
+}
+
+# Profile used when a request does not name one
+DEFAULT_PROFILE = os.getenv("INFERENCE_PROFILE", "accurate")
+
+
+def get_profile(name: Optional[str] = None) -> Tuple[str, Profile]:
+    """
+    Look up a profile by name (DEFAULT_PROFILE when None).
+
+    Raises:
+        ValueError: for unknown profile names
+    """
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile {name!r}; valid profiles: {', '.join(PROFILES)}")
+    return name, PROFILES[name]
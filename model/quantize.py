@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Post-training INT8 quantization of the serving model, calibrated on WLASL clips.
+
+Usage:
+    python quantize.py [--split archive/nslt_100.json] [--videos DIR] [--profiles accurate ...]
+                       [--calibration_clips 32] [--limit N] [--skip_evaluation] [--force] [--json]
+
+For every profile, the serving model of the split's model size (``optimize_model``:
+folded input scaling, fused BatchNorms) is calibrated on ``--calibration_clips``
+train videos of the split, preprocessed exactly as the runtime does: observers
+of torch's default x86 qconfig record the range of every convolution's output
+and of every Inception block's concatenation. The model is then converted to
+static INT8: per-channel int8 Conv3d weights, uint8 activations, with ReLUs
+fused into the convolutions and pools and concatenations run on quantized
+tensors. Raw uint8 clips are quantized as-is (scale 1, zero point 0), since the
+input scaling is already folded into the first convolution. That grid cannot
+hold the first convolution's pad value 127.5 (the raw value of a normalized 0),
+so clips are padded with 128 instead: a 0.5-level error at the clip borders,
+whose effect on the logits the parity tests (``test_parity.py``) bound. The
+average pool and the logits layer stay in fp32.
+
+The result is traced and saved as ``...<T>x<H>x<W>.int8.torchscript`` next to
+the fp32 graphs of ``export.py``; ``SignLanguageInference`` loads it with
+``precision="int8"`` (``INFERENCE_PRECISION=int8``).
+
+The fp32 and int8 models are then evaluated on the test videos of the split
+with ``evaluate.py``'s metrics (top-1/top-5, overall and per class as in
+``code/I3D/test_i3d.py``), reporting the accuracy deltas and forward speedup
+of the int8 model, so each model size can be switched only where the speedup
+is worth the accuracy.
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.ao.nn.intrinsic.quantized as nniq
+import torch.ao.nn.quantized as nnq
+from torch.ao.quantization import get_default_qconfig
+
+from evaluate import ARCHIVE_DIR, VIDEOS_DIR, add_deltas, evaluate_model, find_videos, load_split, split_model_size
+from export import _serving_model
+from inference_module import INT8_TORCHSCRIPT_SUFFIX, SignLanguageInference
+from model_weights import exported_artifact_path
+from profiles import PROFILES, get_profile
+from pytorch_i3d import InceptionI3d, InceptionModule, MaxPool3dSamePadding, Unit3D, clip_shape, same_padding_plan
+from report import print_table
+
+# Quantized kernels tuned for x86 (fbgemm/oneDNN); the default engine of x86 builds
+QUANTIZED_ENGINE = "x86"
+# Raw pixels are their own quint8 representation (see fold_input_normalization)
+INPUT_SCALE, INPUT_ZERO_POINT = 1.0, 0
+
+
+def calibration_videos(samples: List[Tuple[Path, int]], count: int) -> List[Path]:
+    """``count`` videos spread evenly over ``samples`` (sorted by id), so that many classes are covered."""
+    if count >= len(samples):
+        return [path for path, _ in samples]
+    picks = np.linspace(0, len(samples) - 1, count).round().astype(int)
+    return [samples[i][0] for i in picks]
+
+
+class Calibration:
+    """Activation observers on every Unit3D and InceptionModule output of a model, and their input shapes."""
+
+    def __init__(self, model: InceptionI3d):
+        qconfig = get_default_qconfig(QUANTIZED_ENGINE)
+        self.observers: Dict[nn.Module, nn.Module] = {}
+        self.input_shapes: Dict[nn.Module, Tuple[int, int, int]] = {}
+        self.clips = 0
+        for module in model.modules():
+            if isinstance(module, (Unit3D, InceptionModule, MaxPool3dSamePadding)) and module is not model.logits:
+                if not isinstance(module, MaxPool3dSamePadding):
+                    self.observers[module] = qconfig.activation()
+                module.register_forward_pre_hook(self._record_shape)
+                module.register_forward_hook(self._observe)
+        self.weight_observer = qconfig.weight
+
+    def _record_shape(self, module, inputs):
+        self.input_shapes[module] = clip_shape(inputs[0])
+
+    def _observe(self, module, inputs, output):
+        observer = self.observers.get(module)
+        if observer is not None:
+            observer(output)
+
+    def qparams(self, module: nn.Module) -> Tuple[float, int]:
+        scale, zero_point = self.observers[module].calculate_qparams()
+        return float(scale), int(zero_point)
+
+
+class QuantizedUnit3D(nn.Module):
+    """INT8 Unit3D (fused conv + ReLU) with the 'same' padding of one input shape."""
+
+    def __init__(self, unit: Unit3D, calibration: Calibration):
+        super().__init__()
+        conv = unit.conv3d
+        pad, padding, _ = same_padding_plan(unit._kernel_shape, unit._stride, calibration.input_shapes[unit],
+                                            foldable=unit.pad_value == 0)
+        self.pad = pad
+        # Only the first unit pads with a non-zero value: 127.5, rounded up to 128 on the input grid
+        self.pad_value = float(math.floor(unit.pad_value / INPUT_SCALE + 0.5) * INPUT_SCALE)
+        cls = nniq.ConvReLU3d if unit._activation_fn is not None else nnq.Conv3d
+        self.conv = cls(conv.in_channels, conv.out_channels, conv.kernel_size, stride=conv.stride, padding=padding)
+        observer = calibration.weight_observer()
+        observer(conv.weight)
+        scales, zero_points = observer.calculate_qparams()
+        weight = torch.quantize_per_channel(conv.weight.detach(), scales.double(), zero_points, 0, torch.qint8)
+        self.conv.set_weight_bias(weight, conv.bias.detach() if conv.bias is not None else None)
+        self.conv.scale, self.conv.zero_point = calibration.qparams(unit)
+
+    def forward(self, x):
+        if self.pad is not None:
+            x = F.pad(x.contiguous(), self.pad, value=self.pad_value)
+        return self.conv(x)
+
+
+class QuantizedMaxPool3d(nn.Module):
+    """Max pool with the 'same' padding of one input shape, on quantized tensors."""
+
+    def __init__(self, pool: MaxPool3dSamePadding, calibration: Calibration):
+        super().__init__()
+        self.pad, self.padding, _ = same_padding_plan(pool.kernel_size, pool.stride, calibration.input_shapes[pool])
+        self.kernel_size = pool.kernel_size
+        self.stride = pool.stride
+
+    def forward(self, x):
+        if self.pad is not None:
+            # Zero is the minimum of the ReLU outputs every pool follows; quantized
+            # pads only take contiguous tensors, and convolutions return channels-last ones
+            x = F.pad(x.contiguous(), self.pad)
+        return F.max_pool3d(x, self.kernel_size, self.stride, self.padding)
+
+
+class QuantizedInceptionModule(nn.Module):
+    def __init__(self, module: InceptionModule, calibration: Calibration):
+        super().__init__()
+        for name in ("b0", "b1a", "b1b", "b2a", "b2b", "b3b"):
+            setattr(self, name, QuantizedUnit3D(getattr(module, name), calibration))
+        self.b3a = QuantizedMaxPool3d(module.b3a, calibration)
+        self.scale, self.zero_point = calibration.qparams(module)
+
+    def forward(self, x):
+        branches = [self.b0(x), self.b1b(self.b1a(x)), self.b2b(self.b2a(x)), self.b3b(self.b3a(x))]
+        return torch.ops.quantized.cat(branches, dim=1, scale=self.scale, zero_point=self.zero_point)
+
+
+class QuantizedI3D(nn.Module):
+    """INT8 InceptionI3d backbone for one clip shape, with the fp32 head of the calibrated model."""
+
+    def __init__(self, model: InceptionI3d, calibration: Calibration):
+        super().__init__()
+        layers = []
+        for end_point in model.VALID_ENDPOINTS:
+            if end_point not in model.end_points:
+                continue
+            module = model._modules[end_point]
+            if isinstance(module, Unit3D):
+                layers.append(QuantizedUnit3D(module, calibration))
+            elif isinstance(module, MaxPool3dSamePadding):
+                layers.append(QuantizedMaxPool3d(module, calibration))
+            else:
+                layers.append(QuantizedInceptionModule(module, calibration))
+        self.features = nn.Sequential(*layers)
+        self.avg_pool = model.avg_pool
+        self.logits = model.logits
+
+    def forward(self, x):
+        x = torch.quantize_per_tensor(x.float(), INPUT_SCALE, INPUT_ZERO_POINT, torch.quint8)
+        x = self.features(x).dequantize()
+        return self.logits(self.avg_pool(x)).squeeze(3).squeeze(3)
+
+
+def quantized_parameter_bytes(model: QuantizedI3D) -> int:
+    """Memory held by the int8 weights, fp32 biases and the fp32 head."""
+    total = 0
+    for module in model.features.modules():
+        if isinstance(module, nnq.Conv3d):
+            weight, bias = module._weight_bias()
+            total += weight.numel() + (bias.numel() * 4 if bias is not None else 0)
+    head = list(model.logits.parameters()) + list(model.avg_pool.parameters())
+    return total + sum(t.numel() * t.element_size() for t in head)
+
+
+def quantize_profile(model_size: str, profile: str, videos: List[Path], decoder: SignLanguageInference,
+                     force: bool = False) -> Dict:
+    """
+    Calibrate, convert and save the INT8 model of ``model_size`` for one profile.
+
+    Args:
+        model_size: Model size
+        profile: Profile whose clip shape is quantized
+        videos: Calibration videos
+        decoder: Runtime whose ``preprocess`` turns videos into clips
+        force: Overwrite an existing quantized graph
+
+    Returns:
+        The graph's file name, status, calibration clips used and the largest
+        logit difference to the fp32 model on them
+    """
+    name, shape = get_profile(profile)
+    clip_size = (shape.num_frames, shape.crop_size, shape.crop_size)
+    model, meta = _serving_model(model_size)
+    path = exported_artifact_path(model_size, meta["weights_sha256"], clip_size, INT8_TORCHSCRIPT_SUFFIX)
+    row = {"profile": name, "file": path.name}
+    if path.exists() and not force:
+        return {**row, "status": "exists", "calibration_clips": None, "max_abs_diff": None, "quantize_ms": None}
+
+    started = time.perf_counter()
+    calibration = Calibration(model)
+    used, checks = 0, []
+    with torch.no_grad():
+        for video in videos:
+            try:
+                clip, _ = decoder.preprocess(str(video), shape.num_frames, crop_size=shape.crop_size)
+            except Exception:
+                continue
+            model(clip)
+            used += 1
+            if len(checks) < 4:
+                checks.append(clip)
+    if not used:
+        raise RuntimeError(f"None of the {len(videos)} calibration videos could be decoded")
+
+    torch.backends.quantized.engine = QUANTIZED_ENGINE
+    quantized = QuantizedI3D(model, calibration).eval()
+    example = torch.zeros((1, 3) + clip_size, dtype=torch.uint8)
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        traced = torch.jit.freeze(torch.jit.trace(quantized, example))
+        # Logit error of the int8 model on the calibration clips themselves
+        max_abs_diff = max(float((traced(clip) - model(clip)).abs().max()) for clip in checks)
+    meta = {**meta, "shape": list(clip_size), "precision": "int8", "quantized_engine": QUANTIZED_ENGINE,
+            "calibration_clips": used, "graph_parameter_bytes": quantized_parameter_bytes(quantized)}
+    torch.jit.save(traced, str(path), _extra_files={"meta.json": json.dumps(meta)})
+    return {**row, "status": "written", "calibration_clips": used, "max_abs_diff": max_abs_diff,
+            "quantize_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantize the serving model to INT8 with WLASL calibration")
+    parser.add_argument("--split", type=Path, default=ARCHIVE_DIR / "nslt_100.json", help="nslt_*.json split file")
+    parser.add_argument("--videos", type=Path, default=VIDEOS_DIR, help="Directory of <video_id>.mp4 files")
+    parser.add_argument("--model_size", default=None, choices=["100", "300", "1000", "2000"],
+                        help="Model size (default: from the split file name)")
+    parser.add_argument("--profiles", nargs="+", default=["accurate"], choices=sorted(PROFILES),
+                        help="Profiles whose clip shape is quantized")
+    parser.add_argument("--calibration_clips", type=int, default=32, help="Train videos used for calibration")
+    parser.add_argument("--limit", type=int, default=0, help="Evaluate on at most this many test videos (0: all)")
+    parser.add_argument("--skip_evaluation", action="store_true", help="Only write the quantized graphs")
+    parser.add_argument("--force", action="store_true", help="Overwrite existing quantized graphs")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    if QUANTIZED_ENGINE not in torch.backends.quantized.supported_engines:
+        parser.error(f"This torch build has no {QUANTIZED_ENGINE} quantized engine")
+    model_size = args.model_size or split_model_size(args.split)
+    if model_size is None:
+        parser.error(f"Cannot infer the model size from {args.split.name}; pass --model_size")
+    train, _ = find_videos(load_split(args.split, "train"), args.videos)
+    if not train:
+        parser.error(f"None of the train videos of {args.split.name} were found in {args.videos}")
+    test, missing = find_videos(load_split(args.split, "test"), args.videos)
+    if args.limit > 0:
+        test = test[:args.limit]
+
+    # The fp32 runtime decodes the calibration clips and is the evaluation baseline
+    fp32 = SignLanguageInference(model_size, engine="torch", precision="fp32")
+    calibration = calibration_videos(train, args.calibration_clips)
+    quantized = [quantize_profile(model_size, profile, calibration, fp32, args.force) for profile in args.profiles]
+
+    evaluation = []
+    if not args.skip_evaluation and test:
+        int8 = SignLanguageInference(model_size, engine="torch", precision="int8")
+        for profile in args.profiles:
+            rows = [{"precision": precision, **evaluate_model(runtime, test, profile)}
+                    for precision, runtime in (("fp32", fp32), ("int8", int8))]
+            evaluation += add_deltas(rows)
+
+    if args.json:
+        print(json.dumps({"split": args.split.name, "model_size": model_size, "missing": missing,
+                          "quantized": quantized, "evaluation": evaluation}, indent=2))
+    else:
+        print_table(quantized, ["profile", "file", "status", "calibration_clips", "max_abs_diff", "quantize_ms"])
+        if evaluation:
+            print(f"\n{args.split.name} (test): {len(test)} videos, {missing} missing, model {model_size}")
+            print_table(evaluation, ["profile", "precision", "videos", "top1", "top1_delta", "top5", "top5_delta",
+                                      "top1_per_class", "top1_per_class_delta", "top5_per_class",
+                                      "top5_per_class_delta", "forward_ms", "speedup"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
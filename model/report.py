@@ -0,0 +1,16 @@
+"""
+Plain-text reports of the command-line tools.
+
+Kept free of torch so that any script can print its results without loading
+the inference runtime.
+"""
+
+from typing import Dict, List
+
+
+def print_table(rows: List[Dict], columns: List[str]):
+    """Print ``columns`` of ``rows`` as left-aligned, space-separated columns under a header."""
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
@@ -0,0 +1,204 @@
+"""
+Parity tests of the serving model's transformations and exported graphs.
+
+Usage:
+    python -m pytest test_parity.py
+
+Every check runs the same weights (the model size 100 weights, seeded random
+weights with randomized BatchNorm statistics when they cannot be loaded) on
+random uint8 clips, through the original and the transformed or exported
+model, and bounds the largest logit difference relative to the largest logit
+of the original by the tolerance of the precision it runs in. Clips are small
+so the module runs in under a minute on a CPU; ``python benchmark.py parity``
+and ``precisions`` run the same comparisons on real videos.
+
+Skipped when torch is not installed; the ONNX check also when onnxruntime is not.
+"""
+
+import copy
+import warnings
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from benchmark import _reference_model  # noqa: E402
+from inference_module import SpatialGlobalAvgPool, optimize_model  # noqa: E402
+from pytorch_i3d import InceptionI3d, same_padding_plan  # noqa: E402
+
+# Largest tolerated logit difference, relative to the largest reference logit.
+# int8 also covers the first convolution padding with 128 instead of 127.5
+# (see quantize.py), which test_int8_pad_rounding bounds on its own.
+TOLERANCES = {"fp32": 1e-4, "bf16": 5e-2, "int8": 5e-2}
+
+# (T, H, W): one clip shape with symmetric 'same' padding everywhere, one with asymmetric padding
+CLIP_SHAPES = [(16, 112, 112), (13, 100, 124)]
+
+MODEL_SIZE = "100"
+
+
+def _clip(shape, batch=1, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randint(0, 256, (batch, 3) + tuple(shape), dtype=torch.uint8, generator=generator)
+
+
+def _normalized(clip):
+    return (clip.float() / 255.0) * 2 - 1
+
+
+def _assert_parity(actual, expected, precision):
+    actual, expected = actual.float(), expected.float()
+    assert actual.shape == expected.shape
+    relative = float((actual - expected).abs().max() / expected.abs().max())
+    assert relative <= TOLERANCES[precision], f"{precision}: relative logit difference {relative:.2e}"
+
+
+@pytest.fixture(scope="module")
+def reference() -> InceptionI3d:
+    """Unmodified InceptionI3d (crop-size agnostic final pool), in eval mode."""
+    return _reference_model(MODEL_SIZE).eval()
+
+
+@pytest.fixture(scope="module")
+def serving(reference) -> InceptionI3d:
+    """The reference weights through optimize_model, with padding planned for CLIP_SHAPES."""
+    model = optimize_model(copy.deepcopy(reference))
+    for shape in CLIP_SHAPES:
+        model.plan_padding(shape)
+    return model
+
+
+def test_reference_pool_is_crop_size_agnostic(reference):
+    assert isinstance(reference.avg_pool, SpatialGlobalAvgPool)
+
+
+def test_fold_input_normalization(reference):
+    folded = copy.deepcopy(reference)
+    folded.fold_input_normalization()
+    clip = _clip(CLIP_SHAPES[0])
+    with torch.no_grad():
+        _assert_parity(folded(clip), reference(_normalized(clip)), "fp32")
+
+
+def test_fuse_for_inference(reference):
+    unfused = copy.deepcopy(reference)
+    unfused.fold_input_normalization()
+    fused = copy.deepcopy(unfused).fuse_for_inference()
+    clip = _clip(CLIP_SHAPES[0])
+    with torch.no_grad():
+        _assert_parity(fused(clip), unfused(clip), "fp32")
+
+
+def test_fuse_for_inference_requires_eval_mode(reference):
+    with pytest.raises(RuntimeError):
+        copy.deepcopy(reference).train().fuse_for_inference()
+
+
+@pytest.mark.parametrize("kernel, stride, shape", [
+    ((7, 7, 7), (2, 2, 2), (16, 112, 112)),
+    ((7, 7, 7), (2, 2, 2), (13, 100, 124)),
+    ((1, 3, 3), (1, 2, 2), (8, 56, 56)),
+    ((3, 3, 3), (1, 1, 1), (7, 25, 31)),
+])
+def test_same_padding_plan_matches_dynamic_padding(kernel, stride, shape):
+    x = torch.randn((1, 2) + shape)
+    # The dynamic path of MaxPool3dSamePadding pads asymmetrically every forward
+    total = [max(k - s, 0) if n % s == 0 else max(k - (n % s), 0) for k, s, n in zip(kernel, stride, shape)]
+    front = [p // 2 for p in total]
+    dynamic = torch.nn.functional.pad(x, (front[2], total[2] - front[2], front[1], total[1] - front[1],
+                                          front[0], total[0] - front[0]))
+    expected = torch.nn.functional.conv3d(dynamic, torch.ones((1, 2) + kernel), stride=stride)
+    pad, padding, out_shape = same_padding_plan(kernel, stride, shape)
+    planned = x if pad is None else torch.nn.functional.pad(x, pad)
+    actual = torch.nn.functional.conv3d(planned, torch.ones((1, 2) + kernel), stride=stride, padding=padding)
+    assert tuple(actual.shape[2:]) == out_shape
+    torch.testing.assert_close(actual, expected)
+
+
+@pytest.mark.parametrize("shape", CLIP_SHAPES)
+def test_planned_padding_matches_dynamic_padding(serving, shape):
+    dynamic = copy.deepcopy(serving)
+    dynamic.clear_padding_plans()
+    clip = _clip(shape)
+    with torch.no_grad():
+        _assert_parity(serving(clip), dynamic(clip), "fp32")
+
+
+@pytest.mark.parametrize("shape", CLIP_SHAPES)
+def test_serving_model_matches_reference(reference, serving, shape):
+    clip = _clip(shape, batch=2)
+    with torch.no_grad():
+        _assert_parity(serving(clip), reference(_normalized(clip)), "fp32")
+
+
+def test_torchscript_matches_eager(serving):
+    shape = CLIP_SHAPES[0]
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        traced = torch.jit.freeze(torch.jit.trace(serving, _clip(shape, seed=1)))
+        clip = _clip(shape, batch=2)
+        _assert_parity(traced(clip), serving(clip), "fp32")
+
+
+def test_onnx_matches_eager(serving, tmp_path):
+    pytest.importorskip("onnxruntime")
+    from onnx_engine import INPUT_NAME, OUTPUT_NAME, OnnxRuntimeModel
+
+    shape = CLIP_SHAPES[0]
+    path = tmp_path / "serving.onnx"
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        torch.onnx.export(serving, (_clip(shape, seed=1),), str(path), input_names=[INPUT_NAME],
+                          output_names=[OUTPUT_NAME], dynamic_axes={INPUT_NAME: {0: "batch"}, OUTPUT_NAME: {0: "batch"}},
+                          opset_version=17, dynamo=False)
+    clip = _clip(shape, batch=2)
+    with torch.no_grad():
+        _assert_parity(OnnxRuntimeModel(path)(clip), serving(clip), "fp32")
+
+
+def test_bf16_matches_fp32(serving):
+    # As SignLanguageInference runs precision="bf16"; CPUs without native bf16 emulate it
+    model = copy.deepcopy(serving).to(memory_format=torch.channels_last_3d)
+    clip = _clip(CLIP_SHAPES[0], batch=2)
+    with torch.no_grad():
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            actual = model(clip.contiguous(memory_format=torch.channels_last_3d)).float()
+        _assert_parity(actual, serving(clip), "bf16")
+
+
+@pytest.fixture(scope="module")
+def quantized(serving):
+    from quantize import QUANTIZED_ENGINE, Calibration, QuantizedI3D
+
+    if QUANTIZED_ENGINE not in torch.backends.quantized.supported_engines:
+        pytest.skip(f"torch has no {QUANTIZED_ENGINE} quantized engine")
+    model = copy.deepcopy(serving)
+    calibration = Calibration(model)
+    with torch.no_grad():
+        for seed in range(4):
+            model(_clip(CLIP_SHAPES[0], seed=100 + seed))
+    torch.backends.quantized.engine = QUANTIZED_ENGINE
+    return QuantizedI3D(model, calibration).eval()
+
+
+def test_int8_matches_fp32(serving, quantized):
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        traced = torch.jit.freeze(torch.jit.trace(quantized, _clip(CLIP_SHAPES[0], seed=1)))
+        for seed in range(2):
+            clip = _clip(CLIP_SHAPES[0], seed=200 + seed)
+            _assert_parity(traced(clip), serving(clip), "int8")
+
+
+def test_int8_pad_rounding(serving, quantized):
+    from quantize import INPUT_SCALE
+
+    pad_values = {m.pad_value for m in quantized.modules() if getattr(m, "pad_value", 0)}
+    assert pad_values == {128.0}
+    assert abs(128.0 - serving._modules["Conv3d_1a_7x7"].pad_value) <= INPUT_SCALE / 2
+    # The rounding alone, in fp32: padding clips with 128 instead of 127.5
+    rounded = copy.deepcopy(serving)
+    rounded._modules["Conv3d_1a_7x7"].pad_value = 128.0
+    clip = _clip(CLIP_SHAPES[0])
+    with torch.no_grad():
+        _assert_parity(rounded(clip), serving(clip), "int8")
@@ -0,0 +1,709 @@
+"""
+Video input helpers for the inference runtime.
+
+Videos reach the model either as a path or as the encoded file held in memory
+(``EncodedVideo``), e.g. an upload forwarded by the backend without touching
+disk. In-memory videos are demuxed straight from the buffer when the installed
+OpenCV supports stream input (4.10+), otherwise they are spilled to a RAM-backed
+temporary file.
+
+Frames are sampled either by seeking to every wanted index or by decoding the
+stream forward once, ``grab()``-ing skipped frames and ``retrieve()``-ing only the
+wanted ones. With inter-frame codecs every seek re-decodes from the previous
+keyframe, so ``sample_frames`` picks the mode whose measured cost is lower.
+
+With ``DECODE_BACKEND=pyav`` clips are decoded by libavcodec through PyAV
+instead; libswscale resizes and converts the selected frames to RGB, so
+full-resolution frames never reach Python. OpenCV remains the fallback when
+PyAV is not installed or cannot read a file.
+
+Containers that do not record a frame count (typically browser MediaRecorder
+webm) are sampled uniformly by presentation time instead, using timestamps
+from a packet-only scan of the file (no decoding).
+
+Videos longer than one model window can instead be covered by several
+consecutive-frame windows (``window_starts``) that are decoded in one pass.
+
+``detect_active_segment`` is an optional cheap first pass that looks at small
+grayscale thumbnails of the clip and finds the interval in which something
+moves, so the sampled frames can be limited to the actual signing.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+try:
+    import av
+except ImportError:  # PyAV is optional; OpenCV is always available
+    av = None
+
+logger = logging.getLogger(__name__)
+
+# Spill in-memory videos to tmpfs when available so the fallback stays off disk
+SPILL_DIR: Optional[str] = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+# Frame sampling mode: "auto" (pick from measured cost), "seek" or "sequential"
+FRAME_SAMPLER = os.getenv("FRAME_SAMPLER", "auto")
+SAMPLER_MODES = ("seek", "sequential")
+
+# Active-segment detection: thumbnails analysed per second, sensitivity between the idle
+# baseline (0) and peak motion (1), and seconds of context kept around the detected motion
+MOTION_SAMPLE_FPS = float(os.getenv("MOTION_SAMPLE_FPS", "10"))
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "0.15"))
+MOTION_MARGIN_S = float(os.getenv("MOTION_MARGIN_S", "0.3"))
+# Below this peak-to-baseline difference (mean gray levels) the whole clip counts as active
+MOTION_MIN_ACTIVITY = 1.0
+MOTION_THUMB_WIDTH = 64
+# With PyAV, only keyframes are decoded for the motion pass when they come at least this often
+MOTION_KEYFRAME_FPS = float(os.getenv("MOTION_KEYFRAME_FPS", "2"))
+# Thumbnails the OpenCV motion pass takes at most; longer clips are sampled more sparsely
+MOTION_MAX_SAMPLES = int(os.getenv("MOTION_MAX_SAMPLES", "300"))
+
+# Decoder used for uploaded clips: "opencv" or "pyav" (falls back to OpenCV)
+DECODE_BACKEND = os.getenv("DECODE_BACKEND", "opencv")
+# libavcodec decoder threads for PyAV (0 = let FFmpeg decide)
+DECODE_THREADS = int(os.getenv("DECODE_THREADS", "0"))
+
+
+class EncodedVideo:
+    """
+    An encoded video file (container bytes) held in memory, or a file on disk
+    (``path``) whose content hash is known.
+    """
+
+    __slots__ = ("data", "suffix", "path", "_sha256")
+
+    def __init__(self, data: bytes = b"", suffix: str = ".mp4", sha256: Optional[str] = None,
+                 path: Optional[str] = None):
+        self.data = data
+        self.suffix = suffix
+        self.path = path
+        self._sha256 = sha256
+
+    @property
+    def sha256(self) -> str:
+        """Content hash, as supplied by the sender or computed on first use."""
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            if self.path is not None:
+                with open(self.path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+            else:
+                digest.update(self.data)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    def __len__(self) -> int:
+        return len(self.data) if self.path is None else os.path.getsize(self.path)
+
+    def __repr__(self) -> str:
+        if self.path is not None:
+            return f"<EncodedVideo {self.path}>"
+        return f"<EncodedVideo {len(self.data)} bytes {self.suffix}>"
+
+
+VideoSource = Union[str, EncodedVideo]
+# Frame indices to decode, or a function of the clip's frame count that returns them (or None)
+FrameIndices = Union[np.ndarray, Callable[[int], Optional[np.ndarray]]]
+
+
+def _container_input(source: VideoSource) -> Union[str, io.BytesIO]:
+    """What PyAV opens for ``source``: a path, or a stream over the bytes held in memory."""
+    if isinstance(source, EncodedVideo):
+        return io.BytesIO(source.data) if source.in_memory else source.path
+    return source
+
+
+@contextmanager
+def open_capture(source: VideoSource) -> Iterator[cv2.VideoCapture]:
+    """
+    Open a cv2.VideoCapture on a path or in-memory video and release it afterwards.
+
+    Raises:
+        ValueError: if the video cannot be opened
+    """
+    spill_path = None
+    stream = None
+    if isinstance(source, EncodedVideo) and source.in_memory:
+        # OpenCV reads from the stream lazily and does not keep it alive: hold it until release()
+        stream = io.BytesIO(source.data)
+        vidcap = _capture_from_stream(stream)
+        if vidcap is None:
+            spill_path = spill_to_file(source)
+            vidcap = cv2.VideoCapture(spill_path)
+    else:
+        # For some webm encodings, OpenCV may need ffmpeg backend
+        vidcap = cv2.VideoCapture(source.path if isinstance(source, EncodedVideo) else source)
+    try:
+        if not vidcap.isOpened():
+            raise ValueError(f"Unable to open video file: {source}")
+        yield vidcap
+    finally:
+        vidcap.release()
+        if spill_path is not None:
+            os.remove(spill_path)
+
+
+def spill_to_file(video: EncodedVideo) -> str:
+    """Write an in-memory video to a (preferably RAM-backed) temporary file; caller removes it."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=video.suffix, dir=SPILL_DIR) as f:
+        f.write(video.data)
+        return f.name
+
+
+def _capture_from_stream(stream: io.BytesIO) -> Optional[cv2.VideoCapture]:
+    # OpenCV >= 4.10 can demux from any Python object with read()/seek()
+    try:
+        vidcap = cv2.VideoCapture(stream, cv2.CAP_FFMPEG, [])
+    except (cv2.error, TypeError):
+        return None
+    if vidcap.isOpened():
+        return vidcap
+    vidcap.release()
+    return None
+
+
+def uniform_indices(total_frames: int, num_frames: int) -> np.ndarray:
+    """
+    Indices of ``num_frames`` frames spread uniformly over the clip.
+
+    Clips shorter than ``num_frames`` yield all their frames; when the frame
+    count is unknown (<= 0) the first ``num_frames`` frames are used.
+    """
+    if total_frames > 0:
+        if total_frames >= num_frames:
+            return np.linspace(0, total_frames - 1, num_frames, dtype=int)
+        return np.arange(total_frames, dtype=int)
+    return np.arange(num_frames, dtype=int)
+
+
+def window_starts(first: int, last: int, window: int, stride: int, max_windows: int) -> np.ndarray:
+    """
+    First frame of each ``window``-frame clip covering frames [first, last].
+
+    Windows start every ``stride`` frames, with a final one aligned to ``last``
+    so the tail is not dropped. When more than ``max_windows`` would be needed
+    they are spread evenly over the interval instead. Intervals no longer than
+    one window yield a single start.
+    """
+    span = last - first + 1
+    if span <= window:
+        return np.asarray([first], dtype=int)
+    starts = np.arange(first, last - window + 2, max(1, stride), dtype=int)
+    if starts[-1] + window - 1 < last:
+        starts = np.append(starts, last - window + 1)
+    if len(starts) > max_windows:
+        starts = np.linspace(first, last - window + 1, max(1, max_windows)).astype(int)
+    return starts
+
+
+def count_frames(source: VideoSource, reported: Optional[int] = None) -> int:
+    """
+    Frame count of a clip: the container's (``reported`` by an already open
+    capture or container, else read here), else from a timestamp probe (0 if unknown).
+    """
+    if reported is None:
+        with open_capture(source) as vidcap:
+            reported = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+    total_frames = reported
+    if total_frames > 0:
+        return total_frames
+    frame_times = probe_frame_times(source)
+    return len(frame_times) if frame_times is not None else 0
+
+
+def probe_frame_times(source: VideoSource) -> Optional[np.ndarray]:
+    """
+    Presentation times (seconds, ascending) of every frame of the first video stream.
+
+    Only packets are read, nothing is decoded: with PyAV by demuxing the
+    container, otherwise with ``ffprobe`` if it is on PATH.
+
+    Returns:
+        The timestamps, or None if no probe is available or the stream has none
+    """
+    times = None
+    if av is not None:
+        try:
+            times = _probe_times_pyav(source)
+        except Exception as e:
+            logger.warning(f"Packet scan with PyAV failed: {e}")
+    elif shutil.which("ffprobe"):
+        try:
+            times = _probe_times_ffprobe(source)
+        except (OSError, subprocess.SubprocessError, ValueError) as e:
+            logger.warning(f"Packet scan with ffprobe failed: {e}")
+    if times is None or len(times) == 0:
+        return None
+    return np.sort(times)
+
+
+def _probe_times_pyav(source: VideoSource) -> np.ndarray:
+    container = av.open(_container_input(source), metadata_errors="ignore")
+    try:
+        stream = container.streams.video[0]
+        time_base = float(stream.time_base)
+        # Zero-size packets only flush the demuxer
+        pts = [packet.pts for packet in container.demux(stream) if packet.pts is not None and packet.size]
+        return np.asarray(pts, dtype=np.float64) * time_base
+    finally:
+        container.close()
+
+
+def _probe_times_ffprobe(source: VideoSource) -> np.ndarray:
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time",
+           "-of", "csv=p=0"]
+    if isinstance(source, EncodedVideo) and source.in_memory:
+        result = subprocess.run(cmd + ["pipe:0"], input=source.data, capture_output=True, timeout=30, check=True)
+    else:
+        path = source.path if isinstance(source, EncodedVideo) else source
+        result = subprocess.run(cmd + [path], capture_output=True, timeout=30, check=True)
+    lines = result.stdout.decode("ascii", errors="ignore").split()
+    return np.asarray([float(line.strip(",")) for line in lines if line.strip(",") not in ("", "N/A")])
+
+
+def timestamp_indices(frame_times: np.ndarray, num_frames: int) -> np.ndarray:
+    """
+    Indices of the frames closest to ``num_frames`` instants spread uniformly
+    between the first and last timestamp (variable frame rate safe).
+    """
+    total = len(frame_times)
+    if total <= num_frames:
+        return np.arange(total, dtype=int)
+    targets = np.linspace(frame_times[0], frame_times[-1], num_frames)
+    after = np.clip(np.searchsorted(frame_times, targets), 1, total - 1)
+    before = after - 1
+    nearest = np.where(targets - frame_times[before] <= frame_times[after] - targets, before, after)
+    return nearest.astype(int)
+
+
+class ActiveSegment(NamedTuple):
+    """Frame interval [start, end] of a clip in which motion was detected."""
+
+    start: int
+    end: int
+    total_frames: int
+    fps: float
+    detected: bool
+
+    def to_dict(self) -> Dict:
+        fps = self.fps or 30.0
+        return {
+            "start_frame": self.start,
+            "end_frame": self.end,
+            "total_frames": self.total_frames,
+            "start_s": round(self.start / fps, 3),
+            "end_s": round((self.end + 1) / fps, 3),
+            "detected": self.detected
+        }
+
+
+class _MotionScan(NamedTuple):
+    """Grayscale thumbnails of the frames sampled by a motion pass."""
+    fps: float
+    total_frames: int
+    # Frame index and float32 thumbnail of each sampled frame, in display order
+    thumbnails: Sequence[Tuple[int, np.ndarray]]
+
+
+def _motion_step(fps: float) -> int:
+    return max(1, int(round((fps or 30.0) / MOTION_SAMPLE_FPS)))
+
+
+def _scan_motion_pyav(source: VideoSource) -> _MotionScan:
+    container = av.open(_container_input(source), metadata_errors="ignore")
+    try:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        if DECODE_THREADS > 0:
+            stream.thread_count = DECODE_THREADS
+        fps = float(stream.average_rate or 0.0)
+
+        # A packet scan (no decoding) finds the keyframes; when they come often enough
+        # only they are decoded, placed by their rank among the packet timestamps
+        packets = [(packet.pts, packet.is_keyframe) for packet in container.demux(stream) if packet.size]
+        order = None
+        if packets and all(pts is not None for pts, _ in packets):
+            keyframes = sum(key for _, key in packets)
+            if keyframes >= 2 and keyframes * (fps or 30.0) >= MOTION_KEYFRAME_FPS * len(packets):
+                order = {pts: index for index, pts in enumerate(sorted(pts for pts, _ in packets))}
+                stream.codec_context.skip_frame = "NONKEY"
+        container.seek(0)
+
+        step = _motion_step(fps)
+        thumbnails = []
+        decoded = 0
+        for decoded, frame in enumerate(container.decode(stream), 1):
+            index = decoded - 1
+            if order is not None:
+                index = order.get(frame.pts)
+                if index is None:
+                    continue
+            elif index % step:
+                continue
+            # libswscale scales and converts straight to the thumbnail; no full-size copy
+            height = max(1, int(frame.height * MOTION_THUMB_WIDTH / frame.width))
+            thumb = frame.reformat(width=MOTION_THUMB_WIDTH, height=height, format="gray",
+                                   interpolation="AREA").to_ndarray()
+            thumbnails.append((index, thumb.astype(np.float32)))
+        return _MotionScan(fps, decoded if order is None else len(packets), thumbnails)
+    finally:
+        container.close()
+
+
+def _thumbnail(frame: np.ndarray) -> np.ndarray:
+    # Shrink first, so only the thumbnail is converted to grayscale
+    height = max(1, int(frame.shape[0] * MOTION_THUMB_WIDTH / frame.shape[1]))
+    thumb = cv2.resize(frame, (MOTION_THUMB_WIDTH, height), interpolation=cv2.INTER_AREA)
+    thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY) if thumb.ndim == 3 else thumb
+    return thumb.astype(np.float32)
+
+
+def _scan_motion_opencv(vidcap: cv2.VideoCapture) -> Optional[_MotionScan]:
+    fps = vidcap.get(cv2.CAP_PROP_FPS) or 0.0
+    step = _motion_step(fps)
+    reported = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if reported > 0:
+        # Long clips are sampled more sparsely, and the sampler seeks past the frames in
+        # between whenever its cost model finds that cheaper than grabbing them
+        step = max(step, -(-reported // MOTION_MAX_SAMPLES))
+        positions = list(range(0, reported, step))
+        thumbnails = [(index, _thumbnail(frame)) for index, frame in sample_frames(vidcap, positions)]
+        # Reported frame counts are often slightly too high
+        total = reported if len(thumbnails) == len(positions) else (thumbnails[-1][0] + 1 if thumbnails else 0)
+        return _MotionScan(fps, total, thumbnails)
+
+    # Without a frame count only a forward pass is reliable: grab up to MOTION_MAX_SAMPLES steps
+    thumbnails = []
+    index = 0
+    while index < MOTION_MAX_SAMPLES * step and vidcap.grab():
+        if index % step == 0:
+            ok, frame = vidcap.retrieve()
+            if ok:
+                thumbnails.append((index, _thumbnail(frame)))
+        index += 1
+    if index >= MOTION_MAX_SAMPLES * step and vidcap.grab():
+        # The clip goes on and its length is unknown: no segment can be placed in it
+        return None
+    return _MotionScan(fps, index, thumbnails)
+
+
+def detect_active_segment(source: VideoSource,
+                          vidcap: Optional[cv2.VideoCapture] = None) -> Optional[ActiveSegment]:
+    """
+    Find the interval of a clip that contains motion.
+
+    About MOTION_SAMPLE_FPS frames per second are shrunk to
+    MOTION_THUMB_WIDTH-pixel grayscale thumbnails and differenced. Steps whose
+    (median-filtered) mean absolute difference rises MOTION_THRESHOLD of the way from the idle
+    baseline to the peak count as active; the span from the first to the last
+    active step, widened by MOTION_MARGIN_S, is the segment. Clips without a
+    clear peak are reported as entirely active (``detected`` False).
+
+    With PyAV (and no ``vidcap``), a packet scan counts the frames and, when
+    keyframes come at least MOTION_KEYFRAME_FPS times per second, only those
+    are decoded and differenced instead (the boundaries then fall on
+    keyframes); the sampled frames are scaled by libswscale straight to
+    thumbnails. Otherwise OpenCV takes at most MOTION_MAX_SAMPLES thumbnails
+    (spread more sparsely over long clips), seeking to them when the frame
+    sampler's cost model finds that cheaper than grabbing every frame.
+
+    Args:
+        source: Path to the video file, or the encoded file in memory
+        vidcap: Open capture of ``source`` to scan instead of opening it again;
+            it is rewound to the first frame afterwards so the sampler can reuse it
+
+    Returns:
+        The segment, or None if the clip has no readable frames (or has no frame
+        count and runs past MOTION_MAX_SAMPLES thumbnails without PyAV)
+    """
+    scan = None
+    scanned = False
+    if vidcap is None and av is not None:
+        try:
+            scan, scanned = _scan_motion_pyav(source), True
+        except Exception as e:
+            logger.warning(f"PyAV motion pass failed on {source}: {e}. Falling back to OpenCV.")
+    if not scanned:
+        if vidcap is None:
+            with open_capture(source) as capture:
+                scan = _scan_motion_opencv(capture)
+        else:
+            scan = _scan_motion_opencv(vidcap)
+            vidcap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    if scan is None or scan.total_frames == 0:
+        return None
+    fps, total = scan.fps, scan.total_frames
+    whole = ActiveSegment(0, total - 1, total, fps, False)
+    # The difference at a position measures the change since the previous thumbnail
+    previous_positions, positions, motion = [], [], []
+    for (before, previous), (index, thumb) in zip(scan.thumbnails, scan.thumbnails[1:]):
+        previous_positions.append(before)
+        positions.append(index)
+        motion.append(float(np.mean(np.abs(thumb - previous))))
+    if len(motion) < 2:
+        return whole
+
+    # A 3-step median drops isolated spikes such as keyframe quality jumps
+    motion = np.asarray(motion)
+    padded = np.concatenate([motion[:1], motion, motion[-1:]])
+    motion = np.median(np.stack([padded[:-2], padded[1:-1], padded[2:]]), axis=0)
+    baseline, peak = float(np.percentile(motion, 20)), float(motion.max())
+    if peak - baseline < MOTION_MIN_ACTIVITY:
+        return whole
+    active = np.flatnonzero(motion > baseline + MOTION_THRESHOLD * (peak - baseline))
+    margin = int(round(MOTION_MARGIN_S * (fps or 30.0)))
+    start = max(0, previous_positions[active[0]] - margin)
+    end = min(total - 1, positions[active[-1]] + margin)
+    return ActiveSegment(start, end, total, fps, True)
+
+
+def sampling_indices(source: VideoSource, total_frames: int, num_frames: int,
+                     segment: Optional[ActiveSegment] = None) -> Tuple[np.ndarray, bool]:
+    """
+    Frame indices to sample from a clip.
+
+    Samples uniformly within ``segment`` when one is given. Otherwise uses
+    ``uniform_indices`` when the container reports a frame count, samples
+    uniformly by timestamp from a packet scan when it does not, and only as a
+    last resort takes the first ``num_frames`` frames.
+
+    Returns:
+        The indices, and whether the frame count had to be probed (such streams
+        usually cannot be seeked by frame index reliably)
+    """
+    if segment is not None:
+        indices = segment.start + uniform_indices(segment.end - segment.start + 1, num_frames)
+        return indices, total_frames <= 0
+    if total_frames > 0:
+        return uniform_indices(total_frames, num_frames), False
+    frame_times = probe_frame_times(source)
+    if frame_times is None:
+        logger.warning(f"No frame count or timestamps for {source}; sampling its first {num_frames} frames")
+        return uniform_indices(0, num_frames), True
+    return timestamp_indices(frame_times, num_frames), True
+
+
+def _read_seek(vidcap: cv2.VideoCapture, indices: Sequence[int],
+               progress: List[int]) -> Iterator[Tuple[int, np.ndarray]]:
+    # Random access: one seek per index that is not the next frame anyway; progress[0] counts the reads
+    for index in indices:
+        if index != int(vidcap.get(cv2.CAP_PROP_POS_FRAMES)):
+            vidcap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        progress[0] += 1
+        ok, frame = vidcap.read()
+        if not ok:
+            # Fallback: read sequentially
+            ok, frame = vidcap.read()
+            if not ok:
+                return
+        yield index, frame
+
+
+def _read_sequential(vidcap: cv2.VideoCapture, indices: Sequence[int],
+                     progress: List[int]) -> Iterator[Tuple[int, np.ndarray]]:
+    # Single forward pass: demux every frame, convert only the wanted ones; progress[0] counts the grabs
+    position = 0
+    frame = None
+    for index in indices:
+        if frame is not None and index < position:
+            # Repeated index (short clips): reuse the frame already retrieved
+            yield index, frame
+            continue
+        while position <= index:
+            if not vidcap.grab():
+                return
+            position += 1
+            progress[0] = position
+        ok, frame = vidcap.retrieve()
+        if not ok:
+            return
+        yield index, frame
+
+
+class SamplerCostModel:
+    """
+    Running per-codec cost estimates for the two sampling modes.
+
+    Sequential decoding costs about ``grab_ms`` per frame up to the last wanted
+    index; seeking costs about ``seek_ms`` per wanted frame, which grows with the
+    GOP length. Each mode is tried on the first clips of a codec, then the one
+    with the lower predicted cost is used, re-exploring the other periodically so
+    the estimates follow the traffic.
+    """
+
+    def __init__(self, explore_every: int = 50, smoothing: float = 0.2):
+        self.explore_every = explore_every
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        # codec -> {"grab_ms", "seek_ms", "decodes", "seek": n, "sequential": n}
+        self._codecs: Dict[str, Dict] = {}
+
+    def choose(self, codec: str, indices: Sequence[int]) -> str:
+        with self._lock:
+            entry = self._codecs.setdefault(codec, {"grab_ms": None, "seek_ms": None, "decodes": 0,
+                                                     "seek": 0, "sequential": 0})
+            entry["decodes"] += 1
+            if entry["grab_ms"] is None:
+                return "sequential"
+            if entry["seek_ms"] is None:
+                return "seek"
+            predicted = self._predict(entry, indices)
+            best = min(predicted, key=predicted.get)
+            if entry["decodes"] % self.explore_every == 0:
+                return "seek" if best == "sequential" else "sequential"
+            return best
+
+    def record(self, codec: str, mode: str, frames: int, elapsed_ms: float):
+        """
+        Add a run that took ``elapsed_ms`` to decode ``frames`` frames: grabbed ones
+        for "sequential", sought ones for "seek". Partial runs count too, so a stream
+        that ends before its reported frame count still yields an estimate.
+        """
+        if frames <= 0:
+            return
+        key, sample = ("grab_ms" if mode == "sequential" else "seek_ms"), elapsed_ms / frames
+        with self._lock:
+            entry = self._codecs.get(codec)
+            if entry is None:
+                return
+            entry[mode] += 1
+            previous = entry[key]
+            entry[key] = sample if previous is None else previous + self.smoothing * (sample - previous)
+
+    def _predict(self, entry: Dict, indices: Sequence[int]) -> Dict[str, float]:
+        return {
+            "sequential": entry["grab_ms"] * (int(max(indices)) + 1),
+            "seek": entry["seek_ms"] * len(indices)
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {codec: {k: (round(v, 4) if isinstance(v, float) else v) for k, v in entry.items()}
+                    for codec, entry in self._codecs.items()}
+
+
+sampler_costs = SamplerCostModel()
+
+
+def capture_codec(vidcap: cv2.VideoCapture) -> str:
+    """FourCC of the opened stream, e.g. "avc1" or "VP80" ("" if unknown)."""
+    fourcc = int(vidcap.get(cv2.CAP_PROP_FOURCC))
+    return "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+
+
+def sample_frames(vidcap: cv2.VideoCapture, indices: Sequence[int],
+                  mode: Optional[str] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield ``(index, BGR frame)`` for the wanted, ascending frame indices.
+
+    Stops early when the stream ends before the last index (frame counts
+    reported by containers are often slightly too high).
+
+    Args:
+        vidcap: Freshly opened capture positioned at the first frame
+        indices: Frame indices to return, ascending; repeats are allowed
+        mode: "seek", "sequential" or "auto" (defaults to FRAME_SAMPLER)
+    """
+    mode = mode or FRAME_SAMPLER
+    codec = capture_codec(vidcap)
+    if mode not in SAMPLER_MODES:
+        mode = sampler_costs.choose(codec, indices)
+    reader = _read_sequential if mode == "sequential" else _read_seek
+
+    # Time only the decoder, not the caller's per-frame work between yields
+    progress = [0]
+    iterator = reader(vidcap, indices, progress)
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            item = next(iterator, None)
+            elapsed += time.perf_counter() - started
+            if item is None:
+                break
+            yield item
+    finally:
+        # Cost per frame actually decoded, also when the stream or the caller stopped early
+        sampler_costs.record(codec, mode, progress[0], elapsed * 1000)
+
+
+def pyav_available() -> bool:
+    return av is not None
+
+
+def decode_pyav(source: VideoSource, buffer: np.ndarray, segment: Optional[ActiveSegment] = None,
+                indices: Optional[FrameIndices] = None) -> int:
+    """
+    Decode uniformly sampled frames of a clip into ``buffer`` with PyAV.
+
+    Frames are decoded forward once on libavcodec's threads; only the selected
+    ones are scaled (short side to the buffer size, bilinear) and converted to
+    rgb24 by libswscale, then center-cropped into the buffer.
+
+    Args:
+        source: Path to the video file, or the encoded file in memory
+        buffer: (T, S, S, 3) uint8 array receiving RGB frames
+        segment: Restrict sampling to this frame interval
+        indices: Ascending frame indices to decode instead of a uniform sample; repeats are
+            allowed. A function of the clip's frame count returning them (None: decode nothing)
+            lets the caller plan them without opening the video itself
+
+    Returns:
+        Number of frames written (at most T)
+    """
+    if av is None:
+        raise RuntimeError("PyAV is not installed")
+    num_frames, size = buffer.shape[0], buffer.shape[1]
+    container = av.open(_container_input(source), metadata_errors="ignore")
+    try:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        if DECODE_THREADS > 0:
+            stream.thread_count = DECODE_THREADS
+        if callable(indices):
+            indices = indices(count_frames(source, stream.frames))
+            if indices is None:
+                return 0
+        elif indices is None:
+            indices, _ = sampling_indices(source, stream.frames, num_frames, segment)
+        indices = indices[:num_frames]
+        count = 0
+        target = int(indices[0])
+        for position, frame in enumerate(container.decode(stream)):
+            if position < target:
+                continue
+            scale = size / min(frame.height, frame.width)
+            new_h, new_w = int(frame.height * scale), int(frame.width * scale)
+            img = frame.reformat(width=new_w, height=new_h, format="rgb24", interpolation="BILINEAR").to_ndarray()
+            start_h = (new_h - size) // 2
+            start_w = (new_w - size) // 2
+            buffer[count] = img[start_h:start_h + size, start_w:start_w + size]
+            count += 1
+            # Short videos are padded by sampling some frames more than once
+            while count < len(indices) and indices[count] == position:
+                buffer[count] = buffer[count - 1]
+                count += 1
+            if count >= len(indices):
+                break
+            target = int(indices[count])
+        return count
+    finally:
+        container.close()